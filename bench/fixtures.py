@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+
+
+# 生成随机文件时每次写入的块大小
+WRITE_SIZE = 4 * 1024 * 1024
+
+
+def require_ffmpeg():
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError("ffmpeg not found in PATH (needed to generate synthetic media)")
+
+
+def make_media(path, seconds=10, audio='aac', video=True):
+    """用 ffmpeg 的测试源（testsrc 画面 + sine 正弦波）生成合成媒体文件，不依赖任何样本文件。
+
+    audio：aac（转换时走完整编码）或 mp3（音频已是 MP3，走直接拷贝的快速路径）。
+    """
+    require_ffmpeg()
+    cmd = ['ffmpeg', '-y', '-v', 'error']
+    if video:
+        cmd += ['-f', 'lavfi', '-i', f'testsrc=size=640x360:rate=25:duration={seconds}']
+    cmd += ['-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}']
+    if video:
+        # mpeg4 是 ffmpeg 内置编码器，任何构建都可用
+        cmd += ['-c:v', 'mpeg4', '-q:v', '5']
+    cmd += ['-c:a', 'libmp3lame' if audio == 'mp3' else 'aac', '-b:a', '128k', '-shortest', path]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def media_variants(src, count, folder):
+    """复制出 count 份内容哈希各不相同的媒体（只改写元数据，不重新编码），避免命中转换缓存。"""
+    require_ffmpeg()
+    stem, ext = os.path.splitext(os.path.basename(src))
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f'{stem}-{i}{ext}')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', src, '-map', '0', '-c', 'copy',
+                        '-metadata', f'comment=bench-{i}', path], check=True)
+        paths.append(path)
+    return paths
+
+
+def random_file(path, size):
+    """生成 size 字节的随机内容文件（不可压缩，也不会被去重）。"""
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            block = os.urandom(min(WRITE_SIZE, remaining))
+            f.write(block)
+            remaining -= len(block)
+    return path
+
+
+class MultipartFile:
+    """以 multipart/form-data 流式上传一个文件的请求体。
+
+    requests 通过 __len__ 得到 Content-Length，再反复调用 read()，大文件不会整个读入客户端内存。
+    """
+
+    def __init__(self, path, field='file', filename=None, boundary='benchboundary7MA4YWxkTrZu0gW'):
+        filename = filename or os.path.basename(path)
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                      f'Content-Type: application/octet-stream\r\n\r\n').encode()
+        self._tail = f'\r\n--{boundary}--\r\n'.encode()
+        self._length = len(self._head) + os.path.getsize(path) + len(self._tail)
+        self._file = open(path, 'rb')
+        self._pending = self._head
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        out = bytearray()
+        while len(out) < size:
+            if self._pending:
+                take = self._pending[:size - len(out)]
+                self._pending = self._pending[len(take):]
+                out += take
+                continue
+            if self._file is None:
+                break
+            data = self._file.read(size - len(out))
+            if data:
+                out += data
+            else:
+                self._file.close()
+                self._file = None
+                self._pending = self._tail
+        return bytes(out)
@@ -0,0 +1,211 @@
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import requests
+
+
+# 采样进程内存的间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.1
+# 等待被测服务启动的最长时间（秒）
+STARTUP_TIMEOUT = 60
+
+
+class RequestFailed(Exception):
+    """单次请求的结果不符合预期（状态码、任务失败等），kind 用于错误分类统计。"""
+
+    def __init__(self, kind, message=''):
+        super().__init__(message or kind)
+        self.kind = kind
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    """线性插值的百分位数（与 numpy 默认算法一致），sorted_values 需已排序。"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def summarize_latencies(latencies):
+    """秒 -> 毫秒的均值与百分位数。"""
+    values = sorted(latency * 1000 for latency in latencies)
+    if not values:
+        return {}
+    summary = {'mean': sum(values) / len(values), 'max': values[-1]}
+    for p in (50, 90, 95, 99):
+        summary[f'p{p}'] = percentile(values, p)
+    return {key: round(value, 2) for key, value in summary.items()}
+
+
+# --- 内存采样（读取 /proc，只支持 Linux） ---
+def _status_field(pid, field):
+    """/proc/<pid>/status 中以 kB 为单位的字段，返回字节数；进程已退出时返回 0。"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return 0
+
+
+def rss(pid):
+    return _status_field(pid, 'VmRSS')
+
+
+def peak_rss(pid):
+    """进程生命周期内的最大常驻内存（VmHWM）。"""
+    return _status_field(pid, 'VmHWM')
+
+
+def process_tree(pid):
+    """pid 及其所有子孙进程（例如服务端启动的 ffmpeg）。"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # comm 字段可能含空格，ppid 在最后一个 ')' 之后的第二个字段
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+class RssSampler:
+    """后台定期采样内存占用，记录峰值。tree=True 时统计整个进程树的总和。"""
+
+    def __init__(self, pid, tree=False):
+        self.pid = pid
+        self.tree = tree
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+    def _run(self):
+        while not self._stop.is_set():
+            pids = process_tree(self.pid) if self.tree else [self.pid]
+            self.peak = max(self.peak, sum(rss(pid) for pid in pids))
+            self._stop.wait(RSS_SAMPLE_INTERVAL)
+
+
+# --- 被测服务 ---
+class Server:
+    """以子进程运行的被测服务，输出写入日志文件；ready_url 返回 2xx/3xx/4xx 即视为已启动。"""
+
+    def __init__(self, name, cmd, cwd, env=None, ready_url=None, log_path=None):
+        self.name = name
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = dict(os.environ, **(env or {}))
+        self.ready_url = ready_url
+        self.log_path = log_path or os.path.join(cwd, f'{name}.log')
+        self.process = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def start(self):
+        self._log = open(self.log_path, 'ab')
+        self.process = subprocess.Popen(self.cmd, cwd=self.cwd, env=self.env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited during startup, see {self.log_path}")
+            try:
+                if requests.get(self.ready_url, timeout=1).status_code < 500:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.name} did not start within {STARTUP_TIMEOUT}s, see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+
+# --- 负载驱动 ---
+def run_load(call, concurrency, total):
+    """用 concurrency 个线程共执行 total 次 call(session)。
+
+    call 返回本次传输的字节数，抛出异常即记为失败（RequestFailed.kind / HTTP 状态码 / 异常类名）。
+    每个线程使用独立的 requests.Session（连接复用，与浏览器行为接近）。
+    返回 {'latencies', 'errors', 'bytes', 'duration'}。
+    """
+    latencies, errors = [], {}
+    transferred = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                size = call(session) or 0
+            except Exception as e:
+                if isinstance(e, RequestFailed):
+                    kind = e.kind
+                elif isinstance(e, requests.HTTPError) and e.response is not None:
+                    kind = f'http_{e.response.status_code}'
+                else:
+                    kind = type(e).__name__
+                with lock:
+                    errors[kind] = errors.get(kind, 0) + 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                transferred[0] += size
+        session.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'latencies': latencies, 'errors': errors, 'bytes': transferred[0],
+            'duration': time.perf_counter() - started}
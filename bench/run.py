@@ -0,0 +1,204 @@
+"""仓库级压测：驱动各个 Web 工具的真实代码，输出吞吐、延迟百分位与内存峰值，结果保存为 JSON 便于跨版本对比。
+
+    python bench/run.py                                   # 全部场景，并发 1 与 4
+    python bench/run.py ft_upload ft_download --concurrency 1,8,32 --requests 64 --file-size 256M --ft-server asgi
+    python bench/run.py covert_convert --concurrency 1,2,4 --media-seconds 30
+    python bench/run.py --compare bench/results/旧.json bench/results/新.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import RssSampler, run_load, summarize_latencies, peak_rss
+from scenarios import SCENARIOS, REPO_ROOT
+
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    """'64M'、'1G'、'4096' -> 字节数。"""
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    revision = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    return revision, dirty
+
+
+def run_level(scenario_class, concurrency, options):
+    """在全新的工作目录与服务进程上运行一个场景的一个并发级别。"""
+    total = max(options.requests, concurrency)
+    workdir = tempfile.mkdtemp(prefix=f'bench-{scenario_class.name}-')
+    scenario = scenario_class()
+    scenario.total_requests = total
+    try:
+        server = scenario.start(workdir, options)
+        sampler = RssSampler(server.pid if server else os.getpid(), tree=bool(server)).start()
+        with contextlib.ExitStack() as stack:
+            if scenario.quiet:
+                stack.enter_context(contextlib.redirect_stdout(open(os.devnull, 'w')))
+            load = run_load(scenario.request, concurrency, total)
+        sampled_peak = sampler.stop()
+        if server:
+            memory = {'server': peak_rss(server.pid), 'server_tree': sampled_peak}
+        else:
+            memory = {'client': sampled_peak}
+        extra = scenario.stats()
+    finally:
+        scenario.stop()
+        if options.keep_workdir:
+            print(f"  workdir kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    ok = len(load['latencies'])
+    result = {
+        'scenario': scenario_class.name,
+        'concurrency': concurrency,
+        'requests': total,
+        'ok': ok,
+        'errors': load['errors'],
+        'duration_s': round(load['duration'], 3),
+        'throughput_rps': round(ok / load['duration'], 3) if load['duration'] else None,
+        'throughput_mb_s': round(load['bytes'] / load['duration'] / 1024 ** 2, 3) if load['duration'] else None,
+        'latency_ms': summarize_latencies(load['latencies']),
+        'peak_rss_bytes': memory,
+    }
+    result.update(extra)
+    return result
+
+
+def format_result(result):
+    latency = result['latency_ms']
+    peak = max(result['peak_rss_bytes'].values()) / 1024 ** 2
+    errors = sum(result['errors'].values())
+    return (f"{result['scenario']:<18} c={result['concurrency']:<4} ok={result['ok']:<5} err={errors:<4} "
+            f"{result['throughput_rps'] or 0:>9.2f} req/s {result['throughput_mb_s'] or 0:>9.2f} MB/s  "
+            f"p50={latency.get('p50', 0):>9.1f} p95={latency.get('p95', 0):>9.1f} p99={latency.get('p99', 0):>9.1f} ms  "
+            f"peak={peak:>7.1f} MB")
+
+
+def compare(base_path, new_path, threshold):
+    """按 (场景, 并发) 对比两次结果，变差超过 threshold% 的指标标记为 REGRESSION。"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base: {base['meta']['revision']} ({base['meta']['timestamp']})")
+    print(f"new:  {new['meta']['revision']} ({new['meta']['timestamp']})")
+    base_results = {(r['scenario'], r['concurrency']): r for r in base['results']}
+    regressions = 0
+    for result in new['results']:
+        old = base_results.get((result['scenario'], result['concurrency']))
+        if not old:
+            continue
+        metrics = [
+            ('req/s', old['throughput_rps'], result['throughput_rps'], True),
+            ('p95 ms', old['latency_ms'].get('p95'), result['latency_ms'].get('p95'), False),
+            ('peak MB', max(old['peak_rss_bytes'].values()) / 1024 ** 2,
+             max(result['peak_rss_bytes'].values()) / 1024 ** 2, False),
+        ]
+        cells = []
+        for label, before, after, higher_is_better in metrics:
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ' REGRESSION' if worse > threshold else ''
+            regressions += bool(flag)
+            cells.append(f"{label} {before:.1f} -> {after:.1f} ({change:+.1f}%){flag}")
+        print(f"{result['scenario']:<18} c={result['concurrency']:<4} " + ' | '.join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help=f"要运行的场景，默认全部：{', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,4', help='逗号分隔的并发级别')
+    parser.add_argument('--requests', type=int, default=20, help='每个并发级别的请求总数（至少等于并发数）')
+    parser.add_argument('--out', help='结果文件，默认 bench/results/<时间>-<版本>.json')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留每一级的临时目录（含服务日志）')
+    group = parser.add_argument_group('covert_t_mp3')
+    group.add_argument('--media-seconds', type=int, default=10, help='合成媒体的时长')
+    group.add_argument('--media-audio', choices=['aac', 'mp3'], default='aac',
+                       help='合成媒体的音频编码：aac 走完整编码，mp3 走直接拷贝的快速路径')
+    group.add_argument('--cache-hits', action='store_true', help='所有请求使用同一个输入（测转换缓存命中）')
+    group = parser.add_argument_group('filetransmission')
+    group.add_argument('--file-size', type=parse_size, default='64M', help='上传/下载的随机文件大小')
+    group.add_argument('--chunk-size', type=parse_size, default='8M', help='分块上传的分块大小')
+    group.add_argument('--ft-server', choices=['flask', 'asgi'], default='asgi',
+                       help='flask = python app.py 的服务器，asgi = 生产入口 asgi.py（uvicorn）')
+    group = parser.add_argument_group('pansou_to_alist')
+    group.add_argument('--upstream-latency-ms', type=float, default=50, help='替身接口的模拟处理时间')
+    group.add_argument('--upstream-error-rate', type=float, default=0.0, help='替身接口返回 503 的概率')
+    group.add_argument('--search-results', type=int, default=50, help='替身搜索接口每次返回的结果数')
+    group.add_argument('--keywords', type=int, default=20, help='搜索时轮换的不同关键字数')
+    group.add_argument('--no-result-index', action='store_true', help='pansou_search 不查询本地搜索索引')
+    group.add_argument('--batch-items', type=int, default=40,
+                       help='quark_queue_batch 每次加入转存队列的资源数（每批大小由 RUN_TASK_BATCH_SIZE 决定）')
+    group.add_argument('--check-links', type=int, default=50, help='link_check 每次检测的链接数')
+    group.add_argument('--dead-rate', type=float, default=0.3, help='link_check 替身判定为失效的分享比例')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='对比两个结果文件，不运行压测')
+    parser.add_argument('--threshold', type=float, default=10, help='--compare 时判定为变差的百分比')
+    options = parser.parse_args()
+
+    if options.compare:
+        regressions = compare(*options.compare, options.threshold)
+        sys.exit(1 if regressions else 0)
+
+    names = options.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    levels = [int(level) for level in options.concurrency.split(',') if level.strip()]
+    if 'covert_convert' in names and not shutil.which('ffmpeg'):
+        print("ffmpeg not found in PATH, skipping covert_convert")
+        names.remove('covert_convert')
+
+    revision, dirty = git_revision()
+    meta = {
+        'revision': revision + ('-dirty' if dirty else ''),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in vars(options).items() if key not in ('compare', 'out')},
+    }
+    results = []
+    for name in names:
+        print(f"== {name}: {SCENARIOS[name].description}")
+        for concurrency in levels:
+            try:
+                result = run_level(SCENARIOS[name], concurrency, options)
+            except Exception as e:
+                print(f"  c={concurrency}: failed to run: {e}")
+                continue
+            results.append(result)
+            print('  ' + format_result(result))
+            if result['errors']:
+                print(f"  errors: {result['errors']}")
+
+    out = options.out or os.path.join(RESULTS_FOLDER, f"{time.strftime('%Y%m%d-%H%M%S')}-{meta['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == '__main__':
+    main()
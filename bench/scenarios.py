@@ -0,0 +1,375 @@
+import importlib
+import itertools
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from fixtures import make_media, media_variants, random_file, MultipartFile
+from harness import Server, RequestFailed, free_port
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COVERT_DIR = os.path.join(REPO_ROOT, 'covert_t_mp3')
+FILETRANSMISSION_DIR = os.path.join(REPO_ROOT, 'filetransmission')
+PANSOU_DIR = os.path.join(REPO_ROOT, 'pansou_to_alist')
+COMMON_DIR = os.path.join(REPO_ROOT, 'common')
+STANDINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standins.py')
+
+# 轮询转换任务状态的间隔（秒）
+POLL_INTERVAL = 0.1
+# 单个请求的超时（秒）
+REQUEST_TIMEOUT = 600
+# 下载时每次读取的块大小
+DOWNLOAD_CHUNK = 1024 * 1024
+
+
+def flask_command(app_dir, port):
+    """以 Flask 自带服务器（多线程，与 python app.py 相同）运行 app_dir/app.py 中的 app，端口由压测指定。"""
+    return [sys.executable, '-c', f"import sys; sys.path.insert(0, {app_dir!r}); "
+                                  f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+
+
+class Scenario:
+    """一个压测场景。
+
+    start(workdir, options) 准备测试数据、启动被测服务，返回需要测量内存的服务进程（无则为 None，测量压测进程自身）；
+    request(session) 执行一次操作，返回传输的字节数；stop() 停止服务。
+    每个并发级别都会重新 start()，使每一级的内存峰值与缓存状态互不影响。
+    """
+    name = None
+    description = ''
+    # 本级别的请求总数（需要每个请求一份不同输入时使用），由 run.py 在 start() 前设置
+    total_requests = 0
+    # 被测代码会大量打印日志时设为 True，压测期间丢弃标准输出
+    quiet = False
+
+    def __init__(self):
+        self.servers = []
+
+    def start(self, workdir, options):
+        raise NotImplementedError
+
+    def request(self, session):
+        raise NotImplementedError
+
+    def stats(self):
+        """场景自定义的附加统计（如上游请求数），写入结果文件。"""
+        return {}
+
+    def stop(self):
+        for server in reversed(self.servers):
+            server.stop()
+        self.servers = []
+
+    def _start_server(self, server):
+        self.servers.append(server)
+        return server.start()
+
+
+# --- covert_t_mp3 ---
+class CovertConvert(Scenario):
+    name = 'covert_convert'
+    description = 'covert_t_mp3: POST /convert 合成视频，轮询 /status 直到完成，再下载 MP3'
+
+    def start(self, workdir, options):
+        media = make_media(os.path.join(workdir, 'source.mp4'), options.media_seconds, options.media_audio)
+        if options.cache_hits:
+            self.inputs = itertools.repeat(media)
+        else:
+            # 每个请求一份内容不同的输入，避免命中转换缓存
+            self.inputs = iter(media_variants(media, self.total_requests, workdir))
+        self.lock = threading.Lock()
+        port = free_port()
+        self.base = f'http://127.0.0.1:{port}'
+        env = {'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'), 'OUTPUT_FOLDER': os.path.join(workdir, 'outputs')}
+        return self._start_server(Server('covert', flask_command(COVERT_DIR, port), workdir, env,
+                                         ready_url=self.base + '/presets',
+                                         log_path=os.path.join(workdir, 'covert.log')))
+
+    def request(self, session):
+        with self.lock:
+            path = next(self.inputs)
+        with open(path, 'rb') as f:
+            response = session.post(self.base + '/convert', files={'file': (os.path.basename(path), f, 'video/mp4')},
+                                    timeout=REQUEST_TIMEOUT)
+        if response.status_code == 503:
+            raise RequestFailed('queue_full')
+        response.raise_for_status()
+        job = response.json()
+        while True:
+            status = session.get(self.base + job['status_url'], timeout=REQUEST_TIMEOUT).json()
+            if status['status'] == 'done':
+                break
+            if status['status'] == 'failed':
+                raise RequestFailed('job_failed', status.get('error') or '')
+            time.sleep(POLL_INTERVAL)
+        response = session.get(self.base + job['download_url'], timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return os.path.getsize(path) + len(response.content)
+
+
+# --- filetransmission ---
+class FileTransmissionScenario(Scenario):
+    """启动 filetransmission（--ft-server flask | asgi），准备一个 --file-size 字节的随机文件。"""
+
+    def start(self, workdir, options):
+        self.path = random_file(os.path.join(workdir, 'bench.bin'), options.file_size)
+        self.size = options.file_size
+        port = free_port()
+        self.base = f'http://127.0.0.1:{port}'
+        if options.ft_server == 'asgi':
+            cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', FILETRANSMISSION_DIR,
+                   '--host', '127.0.0.1', '--port', str(port), '--timeout-keep-alive', '75', '--log-level', 'warning']
+        else:
+            cmd = flask_command(FILETRANSMISSION_DIR, port)
+        # 上传目录是相对路径 uploads/，在工作目录下运行即可与仓库隔离
+        server = self._start_server(Server('filetransmission', cmd, workdir, ready_url=self.base + '/api/files',
+                                           log_path=os.path.join(workdir, 'filetransmission.log')))
+        self.prepare()
+        return server
+
+    def prepare(self):
+        pass
+
+    def upload(self, session, name):
+        body = MultipartFile(self.path, filename=name)
+        response = session.post(self.base + '/upload', data=body, headers={'Content-Type': body.content_type},
+                                timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+
+class FileUpload(FileTransmissionScenario):
+    name = 'ft_upload'
+    description = 'filetransmission: 流式 multipart 上传 POST /upload'
+
+    def request(self, session):
+        self.upload(session, 'bench.bin')
+        return self.size
+
+
+class FileChunkedUpload(FileTransmissionScenario):
+    name = 'ft_chunked_upload'
+    description = 'filetransmission: 分块上传（创建会话、逐块 PUT、complete）'
+
+    def start(self, workdir, options):
+        self.chunk_size = options.chunk_size
+        return super().start(workdir, options)
+
+    def request(self, session):
+        response = session.post(self.base + '/upload/sessions', timeout=REQUEST_TIMEOUT,
+                                json={'filename': 'bench.bin', 'size': self.size, 'chunk_size': self.chunk_size})
+        response.raise_for_status()
+        upload_id = response.json()['upload_id']
+        with open(self.path, 'rb') as f:
+            for offset in range(0, self.size, self.chunk_size):
+                response = session.put(f'{self.base}/upload/sessions/{upload_id}?offset={offset}',
+                                       data=f.read(self.chunk_size), timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+        response = session.post(f'{self.base}/upload/sessions/{upload_id}/complete', timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return self.size
+
+
+class FileDownload(FileTransmissionScenario):
+    name = 'ft_download'
+    description = 'filetransmission: 完整下载 GET /download/<文件名>'
+
+    def prepare(self):
+        with requests.Session() as session:
+            self.upload(session, 'bench.bin')
+
+    def request(self, session):
+        received = 0
+        with session.get(self.base + '/download/bench.bin', stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                received += len(chunk)
+        if received != self.size:
+            raise RequestFailed('short_read')
+        return received
+
+
+# --- pansou_to_alist ---
+class StandInScenario(Scenario):
+    """启动上游接口的本地替身，在压测进程内导入并调用 pansou_to_alist 的真实代码。
+
+    被测代码运行在客户端一侧，内存测量的是压测进程本身。
+    """
+    # 被测代码依赖的模块，每个并发级别重新导入，使模块级的状态（如搜索缓存）互不影响
+    modules = ()
+
+    def _start_standin(self, workdir, kind, options, *extra):
+        port = free_port()
+        cmd = [sys.executable, STANDINS, kind, '--port', str(port), '--latency-ms', str(options.upstream_latency_ms),
+               '--error-rate', str(options.upstream_error_rate), *extra]
+        self.standin = f'http://127.0.0.1:{port}'
+        self._start_server(Server(f'{kind}-standin', cmd, workdir, ready_url=self.standin + '/__stats',
+                                  log_path=os.path.join(workdir, f'{kind}-standin.log')))
+
+    def _import(self, workdir, name):
+        """pansou_to_alist 通过 import config_env 读取配置：在工作目录生成一份指向替身的配置后导入 name。"""
+        with open(os.path.join(workdir, 'config_env.py'), 'w') as f:
+            f.write(f"search_api = {self.standin + '/api/search'!r}\n"
+                    f"run_task_url = {self.standin + '/api/run_task'!r}\n"
+                    f"base_url = {self.standin + '/api/add_task'!r}\n"
+                    f"token = 'bench-token'\n")
+        for path in (workdir, PANSOU_DIR, COMMON_DIR):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        # 本地数据库（搜索索引、转存队列）也放在工作目录，不写入仓库
+        os.environ['RESULT_INDEX_DB'] = os.path.join(workdir, 'results.db')
+        os.environ['TASK_DB'] = os.path.join(workdir, 'tasks.db')
+        self._forget_modules()
+        return importlib.import_module(name)
+
+    def _forget_modules(self):
+        # http_client 也重新导入：每一级使用新的连接池与请求统计
+        for module in ('config_env', 'http_client') + self.modules:
+            sys.modules.pop(module, None)
+
+    def stats(self):
+        stats = {'upstream': requests.get(self.standin + '/__stats', timeout=10).json()}
+        if 'http_client' in sys.modules:
+            stats['http'] = sys.modules['http_client'].client.stats()
+        return stats
+
+    def stop(self):
+        super().stop()
+        self._forget_modules()
+
+
+class PansouSearch(StandInScenario):
+    name = 'pansou_search'
+    description = 'pansou_to_alist: 调用 web_app.search_api 所用的 search.search（本地 pansou 替身）'
+    modules = ('search', 'result_index', 'auto_quark')
+
+    def start(self, workdir, options):
+        self._start_standin(workdir, 'pansou', options, '--results', str(options.search_results))
+        self.search = self._import(workdir, 'search')
+        self.use_index = not options.no_result_index
+        # 在 --keywords 个关键字之间轮换，重复的关键字可以体现缓存的效果
+        self.keywords = itertools.cycle([f'关键字{i}' for i in range(options.keywords)])
+        self.lock = threading.Lock()
+        return None
+
+    def request(self, session):
+        with self.lock:
+            keyword = next(self.keywords)
+        results = self.search.search(keyword, ['quark'], use_index=self.use_index)['quark']
+        if not results:
+            raise RequestFailed('empty_result')
+        return 0
+
+    def stats(self):
+        return dict(super().stats(), search_cache=self.search.cache.stats())
+
+    def stop(self):
+        # 等待后台写索引的任务结束，再删除工作目录
+        self.search.executor.shutdown(wait=True)
+        self.search.recorder.shutdown(wait=True)
+        super().stop()
+
+
+class QuarkRunTask(StandInScenario):
+    name = 'quark_run_task'
+    description = 'pansou_to_alist: 调用 auto_quark.add_and_run_task（本地 quark_auto_save 替身）'
+    modules = ('auto_quark',)
+    # add_and_run_task 每次调用都会打印日志
+    quiet = True
+
+    def start(self, workdir, options):
+        self._start_standin(workdir, 'quark', options, '--token', 'bench-token')
+        self.auto_quark = self._import(workdir, 'auto_quark')
+        self.counter = itertools.count()
+        return None
+
+    def request(self, session):
+        i = next(self.counter)
+        ok = self.auto_quark.add_and_run_task(f'https://pan.quark.cn/s/bench{i:06d}', f'bench{i}',
+                                              f'/alist/电影/bench{i}')
+        if not ok:
+            raise RequestFailed('rejected')
+        return 0
+
+
+class QuarkQueueBatch(StandInScenario):
+    name = 'quark_queue_batch'
+    description = 'pansou_to_alist: 一次向 task_queue.transfers 加入 --batch-items 个资源，等待后台线程分批提交完成'
+    modules = ('task_queue', 'result_index', 'auto_quark')
+    # 队列的工作线程每次提交都会打印日志
+    quiet = True
+
+    def start(self, workdir, options):
+        self._start_standin(workdir, 'quark', options, '--token', 'bench-token')
+        # 替身返回 503 时按真实的退避策略重试，但把起始间隔缩短，避免一个请求等上几十秒
+        os.environ.setdefault('TASK_RETRY_BASE', '0.1')
+        self.task_queue = self._import(workdir, 'task_queue')
+        self.batch_items = options.batch_items
+        self.counter = itertools.count()
+        return None
+
+    def request(self, session):
+        i = next(self.counter)
+        items = [(f'https://pan.quark.cn/s/bench{i:06d}e{n:03d}', f'bench{i} 第{n + 1}集', f'/alist/电视剧/bench{i}')
+                 for n in range(self.batch_items)]
+        transfers = self.task_queue.transfers
+        pending = {result['task_id'] for result in transfers.enqueue(items)}
+        while pending:
+            time.sleep(POLL_INTERVAL / 5)
+            for task_id in list(pending):
+                task = transfers.get(task_id)
+                if task['status'] == 'failed':
+                    raise RequestFailed('rejected', task['last_error'])
+                if task['status'] == 'done':
+                    pending.discard(task_id)
+        return 0
+
+    def stop(self):
+        self.task_queue.transfers.stop()
+        super().stop()
+
+
+class LinkCheck(StandInScenario):
+    name = 'link_check'
+    description = 'pansou_to_alist: 调用 link_checker.check_results 检测 --check-links 个分享链接（本地分享页替身）'
+    modules = ('link_checker', 'search', 'result_index', 'auto_quark')
+
+    def start(self, workdir, options):
+        self._start_standin(workdir, 'share', options, '--dead-rate', str(options.dead_rate))
+        os.environ['SHARE_CHECK_URL'] = self.standin + '/1/clouddrive/share/sharepage/token'
+        self.link_checker = self._import(workdir, 'link_checker')
+        self.check_links = options.check_links
+        self.counter = itertools.count()
+        self.verdicts = {}
+        self.lock = threading.Lock()
+        return None
+
+    def request(self, session):
+        # 每个请求的链接互不相同，测的是未命中缓存时的并发检测
+        i = next(self.counter)
+        items = [{'url': f'https://pan.quark.cn/s/bench{i:06d}l{n:03d}', 'password': ''}
+                 for n in range(self.check_links)]
+        verdicts = self.link_checker.check_results(items)
+        with self.lock:
+            for verdict, _ in verdicts.values():
+                self.verdicts[verdict] = self.verdicts.get(verdict, 0) + 1
+        if len(verdicts) != len(items):
+            raise RequestFailed('missing_verdict')
+        return 0
+
+    def stats(self):
+        return dict(super().stats(), verdicts=self.verdicts, link_cache=self.link_checker.cache.stats())
+
+    def stop(self):
+        self.link_checker.executor.shutdown(wait=True)
+        os.environ.pop('SHARE_CHECK_URL', None)
+        super().stop()
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    CovertConvert, FileUpload, FileChunkedUpload, FileDownload, PansouSearch, QuarkRunTask, QuarkQueueBatch,
+    LinkCheck)}
@@ -0,0 +1,153 @@
+"""pansou 搜索接口、quark_auto_save run-task 接口与夸克分享页接口的本地替身，用于离线压测与测试。
+
+    python bench/standins.py pansou --port 8888 --latency-ms 300 --results 50
+    python bench/standins.py quark --port 5005 --latency-ms 100
+    python bench/standins.py share --port 5006 --dead-rate 0.3
+
+响应格式与 search.py / auto_quark.py / link_checker.py 解析的字段一致；share 替身按 pwd_id 的哈希
+确定性地判定分享是否失效（与 pansou 替身生成的链接配合，同一链接每次结论相同）；
+GET /__stats 返回已处理的请求数，用于统计缓存、合并请求等优化省下的上游调用。
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，不关闭 Nagle 会与客户端的延迟 ACK 叠加出约 40ms 的额外延迟
+    disable_nagle_algorithm = True
+    # 以下由 serve() 设置
+    kind = None
+    options = None
+    stats = None
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/__stats':
+            with self.lock:
+                self._send(200, json.dumps(self.stats).encode(), 'application/json')
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        with self.lock:
+            self.stats['requests'] += 1
+        time.sleep(self.options.latency_ms / 1000)
+        if random.random() < self.options.error_rate:
+            with self.lock:
+                self.stats['errors'] += 1
+            self._send(503, b'busy', 'text/plain', {'Retry-After': '1'})
+            return
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self._send(400, b'invalid json', 'text/plain')
+            return
+        if self.kind == 'pansou':
+            self._send(200, json.dumps(search_response(payload, self.options.results)).encode(), 'application/json')
+        elif self.kind == 'share':
+            self._share_token(payload)
+        else:
+            self._run_task(payload)
+
+    def _share_token(self, payload):
+        pwd_id = payload.get('pwd_id') or ''
+        if share_is_dead(pwd_id, self.options.dead_rate):
+            with self.lock:
+                self.stats['dead'] += 1
+            body = {'status': 404, 'code': 41006, 'message': '分享不存在', 'data': None}
+            self._send(404, json.dumps(body, ensure_ascii=False).encode(), 'application/json')
+        else:
+            body = {'status': 200, 'code': 0, 'message': 'ok', 'data': {'stoken': hashlib.sha1(pwd_id.encode()).hexdigest()}}
+            self._send(200, json.dumps(body).encode(), 'application/json')
+
+    def _run_task(self, payload):
+        token = parse_qs(urlparse(self.path).query).get('token', [''])[0]
+        if self.options.token and token != self.options.token:
+            self._send(401, b'invalid token', 'text/plain')
+            return
+        tasks = payload.get('tasklist')
+        if not isinstance(tasks, list) or not tasks:
+            self._send(400, b'tasklist required', 'text/plain')
+            return
+        # 提交了已失效分享的任务（真实后端会执行失败，白白占用一次转存）
+        dead = sum(1 for task in tasks if share_is_dead(share_id(task.get('shareurl') or ''), self.options.dead_rate))
+        with self.lock:
+            self.stats['tasks'] += len(tasks)
+            self.stats['dead'] += dead
+        # 真实后端逐行输出执行日志
+        lines = [f"#{i + 1} {task.get('taskname')} -> {task.get('savepath')}" for i, task in enumerate(tasks)]
+        self._send(200, ('\n'.join(lines) + '\n').encode(), 'text/plain; charset=utf-8')
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def search_response(payload, count):
+    """按关键字确定性地生成结果：同一关键字每次返回相同的链接，便于测试去重与缓存。"""
+    keyword = payload.get('kw', '')
+    merged = {}
+    for cloud_type in payload.get('cloud_types') or ['quark']:
+        items = []
+        for i in range(count):
+            digest = hashlib.sha1(f'{cloud_type}:{keyword}:{i}'.encode()).hexdigest()
+            items.append({
+                'url': f'https://pan.{cloud_type}.cn/s/{digest[:12]}',
+                'password': '',
+                'note': f'{keyword} 第{i + 1}集 4K',
+                'datetime': (datetime(2025, 1, 1) + timedelta(hours=int(digest[12:16], 16))).isoformat() + 'Z',
+            })
+        merged[cloud_type] = items
+    return {'code': 0, 'message': 'success', 'data': {'total': count * len(merged), 'merged_by_type': merged}}
+
+
+def share_id(share_url):
+    """https://pan.quark.cn/s/<pwd_id>?pwd=... -> pwd_id"""
+    return urlparse(share_url).path.rstrip('/').rsplit('/', 1)[-1]
+
+
+def share_is_dead(pwd_id, dead_rate):
+    """按 pwd_id 的哈希确定性地判定分享是否失效，比例约为 dead_rate。"""
+    return int(hashlib.sha1(pwd_id.encode()).hexdigest()[:8], 16) / 0x100000000 < dead_rate
+
+
+def serve(kind, port, latency_ms=0, results=20, error_rate=0.0, token='', dead_rate=0.0):
+    options = argparse.Namespace(latency_ms=latency_ms, results=results, error_rate=error_rate, token=token,
+                                 dead_rate=dead_rate)
+    handler = type('Handler', (StandInHandler,), {
+        'kind': kind, 'options': options, 'stats': {'requests': 0, 'errors': 0, 'tasks': 0, 'dead': 0}})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    print(f"{kind} stand-in listening on 127.0.0.1:{port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kind', choices=['pansou', 'quark', 'share'])
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个请求的模拟处理时间')
+    parser.add_argument('--results', type=int, default=20, help='pansou：每种网盘返回的结果数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='以该概率返回 503 + Retry-After')
+    parser.add_argument('--token', default='', help='quark：要求的 token（留空不校验）')
+    parser.add_argument('--dead-rate', type=float, default=0.0, help='share：判定为失效的分享比例；quark：统计提交了失效分享的任务数（dead）')
+    args = parser.parse_args()
+    serve(args.kind, args.port, args.latency_ms, args.results, args.error_rate, args.token, args.dead_rate)
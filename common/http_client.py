@@ -0,0 +1,215 @@
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# --- 配置 ---
+# 默认超时（秒）：建立连接 / 等待响应
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+# 按域名单独设置的超时，如 "www.strava.com=15,qyapi.weixin.qq.com=5"
+HTTP_TIMEOUTS = os.environ.get('HTTP_TIMEOUTS', '')
+# 失败后的最多重试次数，以及重试间隔：HTTP_RETRY_BASE * 2^n 秒（带随机抖动），最长 HTTP_RETRY_MAX 秒
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+HTTP_RETRY_BASE = float(os.environ.get('HTTP_RETRY_BASE', 0.5))
+HTTP_RETRY_MAX = float(os.environ.get('HTTP_RETRY_MAX', 10))
+# 服务端要求的 Retry-After 超过该秒数时不再等待，直接把响应交给调用方
+HTTP_RETRY_AFTER_MAX = float(os.environ.get('HTTP_RETRY_AFTER_MAX', 60))
+# 每个域名保持的最多空闲连接数（同时进行的请求超过时临时新建连接，用完即关）
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 16))
+# 最多为多少个不同域名保留连接池
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 10))
+
+# 可以安全重复发送的请求方法
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# 服务端明确表示请求未被处理、可以稍后重试的状态码（任何请求方法都可重试）
+THROTTLED_STATUSES = frozenset([429, 503])
+# 可能已经处理过请求的服务端错误，只对幂等请求重试
+SERVER_ERROR_STATUSES = frozenset([500, 502, 504])
+# 每个域名保留最近多少次请求的耗时，用于计算百分位
+LATENCY_SAMPLES = 1000
+
+
+class HttpClient:
+    """strava、pusher 与 pansou_to_alist 共用的 HTTP 客户端。
+
+    * 长连接：所有请求共用一个 requests.Session，按域名复用连接，省去每次的 TCP/TLS 握手；
+      fork 后的子进程中自动新建 Session，不与父进程共用连接
+    * 超时：调用时指定的 timeout > HTTP_TIMEOUTS 中该域名的设置 > 默认的 (连接, 读取) 超时
+    * 重试：429/503 与连接超时对任何请求都重试；连接中断、读取超时与 500/502/504 只对幂等请求重试
+      （GET 等，或调用时传 idempotent=True），避免重复提交任务、重复推送消息。
+      间隔按指数退避并加随机抖动，响应带 Retry-After 时按服务端要求等待
+    * 统计：按域名记录请求数、重试数、异常数、各类状态码与耗时百分位，见 stats()
+    """
+
+    def __init__(self, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), timeouts=None, retries=HTTP_RETRIES,
+                 pool_size=HTTP_POOL_SIZE, pool_hosts=HTTP_POOL_HOSTS):
+        self.timeout = timeout
+        self.timeouts = dict(parse_timeouts(HTTP_TIMEOUTS) if timeouts is None else timeouts)
+        self.retries = retries
+        self.pool_size = pool_size
+        self.pool_hosts = pool_hosts
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._stats = defaultdict(_HostStats)
+
+    # --- 对外接口 ---
+    def request(self, method, url, timeout=None, retries=None, idempotent=None, **kwargs):
+        """发送请求并返回最后一次的 requests.Response（不检查状态码），参数同 requests.request。
+
+        重试用尽后返回最后一次的响应，或抛出最后一次的 requests.RequestException。
+        """
+        host = urlsplit(url).netloc.lower()
+        if timeout is None:
+            timeout = self.timeouts.get(host, self.timeout)
+        retries = self.retries if retries is None else retries
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        session = self._get_session()
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                self._observe(host, time.monotonic() - started, None)
+                if attempt >= retries or not _retry_on_error(e, idempotent):
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                self._observe(host, time.monotonic() - started, response.status_code)
+                delay = _retry_on_response(response, attempt, idempotent)
+                if delay is None or attempt >= retries:
+                    return response
+                response.close()
+            attempt += 1
+            with self._lock:
+                self._stats[host].retries += 1
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def set_timeout(self, host, timeout):
+        """设置某个域名的默认超时（秒，或 (连接, 读取) 元组）。"""
+        self.timeouts[host.lower()] = timeout
+
+    def stats(self):
+        """按域名的请求统计：{域名: {'requests', 'retries', 'errors', 'status', 'p50_ms', 'p95_ms', 'max_ms'}}。"""
+        with self._lock:
+            return {host: stats.snapshot() for host, stats in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session:
+            session.close()
+
+    # --- 内部实现 ---
+    def _get_session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    def _observe(self, host, elapsed, status):
+        with self._lock:
+            self._stats[host].observe(elapsed, status)
+
+
+def parse_timeouts(value):
+    """'host=秒,host2=秒' -> {host: 秒}，格式不对的项忽略。"""
+    timeouts = {}
+    for entry in value.split(','):
+        host, _, seconds = entry.partition('=')
+        try:
+            timeouts[host.strip().lower()] = float(seconds)
+        except ValueError:
+            continue
+    return timeouts
+
+
+def backoff_delay(attempt):
+    """第 attempt 次重试前的等待时间（秒）：指数增长，带 50%~100% 的随机抖动避免同时重试。"""
+    delay = min(HTTP_RETRY_MAX, HTTP_RETRY_BASE * 2 ** attempt)
+    return delay * random.uniform(0.5, 1)
+
+
+def retry_after(response):
+    """解析 Retry-After（秒数或 HTTP 日期），没有或无法解析时返回 None。"""
+    value = (response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _retry_on_error(error, idempotent):
+    if isinstance(error, requests.ConnectTimeout):
+        # 连接都没有建立，请求肯定没有发出
+        return True
+    return idempotent and isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def _retry_on_response(response, attempt, idempotent):
+    """需要重试时返回等待的秒数，否则返回 None。"""
+    status = response.status_code
+    if status not in THROTTLED_STATUSES and not (idempotent and status in SERVER_ERROR_STATUSES):
+        return None
+    wait = retry_after(response)
+    if wait is None:
+        return backoff_delay(attempt)
+    # 服务端要求等待太久时交给调用方处理（如转存队列自己的退避重试）
+    return wait if wait <= HTTP_RETRY_AFTER_MAX else None
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.status = defaultdict(int)  # '2xx' / '4xx' / '5xx' ... -> 次数
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def observe(self, elapsed, status):
+        self.requests += 1
+        self.latencies.append(elapsed)
+        if status is None:
+            self.errors += 1
+        else:
+            self.status[f'{status // 100}xx'] += 1
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {'requests': self.requests, 'retries': self.retries, 'errors': self.errors,
+                'status': dict(self.status), 'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95),
+                'max_ms': round(latencies[-1] * 1000, 1) if latencies else None}
+
+
+# 进程内共享：同一进程中的所有请求复用同一组连接
+client = HttpClient()
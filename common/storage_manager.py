@@ -0,0 +1,231 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def is_managed(name):
+    """目录中直接存放的普通文件名；以 . 开头的内部文件与带路径的名称不参与管理。"""
+    return bool(name) and not name.startswith('.') and '/' not in name and os.sep not in name
+
+
+class ExpiringStorage:
+    """单个目录的过期与配额管理，covert_t_mp3 与 filetransmission 共用。
+
+    * 内存索引：启动时扫描一次目录，之后由调用方在写入/访问/删除时通知（add/touch/remove），
+      不再定期 glob + stat 整个目录
+    * 过期：ttl 秒后删除（按写入时间，或最后一次 renew 的时间），由后台调度线程按最早到期时间依次处理
+    * 配额：总大小超过 quota_bytes 时淘汰文件，policy='oldest' 按写入顺序，'lru' 按最近访问顺序
+      （访问顺序只保存在内存中，重启后按 mtime 重建）；指向同一 inode 的多个硬链接只计一次大小
+    * 以 . 开头的文件视为内部文件（索引、临时文件等），不参与管理
+    * 调度线程在第一次使用时启动，并在 fork 后的子进程中自动重建，
+      因此不依赖 `if __name__ == '__main__'`，gunicorn 等 WSGI 服务器下同样生效
+    """
+
+    def __init__(self, folder, ttl=None, quota_bytes=None, policy='oldest', sweep_interval=60, on_evict=None):
+        if policy not in ('oldest', 'lru'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.folder = folder
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.policy = policy
+        self.sweep_interval = sweep_interval
+        # on_evict(name, reason)：文件因过期（'expired'）或超出配额（'quota'）被删除后调用
+        self.on_evict = on_evict
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # name -> (created_at, inode)，排在前面的先被淘汰
+        self._inodes = {}              # (st_dev, st_ino) -> [size, 引用它的文件数]
+        self._expiry = []              # (expires_at, name, created_at) 小顶堆
+        self._total = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+        self._ensure_scheduler()
+
+    # --- 对外接口 ---
+    def path_for(self, name):
+        return os.path.join(self.folder, name)
+
+    def add(self, name):
+        """登记一个刚写入完成的文件，必要时立即按配额淘汰旧文件。"""
+        self._ensure_scheduler()
+        stat = os.stat(self.path_for(name))
+        created_at = time.time()
+        with self._lock:
+            self._drop(name)
+            self._track(name, stat, created_at)
+            if self.ttl is not None:
+                heapq.heappush(self._expiry, (created_at + self.ttl, name, created_at))
+            evicted = self._over_quota(keep=name)
+        self._delete(evicted, 'quota')
+        self._wakeup.set()
+
+    def touch(self, name, discover=False):
+        """文件被访问：存在时返回路径（LRU 策略下刷新顺序），不存在返回 None。
+
+        discover=True 时，索引中没有但目录中存在的文件（其他进程写入、启动后手动拷入）先登记再返回，
+        多个进程共用同一目录时使用。
+        """
+        self._ensure_scheduler()
+        path = self.path_for(name)
+        if discover and name not in self and is_managed(name) and os.path.isfile(path):
+            self._discover(name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not os.path.exists(path):
+                self._drop(name)
+                return None
+            if self.policy == 'lru':
+                # 访问顺序只记在内存中，不改写文件的 mtime：
+                # 否则下载会改变 ETag/Last-Modified、触发文件监视重新计算校验和，并波及同一 inode 的所有硬链接
+                self._entries.move_to_end(name)
+        return path
+
+    def renew(self, name):
+        """文件仍在使用（如分块上传收到新的分块）：从现在起重新计算 ttl，返回文件是否在索引中。"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if not entry:
+                return False
+            created_at = time.time()
+            # 只更新时间，不改变淘汰顺序；旧的到期记录在 sweep 时按 created_at 识别为作废
+            self._entries[name] = (created_at, entry[1])
+            if self.ttl is not None:
+                heapq.heappush(self._expiry, (created_at + self.ttl, name, created_at))
+        return True
+
+    def remove(self, name):
+        """删除文件并移出索引。"""
+        with self._lock:
+            self._drop(name)
+        try:
+            os.remove(self.path_for(name))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def usage(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total, 'max_bytes': self.quota_bytes}
+
+    def sweep(self):
+        """删除所有已到期的文件，返回下一次到期时间（没有则为 None）。"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, name, created_at = heapq.heappop(self._expiry)
+                entry = self._entries.get(name)
+                # 文件被覆盖写入后旧的到期记录作废
+                if entry and entry[0] == created_at:
+                    self._drop(name)
+                    expired.append(name)
+            next_expiry = self._expiry[0][0] if self._expiry else None
+        self._delete(expired, 'expired')
+        return next_expiry
+
+    # --- 内部实现 ---
+    def _track(self, name, stat, created_at):
+        inode = (stat.st_dev, stat.st_ino)
+        self._entries[name] = (created_at, inode)
+        if inode in self._inodes:
+            self._inodes[inode][1] += 1
+        else:
+            self._inodes[inode] = [stat.st_size, 1]
+            self._total += stat.st_size
+
+    def _discover(self, name):
+        """登记一个不是经由 add() 写入的文件，与启动时扫描相同：按 mtime 计算到期时间。"""
+        try:
+            stat = os.stat(self.path_for(name))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if name in self._entries:
+                return
+            self._track(name, stat, stat.st_mtime)
+            if self.ttl is not None:
+                heapq.heappush(self._expiry, (stat.st_mtime + self.ttl, name, stat.st_mtime))
+            evicted = self._over_quota(keep=name)
+        self._delete(evicted, 'quota')
+        self._wakeup.set()
+
+    def _drop(self, name):
+        entry = self._entries.pop(name, None)
+        if not entry:
+            return
+        size_refs = self._inodes[entry[1]]
+        size_refs[1] -= 1
+        if not size_refs[1]:
+            del self._inodes[entry[1]]
+            self._total -= size_refs[0]
+
+    def _over_quota(self, keep=None):
+        """按策略挑出需要淘汰的文件（调用方持有锁）；至少保留刚写入的那一个。"""
+        evicted = []
+        if self.quota_bytes is None:
+            return evicted
+        for name in list(self._entries):
+            if self._total <= self.quota_bytes:
+                break
+            if name == keep:
+                continue
+            self._drop(name)
+            evicted.append(name)
+        return evicted
+
+    def _delete(self, names, reason):
+        for name in names:
+            try:
+                os.remove(self.path_for(name))
+                print(f"Removed {reason} file: {self.path_for(name)}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error deleting file {self.path_for(name)}: {e}")
+            if self.on_evict:
+                self.on_evict(name, reason)
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.folder):
+            path = self.path_for(name)
+            if is_managed(name) and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat))
+        with self._lock:
+            for mtime, name, stat in sorted(files, key=lambda item: item[:2]):
+                self._track(name, stat, mtime)
+                if self.ttl is not None:
+                    heapq.heappush(self._expiry, (mtime + self.ttl, name, mtime))
+            evicted = self._over_quota()
+        self._delete(evicted, 'quota')
+
+    def _ensure_scheduler(self):
+        if self.ttl is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"storage-{self.folder}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            next_expiry = self.sweep()
+            # 睡到下一个文件到期，但至少每 sweep_interval 秒检查一次
+            timeout = self.sweep_interval
+            if next_expiry is not None:
+                timeout = max(0.0, min(timeout, next_expiry - time.time()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
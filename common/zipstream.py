@@ -0,0 +1,62 @@
+import os
+import time
+import zipfile
+
+
+# 从源文件读取的块大小
+CHUNK_SIZE = 256 * 1024
+
+
+class ZipSink:
+    """zipfile 的写入目标，只暂存尚未发送给客户端的字节。
+
+    不提供 tell()/seek()，zipfile 会自动改用 data descriptor 写入文件头之后的大小与 CRC，
+    因此整个压缩包无需在磁盘或内存中完整生成。
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_zip(entries, compress=None):
+    """把 (压缩包内文件名, 本地路径 或 bytes) 依次写成 ZIP，边生成边 yield。
+
+    默认统一使用 ZIP_STORED：MP3、视频等本身已经压缩，再压缩只会浪费 CPU。
+    compress(压缩包内文件名) 返回 True 的条目改用 ZIP_DEFLATED。
+    内存占用只与块大小有关，与文件总大小无关。
+    """
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, source in entries:
+            if isinstance(source, bytes):
+                date_time = time.localtime()[:6]
+            else:
+                date_time = time.localtime(os.path.getmtime(source))[:6]
+            zinfo = zipfile.ZipInfo(arcname, date_time)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED if compress and compress(arcname) else zipfile.ZIP_STORED
+            if isinstance(source, bytes):
+                zf.writestr(zinfo, source)
+                yield sink.pop()
+                continue
+            with open(source, 'rb') as src, zf.open(zinfo, 'w', force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield sink.pop()
+            yield sink.pop()
+    # 中央目录
+    yield sink.pop()
@@ -1,9 +1,27 @@
 import os
 import subprocess
 import time
-import threading
-import glob
-from flask import Flask, request, render_template, send_file, redirect, url_for, g
+import sys
+import uuid
+import queue
+import zipfile
+import zlib
+import mimetypes
+import json
+from urllib.parse import quote
+from flask import Flask, request, render_template, send_file, redirect, url_for, g, jsonify, Response
+# 共享模块位于仓库根目录的 common/ 下；Docker 镜像中会直接复制到应用目录
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from storage_manager import ExpiringStorage
+from jobs import JobQueue, QueueFullError, SlotPool, MAX_WORKERS
+from cache import ConversionCache, save_and_hash, settings_digest, PARTIAL_MARKER
+from streaming import PipeConversion
+from probe import probe, choose_pipeline, audio_streams, BASE_ARGS
+from segmented import plan_segments, encode_segmented, SegmentError
+from zipstream import stream_zip
+from presets import PRESETS, parse_presets
+from progress import run_ffmpeg
+from metrics import Metrics, SECONDS_BUCKETS, SPEED_BUCKETS
 
 app = Flask(__name__)
 
@@ -12,37 +30,61 @@ app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/app/data/uploads
 app.config['OUTPUT_FOLDER'] = os.environ.get('OUTPUT_FOLDER', '/app/data/outputs')
 # 文件大小限制（已在 Dockerfile 中修复）
 app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024 # 20MB 默认值
-# 文件保留时间：3600秒 = 1小时
+# 文件保留时间：3600秒 = 1小时（仅针对上传目录中的残留文件）
 CLEANUP_INTERVAL = 3600 
+# 上传目录的容量上限（字节），默认不限制：排队中的输入文件若被淘汰，对应任务会失败
+UPLOAD_QUOTA_BYTES = int(os.environ['UPLOAD_QUOTA_BYTES']) if os.environ.get('UPLOAD_QUOTA_BYTES') else None
+# 转换结果缓存的磁盘预算，超出后按 LRU 淘汰
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1GB 默认值
+# 转换结果的最长保留时间（秒），默认只按磁盘预算淘汰
+CACHE_TTL = int(os.environ['CACHE_TTL']) if os.environ.get('CACHE_TTL') else None
+
+# 批量转换：单次最多文件数、ZIP 压缩包解压后的总大小上限
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', 50))
+MAX_ARCHIVE_BYTES = int(os.environ.get('MAX_ARCHIVE_BYTES', 10 * app.config['MAX_CONTENT_LENGTH']))
+ARCHIVE_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+# /progress 推送进度的间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 流式转换使用的 MP3 编码参数（与 mp3 预设一致）
+ENCODER_ARGS = PRESETS['mp3']['args']
+# 流式转换无法预先探测，只能固定丢弃视频流后完整编码
+STREAM_ARGS = ['-vn', '-sn', '-dn'] + ENCODER_ARGS
 
 # 确保在启动前创建目录
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# 转换任务队列：线程数 = CPU 核数，队列满时拒绝新任务
+jobs = JobQueue()
+# 上传目录：输入文件转换后立即删除，转换中断等原因遗留的文件超过 CLEANUP_INTERVAL 后由后台线程清理
+uploads = ExpiringStorage(app.config['UPLOAD_FOLDER'], ttl=CLEANUP_INTERVAL, quota_bytes=UPLOAD_QUOTA_BYTES)
+# 输出目录即缓存目录：<内容哈希>-<参数摘要>.<扩展名>
+cache = ConversionCache(app.config['OUTPUT_FOLDER'], CACHE_MAX_BYTES, ttl=CACHE_TTL)
+# 流式转换同时运行的 ffmpeg 进程上限，与任务队列分开计数
+stream_slots = SlotPool(MAX_WORKERS)
+
+# 运行指标，/metrics 以 Prometheus 文本格式输出
+metrics = Metrics()
+metrics.counter('convert_jobs_total', 'Conversions by pipeline: cache / copy / encode / segmented / stream')
+metrics.counter('convert_bytes_in_total', 'Bytes of uploaded media')
+metrics.counter('convert_bytes_out_total', 'Bytes of converted output')
+metrics.histogram('convert_stage_seconds', 'Time spent per stage: upload / queue / probe / encode / send',
+                  SECONDS_BUCKETS)
+metrics.histogram('convert_encode_speed', 'Encode speed factor (media seconds per wall-clock second)',
+                  SPEED_BUCKETS)
+
+
+def record_pipeline(meta, name):
+    """记录任务实际走的处理路径，用于统计快速路径命中率。"""
+    meta['pipeline'] = name
+    metrics.inc('convert_jobs_total', pipeline=name)
+
 
-# --- 异步文件清理函数 ---
-def cleanup_files():
-    """定期扫描上传和输出目录，删除超过保留时间的文件。"""
-    while True:
-        now = time.time()
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}] Running cleanup task...")
-        
-        folders = [app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']]
-        
-        for folder in folders:
-            # 搜索文件夹中的所有文件
-            for filepath in glob.glob(os.path.join(folder, '*')):
-                # 检查文件是否为文件，并且是否超过保留时间
-                if os.path.isfile(filepath):
-                    file_age = now - os.path.getmtime(filepath)
-                    if file_age > CLEANUP_INTERVAL:
-                        try:
-                            os.remove(filepath)
-                            print(f"Cleaned up old file: {filepath}")
-                        except OSError as e:
-                            print(f"Error deleting file {filepath}: {e}")
-                            
-        time.sleep(CLEANUP_INTERVAL) # 每小时执行一次
+def record_stage(meta, stage, seconds):
+    """记录某一阶段的耗时：写入任务详情，同时计入直方图。"""
+    meta.setdefault('timings', {})[stage] = round(seconds, 3)
+    metrics.observe('convert_stage_seconds', seconds, stage=stage)
 
 
 # --- 辅助函数：确定语言 ---
@@ -68,8 +110,9 @@ def get_locale():
 
 @app.before_request
 def before_request():
-    """在每个请求前确定语言"""
+    """在每个请求前确定语言，并记录请求开始时间（用于统计上传耗时）"""
     g.locale = get_locale()
+    g.request_started = time.time()
 
 @app.route('/')
 def index():
@@ -80,6 +123,178 @@ def index():
     return render_template('index_en.html')
 
 
+def remove_partial_outputs(outputs):
+    for _, _, _, output_filepath in outputs:
+        if os.path.exists(output_filepath):
+            os.remove(output_filepath)
+
+
+def convert_job(input_filepath, meta):
+    """在工作线程中执行 FFmpeg 转换，结果放入缓存，返回 {预设名: 缓存文件路径}。
+
+    先用 ffprobe 探测音频编码，已是目标编码的直接拷贝音频流，否则完整编码；
+    请求多个预设时只调用一次 ffmpeg，源文件只解码一次，同时写出多个输出；
+    单个 MP3 输出且时长超过 SEGMENT_THRESHOLD 时切段后由多个 ffmpeg 进程并行编码。
+    """
+    renditions = meta['renditions']
+    result = {}
+    outputs = []  # (预设名, 处理方式, 输出参数, 临时文件路径)
+    record_stage(meta, 'queue', time.time() - meta['queued_at'])
+    try:
+        # 排队期间可能已有相同内容的任务完成
+        for name, rendition in renditions.items():
+            cached_filepath = cache.get(rendition['cache_key'])
+            if cached_filepath:
+                result[name] = cached_filepath
+        if len(result) == len(renditions):
+            record_pipeline(meta, 'cache')
+            return result
+
+        try:
+            started = time.time()
+            info = probe(input_filepath)
+            record_stage(meta, 'probe', time.time() - started)
+            for name in renditions:
+                if name in result:
+                    continue
+                preset = PRESETS[name]
+                pipeline, output_args = choose_pipeline(info, preset)
+                # 同一内容可能同时被多次上传，临时文件名需各不相同
+                output_filepath = os.path.join(app.config['OUTPUT_FOLDER'],
+                                               uuid.uuid4().hex + PARTIAL_MARKER + preset['ext'])
+                outputs.append((name, pipeline, output_args, output_filepath))
+                renditions[name]['pipeline'] = pipeline
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Unsupported file. FFprobe reports: {e.stderr}")
+        except ValueError as e:
+            raise RuntimeError(str(e))
+
+        try:
+            duration = float(info.get('format', {}).get('duration', 0))
+        except (TypeError, ValueError):
+            duration = 0
+
+        def on_progress(out_time, speed):
+            meta['progress'] = {
+                'percent': round(min(100.0, out_time * 100 / duration), 1) if duration else None,
+                'out_time': round(out_time, 2),
+                'speed': speed,
+            }
+
+        started = time.time()
+        pipeline = 'copy' if all(o[1] == 'copy' for o in outputs) else 'encode'
+        plan = None
+        if len(outputs) == 1 and outputs[0][1] == 'encode' and PRESETS[outputs[0][0]]['ext'] == 'mp3':
+            plan = plan_segments(info, audio_streams(info)[0])
+        if plan:
+            name, _, output_args, output_filepath = outputs[0]
+            try:
+                encode_segmented(input_filepath, output_filepath, *plan, output_args, on_progress)
+                pipeline = renditions[name]['pipeline'] = 'segmented'
+            except SegmentError as e:
+                # 分段结果未通过校验时回退到单进程编码
+                app.logger.warning("Segmented encode failed, falling back: %s", e)
+
+        if pipeline != 'segmented':
+            # -i 输入文件, -vn 禁用视频流, -acodec 编码器 / copy 直接拷贝；每个输出各自 -map 同一条音轨
+            cmd = ['ffmpeg', '-y', '-i', input_filepath]
+            for _, _, output_args, output_filepath in outputs:
+                cmd += output_args + [output_filepath]
+            run_ffmpeg(cmd, on_progress)
+        record_pipeline(meta, pipeline)
+
+        elapsed = time.time() - started
+        record_stage(meta, 'encode', elapsed)
+        if duration and elapsed > 0:
+            metrics.observe('convert_encode_speed', duration / elapsed, pipeline=pipeline)
+        meta['progress'] = {'percent': 100.0, 'out_time': duration, 'speed': None}
+    except subprocess.CalledProcessError as e:
+        app.logger.error("FFmpeg failed\nSTDOUT: %s\nSTDERR: %s", e.stdout, e.stderr)
+        remove_partial_outputs(outputs)
+        raise RuntimeError(f"Conversion failed. FFmpeg reports: {e.stderr}")
+    except Exception:
+        remove_partial_outputs(outputs)
+        raise
+    finally:
+        # 输入文件转换后即不再需要
+        uploads.remove(os.path.basename(input_filepath))
+
+    for name, _, _, output_filepath in outputs:
+        metrics.inc('convert_bytes_out_total', os.path.getsize(output_filepath))
+        result[name] = cache.put(renditions[name]['cache_key'], output_filepath)
+    return result
+
+
+def queue_full_response():
+    """队列已满时的统一响应，提示客户端稍后重试。"""
+    response = jsonify({'error': 'Server busy, please retry later.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '10'
+    return response
+
+
+def is_media_type(mimetype):
+    """允许所有视频或音频文件"""
+    return mimetype.startswith('video/') or mimetype.startswith('audio/')
+
+
+def plan_renditions(content_hash, base_name, presets):
+    """为每个预设生成缓存键与下载文件名；扩展名重复时在文件名中附上预设名。"""
+    exts = [PRESETS[name]['ext'] for name in presets]
+    renditions = {}
+    for name in presets:
+        preset = PRESETS[name]
+        suffix = f"-{name}" if exts.count(preset['ext']) > 1 else ''
+        renditions[name] = {
+            'cache_key': f"{content_hash}-{settings_digest(BASE_ARGS + preset['args'])}.{preset['ext']}",
+            'download_name': f"{base_name}{suffix}.{preset['ext']}",
+        }
+    return renditions
+
+
+def enqueue_conversion(stream, original_filename, presets, on_done=None, received_at=None):
+    """保存上传流并提交转换任务，返回 (job, 是否命中缓存)；队列已满时抛出 QueueFullError。
+
+    received_at：开始接收上传的时间，用于统计上传阶段耗时，默认从保存文件时算起。
+    """
+    job_id = uuid.uuid4().hex
+    received_at = received_at or time.time()
+
+    # 1. 保存上传文件（以任务 ID 命名，避免并发上传同名文件互相覆盖），边写边计算哈希
+    ext = os.path.splitext(original_filename)[1]
+    input_filepath = uploads.path_for(job_id + ext)
+    try:
+        content_hash = save_and_hash(stream, input_filepath)
+    except Exception:
+        # 客户端中途断开等情况：半截文件不会被登记，直接删除
+        if os.path.exists(input_filepath):
+            os.remove(input_filepath)
+        raise
+    uploads.add(job_id + ext)
+
+    base_name = os.path.splitext(original_filename)[0]
+    meta = {'renditions': plan_renditions(content_hash, base_name, presets), 'source_name': original_filename}
+    record_stage(meta, 'upload', time.time() - received_at)
+    metrics.inc('convert_bytes_in_total', os.path.getsize(input_filepath))
+    meta['queued_at'] = time.time()
+
+    # 2. 缓存命中：相同内容、相同参数的所有输出都已转换过，直接返回
+    cached = {name: cache.get(rendition['cache_key']) for name, rendition in meta['renditions'].items()}
+    if all(cached.values()):
+        uploads.remove(job_id + ext)
+        record_pipeline(meta, 'cache')
+        return jobs.complete(cached, meta=meta, job_id=job_id, on_done=on_done), True
+
+    # 3. 提交到后台队列
+    try:
+        job = jobs.submit(convert_job, input_filepath, meta,
+                          job_id=job_id, meta=meta, on_done=on_done)
+    except QueueFullError:
+        uploads.remove(job_id + ext)
+        raise
+    return job, False
+
+
 @app.route('/convert', methods=['POST'])
 def convert_video():
     if 'file' not in request.files:
@@ -89,51 +304,321 @@ def convert_video():
     if file.filename == '':
         return "No selected file", 400
 
-    if file:
-        # 检查文件类型：允许所有视频或音频文件
-        if not (file.mimetype.startswith('video/') or file.mimetype.startswith('audio/')):
-             return f"Invalid file type: {file.mimetype}. Only video or audio files are supported.", 400
-        
-        original_filename = file.filename
-        
-        # 1. 保存上传文件
-        input_filepath = os.path.join(app.config['UPLOAD_FOLDER'], original_filename)
-        file.save(input_filepath)
-        
-        # 2. 定义输出路径
-        base_name = os.path.splitext(original_filename)[0]
-        output_filename = base_name + '.mp3'
-        output_filepath = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        # 3. 调用 FFmpeg 进行转换
+    if not is_media_type(file.mimetype):
+         return f"Invalid file type: {file.mimetype}. Only video or audio files are supported.", 400
+
+    # 可选：一次请求多个输出格式，如 presets=mp3,aac,opus
+    try:
+        presets = parse_presets(request.form.get('presets'))
+    except ValueError as e:
+        return str(e), 400
+
+    # 准入控制：队列已满时不再落盘，直接拒绝
+    if jobs.is_full():
+        return queue_full_response()
+
+    try:
+        job, cached = enqueue_conversion(file.stream, file.filename, presets, received_at=g.request_started)
+    except QueueFullError:
+        return queue_full_response()
+
+    # 立即返回任务 ID，客户端轮询 status_url
+    response = jsonify({
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id),
+        'download_url': url_for('download_result', job_id=job.id),
+    })
+    response.status_code = 200 if cached else 202
+    return response
+
+
+def collect_batch_inputs(files):
+    """展开批量上传：多个媒体文件，或单个 ZIP 压缩包中的媒体文件。
+
+    返回 [(打开输入流的函数, 文件名)]，校验失败时抛出 ValueError。
+    """
+    if len(files) == 1 and (files[0].mimetype in ARCHIVE_MIMETYPES
+                            or files[0].filename.lower().endswith('.zip')):
         try:
-            # -i 输入文件, -vn 禁用视频流, -acodec libmp3lame MP3编码器, -q:a 2 质量
-            subprocess.run([
-                'ffmpeg', '-i', input_filepath, '-acodec', 'libmp3lame', '-q:a', '2', 
-                output_filepath
-            ], check=True, capture_output=True, text=True)
-            
-        except subprocess.CalledProcessError as e:
-            # 清理失败的文件
-            os.remove(input_filepath)
-            print(f"!!! FFmpeg Failed !!!")
-            print(f"STDOUT: {e.stdout}") 
-            print(f"STDERR: {e.stderr}")
-            # 返回 FFmpeg 报告的错误信息
-            return f"Conversion failed. FFmpeg reports: {e.stderr}", 500
-        
-        # 4. 提供文件下载
-        # 注意：文件将在后台清理线程中删除
-        return send_file(
-            output_filepath, 
-            as_attachment=True, 
-            download_name=output_filename,
-            mimetype='audio/mp3'
-        )
+            archive = zipfile.ZipFile(files[0].stream)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid ZIP archive.")
+        members = [info for info in archive.infolist()
+                   if not info.is_dir()
+                   and is_media_type(mimetypes.guess_type(info.filename)[0] or '')]
+        # 防止压缩炸弹：限制解压后的总大小
+        if sum(info.file_size for info in members) > MAX_ARCHIVE_BYTES:
+            raise ValueError(f"Archive too large when extracted (limit {MAX_ARCHIVE_BYTES} bytes).")
+        # 压缩包内的目录结构不保留，只取文件名
+        return [(lambda info=info: archive.open(info), os.path.basename(info.filename))
+                for info in members]
+
+    inputs = []
+    for file in files:
+        if file.filename == '':
+            continue
+        if not is_media_type(file.mimetype):
+            raise ValueError(f"Invalid file type: {file.mimetype} ({file.filename}). "
+                             "Only video or audio files are supported.")
+        inputs.append((lambda file=file: file.stream, file.filename))
+    return inputs
+
+
+def unique_name(name, used_names):
+    """压缩包内文件重名时追加序号：a.mp3, a (1).mp3, ..."""
+    base, ext = os.path.splitext(name)
+    candidate, i = name, 1
+    while candidate in used_names:
+        candidate = f"{base} ({i}){ext}"
+        i += 1
+    used_names.add(candidate)
+    return candidate
+
+
+@app.route('/convert/batch', methods=['POST'])
+def convert_batch():
+    """批量转换：接收多个 `files`（或一个 ZIP），并行转换，按完成顺序把结果流式打包成 ZIP 返回。"""
+    files = request.files.getlist('files')
+    if not files:
+        return "No file part", 400
+
+    try:
+        presets = parse_presets(request.form.get('presets'))
+        inputs = collect_batch_inputs(files)
+    except ValueError as e:
+        return str(e), 400
+    if not inputs:
+        return "No media files found", 400
+    if len(inputs) > MAX_BATCH_FILES:
+        return f"Too many files in one batch (limit {MAX_BATCH_FILES}).", 400
+
+    # 准入控制：整批都能排上队才接收
+    if jobs.free_slots() < len(inputs):
+        return queue_full_response()
+
+    done_queue = queue.Queue()
+    errors = []
+    submitted = 0
+    for open_stream, filename in inputs:
+        try:
+            with open_stream() as stream:
+                enqueue_conversion(stream, filename, presets, on_done=done_queue.put)
+            submitted += 1
+        except QueueFullError:
+            errors.append(f"{filename}: Server busy, please retry later.")
+        except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+            # 压缩包成员损坏/截断（CRC 错误等）或读写出错：只跳过这一个文件，已提交的任务照常收集
+            errors.append(f"{filename}: Could not read file ({e}).")
+        except Exception as e:
+            # 其他意外错误同样只影响这一个文件，否则前面已提交的任务无人收集
+            app.logger.exception("Failed to queue %s", filename)
+            errors.append(f"{filename}: {e}")
+
+    def entries():
+        used_names = set()
+        for _ in range(submitted):
+            job = done_queue.get()
+            files = job_files(job) if job.status == 'done' else None
+            if files:
+                for download_name, filepath, _ in files.values():
+                    yield unique_name(download_name, used_names), filepath
+            else:
+                errors.append(f"{job.meta['source_name']}: {job.error or 'File expired'}")
+        if errors:
+            yield 'errors.txt', '\n'.join(errors).encode('utf-8')
+
+    response = Response(stream_zip(entries()), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="converted.zip"'
+    return response
+
+
+@app.route('/convert/stream', methods=['POST'])
+def convert_stream():
+    """流式转换：请求体即原始媒体文件，响应体为边编码边返回的 MP3，不经过上传/输出目录。
+
+    用法：curl --data-binary @a.mkv -H 'Content-Type: video/x-matroska' '/convert/stream?filename=a.mkv'
+    """
+    mimetype = request.mimetype or ''
+    if not is_media_type(mimetype):
+        return f"Invalid file type: {mimetype}. Only video or audio files are supported.", 400
+
+    if not stream_slots.try_acquire():
+        return queue_full_response()
+
+    try:
+        conversion = PipeConversion(request.stream, STREAM_ARGS + ['-f', 'mp3'])
+        # 先拿到第一块输出再发送响应头，这样输入无法解析时仍能返回 500
+        first_chunk = conversion.read_first_chunk()
+    except Exception:
+        stream_slots.release()
+        raise
+    if not first_chunk:
+        stream_slots.release()
+        app.logger.error("FFmpeg stream conversion failed\nSTDERR: %s", conversion.error)
+        return f"Conversion failed. FFmpeg reports: {conversion.error}", 500
+
+    record_pipeline({}, 'stream')
+    started = g.request_started
+
+    def generate():
+        try:
+            for chunk in conversion.iter_chunks(first_chunk):
+                metrics.inc('convert_bytes_out_total', len(chunk))
+                yield chunk
+        finally:
+            stream_slots.release()
+            metrics.observe('convert_stage_seconds', time.time() - started, stage='stream')
+
+    base_name = os.path.splitext(request.args.get('filename', 'audio'))[0]
+    response = Response(generate(), mimetype='audio/mpeg')
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(base_name + '.mp3')}"
+    return response
+
+
+@app.route('/status/<job_id>')
+def job_status(job_id):
+    """查询任务状态：queued / running / done / failed"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    data = job.to_dict()
+    data['pipeline'] = job.meta.get('pipeline')
+    data['progress'] = job.meta.get('progress')
+    data['timings'] = job.meta.get('timings')
+    data['queue_depth'] = jobs.depth()
+    if job.status == 'done':
+        data['download_url'] = url_for('download_result', job_id=job_id)
+        data['renditions'] = {
+            name: {'download_url': url_for('download_rendition', job_id=job_id, preset=name),
+                   'pipeline': rendition.get('pipeline', 'cache')}
+            for name, rendition in job.meta['renditions'].items()
+        }
+    return jsonify(data)
+
+
+@app.route('/progress/<job_id>')
+def job_progress(job_id):
+    """以 Server-Sent Events 实时推送任务进度（percent / speed），任务结束后关闭连接"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        while True:
+            data = {'status': job.status, 'progress': job.meta.get('progress'), 'error': job.error}
+            yield f"data: {json.dumps(data)}\n\n"
+            if job.finished:
+                break
+            time.sleep(PROGRESS_INTERVAL)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/presets')
+def list_presets():
+    """可用的输出预设"""
+    return jsonify({name: {'ext': p['ext'], 'args': p['args']} for name, p in PRESETS.items()})
+
+
+@app.route('/stats')
+def stats():
+    """各处理路径的命中次数与缓存占用，用于观察快速路径命中率"""
+    counts = metrics.counter_values('convert_jobs_total', 'pipeline')
+    return jsonify({'pipelines': counts, 'cache': cache.stats(), 'uploads': uploads.usage(),
+                    'queue_depth': jobs.depth()})
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文本格式的运行指标：队列深度、编码速度、各阶段耗时、进出字节数"""
+    cache_stats = cache.stats()
+    body = metrics.render({
+        'convert_queue_depth': ('Jobs waiting for a worker', jobs.depth()),
+        'convert_jobs_running': ('Jobs currently converting', jobs.running()),
+        'convert_streams_active': ('Streaming conversions in progress', stream_slots.active),
+        'convert_cache_bytes': ('Bytes used by the conversion cache', cache_stats['bytes']),
+        'convert_cache_entries': ('Files in the conversion cache', cache_stats['entries']),
+        'convert_upload_bytes': ('Bytes of uploads waiting to be converted', uploads.usage()['bytes']),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def job_files(job):
+    """已完成任务的输出文件 {预设名: (下载文件名, 路径, MIME)}，同时刷新 LRU 位置；有文件已被淘汰时返回 None。"""
+    files = {}
+    for name, rendition in job.meta['renditions'].items():
+        filepath = cache.get(rendition['cache_key'])
+        if filepath is None:
+            return None
+        files[name] = (rendition['download_name'], filepath, PRESETS[name]['mimetype'])
+    return files
+
+
+def timed_send(response, job):
+    """响应体发送完毕（连接关闭）时记录发送阶段耗时"""
+    started = time.time()
+    # direct_passthrough 的响应不会触发 call_on_close，这里改为由 werkzeug 逐块迭代文件
+    response.direct_passthrough = False
+    response.call_on_close(lambda: record_stage(job.meta, 'send', time.time() - started))
+    return response
+
+
+def finished_job_or_error(job_id):
+    """返回 (job, None)，任务不存在/失败/未完成时返回 (None, 错误响应)。"""
+    job = jobs.get(job_id)
+    if job is None:
+        return None, ("Job not found", 404)
+    if job.status == 'failed':
+        return None, (job.error, 500)
+    if job.status != 'done':
+        return None, ("Job not finished yet", 409)
+    return job, None
+
+
+@app.route('/download/<job_id>')
+def download_result(job_id):
+    """下载已完成任务的结果：单个输出直接返回文件，多个输出打包成 ZIP"""
+    job, error = finished_job_or_error(job_id)
+    if error:
+        return error
+    files = job_files(job)
+    if files is None:
+        return "File expired", 410
+
+    if len(files) == 1:
+        download_name, filepath, mimetype = next(iter(files.values()))
+        return timed_send(send_file(filepath, as_attachment=True, download_name=download_name,
+                                    mimetype=mimetype), job)
+
+    base_name = os.path.splitext(job.meta['source_name'])[0]
+    response = Response(stream_zip((name, path) for name, path, _ in files.values()),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(base_name + '.zip')}"
+    return timed_send(response, job)
+
+
+@app.route('/download/<job_id>/<preset>')
+def download_rendition(job_id, preset):
+    """下载某一个预设的输出文件"""
+    job, error = finished_job_or_error(job_id)
+    if error:
+        return error
+    rendition = job.meta['renditions'].get(preset)
+    if rendition is None:
+        return "Preset not requested for this job", 404
+    filepath = cache.get(rendition['cache_key'])
+    if filepath is None:
+        return "File expired", 410
+
+    return timed_send(send_file(
+        filepath, 
+        as_attachment=True, 
+        download_name=rendition['download_name'],
+        mimetype=PRESETS[preset]['mimetype']
+    ), job)
 
 if __name__ == '__main__':
-    # 启动后台清理线程
-    cleanup_thread = threading.Thread(target=cleanup_files, daemon=True)
-    cleanup_thread.start()
-    
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import hashlib
+import os
+from storage_manager import ExpiringStorage
+
+
+# 每次从上传流读取的块大小
+CHUNK_SIZE = 1024 * 1024
+# 转换中的临时输出文件名标记：<随机名>.part.<扩展名>（不计入缓存）
+PARTIAL_MARKER = '.part.'
+
+
+def save_and_hash(stream, filepath):
+    """把上传流写入磁盘的同时计算 SHA-256，避免落盘后再读一遍。"""
+    digest = hashlib.sha256()
+    with open(filepath, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def settings_digest(args):
+    """编码参数的摘要：参数变化后旧缓存自然失效。"""
+    return hashlib.sha1(' '.join(args).encode('utf-8')).hexdigest()[:12]
+
+
+class ConversionCache:
+    """以 "内容哈希 + 编码参数" 为键的转换结果缓存，按磁盘预算做 LRU 淘汰。
+
+    键即文件名：<内容哈希>-<参数摘要>.<扩展名>。
+
+    索引、配额淘汰与可选的过期删除由共享的 ExpiringStorage 负责，
+    启动时按文件 mtime 从目录重建一次，之后不再扫描目录。
+    """
+
+    def __init__(self, folder, max_bytes, ttl=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+        self._remove_partials()
+        self._storage = ExpiringStorage(folder, ttl=ttl, quota_bytes=max_bytes, policy='lru')
+
+    def path_for(self, key):
+        return self._storage.path_for(key)
+
+    def get(self, key):
+        """命中时返回缓存文件路径并刷新其 LRU 位置，未命中返回 None。"""
+        return self._storage.touch(key)
+
+    def put(self, key, src_path):
+        """把转换好的文件移入缓存，返回缓存路径。"""
+        path = self.path_for(key)
+        os.replace(src_path, path)
+        self._storage.add(key)
+        return path
+
+    def stats(self):
+        return self._storage.usage()
+
+    def _remove_partials(self):
+        for name in os.listdir(self.folder):
+            if PARTIAL_MARKER in name and os.path.isfile(os.path.join(self.folder, name)):
+                # 上次进程中断遗留的半成品
+                os.remove(os.path.join(self.folder, name))
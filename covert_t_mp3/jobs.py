@@ -0,0 +1,178 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+# --- 配置 ---
+# 工作线程数：默认等于 CPU 核数，每个线程同一时间只跑一个 ffmpeg 进程
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', os.cpu_count() or 1))
+# 等待队列长度：超过后 /convert 直接返回 503，而不是无限堆积
+MAX_QUEUE_SIZE = int(os.environ.get('MAX_QUEUE_SIZE', MAX_WORKERS * 4))
+# 已结束任务的记录保留时间（秒），与文件保留时间保持一致
+JOB_RETENTION = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """等待队列已满，调用方应稍后重试。"""
+
+
+class SlotPool:
+    """非阻塞的并发名额计数（用于流式转换），可随时读取当前占用数。"""
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.size:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class Job:
+    """一次转换任务的状态记录。"""
+
+    def __init__(self, func, args=(), kwargs=None, meta=None, job_id=None, on_done=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.meta = meta or {}
+        self.status = 'queued'  # queued -> running -> done / failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # 任务结束（成功或失败）后在工作线程中调用 on_done(job)
+        self.on_done = on_done
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """固定大小的工作线程池 + 有界等待队列。
+
+    线程在第一次提交任务时才启动，因此不依赖 `if __name__ == '__main__'`，
+    在 gunicorn 等 WSGI 服务器下同样可用。
+    """
+
+    def __init__(self, workers=MAX_WORKERS, max_queue=MAX_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    # --- 对外接口 ---
+    def is_full(self):
+        return self._queue.full()
+
+    def depth(self):
+        """当前排队中（尚未开始）的任务数。"""
+        return self._queue.qsize()
+
+    def running(self):
+        """正在执行的任务数。"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == 'running')
+
+    def free_slots(self):
+        """等待队列剩余容量（近似值，仅用于批量任务的预先准入判断）。"""
+        return self._queue.maxsize - self._queue.qsize()
+
+    def submit(self, func, *args, meta=None, job_id=None, on_done=None, **kwargs):
+        """提交任务；队列已满时抛出 QueueFullError。"""
+        self._ensure_started()
+        self._forget_expired()
+
+        job = Job(func, args, kwargs, meta=meta, job_id=job_id, on_done=on_done)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFullError(f"Too many pending jobs (limit {self._queue.maxsize})")
+        return job
+
+    def complete(self, result, meta=None, job_id=None, on_done=None):
+        """登记一个无需执行的已完成任务（例如缓存命中），客户端沿用同一套查询/下载接口。"""
+        self._forget_expired()
+
+        job = Job(None, meta=meta, job_id=job_id, on_done=on_done)
+        job.result = result
+        job.status = 'done'
+        job.started_at = job.finished_at = job.created_at
+        with self._lock:
+            self._jobs[job.id] = job
+        if job.on_done:
+            job.on_done(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # --- 内部实现 ---
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"convert-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                status = 'failed'
+                logger.exception("Job %s failed", job.id)
+            # 先写结束时间再改状态，_forget_expired 看到已结束的任务时 finished_at 一定有值
+            job.finished_at = time.time()
+            job.status = status
+            self._queue.task_done()
+            if job.on_done:
+                job.on_done(job)
+
+    def _forget_expired(self):
+        """丢弃结束时间超过 JOB_RETENTION 的任务记录（对应文件已被清理线程删除）。"""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > JOB_RETENTION]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,84 @@
+import threading
+from collections import defaultdict
+
+
+# 直方图分桶：阶段耗时（秒）与编码速度倍数（媒体时长 / 实际耗时）
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SPEED_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Metrics:
+    """进程内的计数器与直方图，按 Prometheus 文本格式输出，不依赖 prometheus_client。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}                # (name, labels) -> [各桶计数..., 总和, 次数]
+        self._buckets = {}
+
+    def counter(self, name, help_text):
+        self._help[name] = ('counter', help_text)
+
+    def histogram(self, name, help_text, buckets):
+        self._help[name] = ('histogram', help_text)
+        self._buckets[name] = buckets
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self._buckets[name]
+        with self._lock:
+            data = self._histograms.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def counter_values(self, name, label):
+        """某个计数器按单个标签展开的取值，例如 {'copy': 3, 'encode': 5}。"""
+        with self._lock:
+            return {dict(labels).get(label): value
+                    for (n, labels), value in self._counters.items() if n == name}
+
+    def render(self, gauges=None):
+        """输出 Prometheus 文本格式；gauges 为 {名称: (说明, 取值)}，在调用时现算。"""
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(data) for key, data in self._histograms.items()}
+
+        for name, (kind, help_text) in self._help.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (n, labels), value in counters.items():
+                    if n == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            buckets = self._buckets[name]
+            for (n, labels), data in histograms.items():
+                if n != name:
+                    continue
+                for bound, count in zip(buckets, data):
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {data[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {data[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {data[-1]}')
+
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
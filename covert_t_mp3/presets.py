@@ -0,0 +1,36 @@
+# --- 命名输出预设 ---
+# ext：输出扩展名；mimetype：下载时的 Content-Type；
+# codec：ffprobe 中的编码名，源音频已是该编码时直接拷贝，None 表示总是重新编码；
+# args：ffmpeg 编码参数，同时参与缓存键的计算
+PRESETS = {
+    'mp3': {
+        'ext': 'mp3', 'mimetype': 'audio/mpeg', 'codec': 'mp3',
+        'args': ['-acodec', 'libmp3lame', '-q:a', '2'],
+    },
+    'mp3-128k': {
+        'ext': 'mp3', 'mimetype': 'audio/mpeg', 'codec': None,
+        'args': ['-acodec', 'libmp3lame', '-b:a', '128k'],
+    },
+    'aac': {
+        'ext': 'm4a', 'mimetype': 'audio/mp4', 'codec': 'aac',
+        'args': ['-acodec', 'aac', '-b:a', '192k', '-movflags', '+faststart'],
+    },
+    'opus': {
+        'ext': 'opus', 'mimetype': 'audio/ogg', 'codec': 'opus',
+        'args': ['-acodec', 'libopus', '-b:a', '128k'],
+    },
+}
+DEFAULT_PRESET = 'mp3'
+
+
+def parse_presets(value):
+    """解析逗号分隔的预设名（如 "mp3,aac,opus"），去重并保持顺序；为空时使用默认预设。"""
+    names = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in PRESETS:
+            raise ValueError(f"Unknown preset: {name}. Available: {', '.join(PRESETS)}")
+        names.append(name)
+    return names or [DEFAULT_PRESET]
@@ -0,0 +1,34 @@
+import json
+import subprocess
+
+
+# 只取第一条音轨；-vn/-sn/-dn 保证视频、字幕、数据流（包括 MP3 封面图）都不会被处理
+BASE_ARGS = ['-map', '0:a:0', '-vn', '-sn', '-dn']
+
+
+def probe(filepath):
+    """调用 ffprobe 读取容器与流信息（只解析头部，不解码）。"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', filepath
+    ], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def audio_streams(info):
+    return [s for s in info.get('streams', []) if s.get('codec_type') == 'audio']
+
+
+def choose_pipeline(info, preset):
+    """根据探测结果为某个输出预设选择代价最低的处理方式，返回 (名称, ffmpeg 输出参数)。
+
+    * copy   —— 音频已是目标编码（如 MP3 -> mp3 预设）：丢弃视频流，音频直接拷贝
+    * encode —— 其它情况：丢弃视频流，按预设参数完整编码
+    """
+    streams = audio_streams(info)
+    if not streams:
+        raise ValueError("No audio stream found in the uploaded file.")
+
+    if preset['codec'] and streams[0].get('codec_name') == preset['codec']:
+        return 'copy', BASE_ARGS + ['-acodec', 'copy']
+    return 'encode', BASE_ARGS + preset['args']
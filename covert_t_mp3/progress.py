@@ -0,0 +1,47 @@
+import subprocess
+import threading
+
+
+def parse_speed(value):
+    """ffmpeg 的 speed 字段形如 "12.3x"，无法计算时为 "N/A"。"""
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def run_ffmpeg(cmd, on_progress=None):
+    """运行 ffmpeg 并解析 `-progress pipe:1` 的机器可读输出。
+
+    每收到一组进度（以 progress=continue/end 结尾）调用 on_progress(已处理秒数, 速度倍数)。
+    失败时与 subprocess.run(check=True) 一样抛出 CalledProcessError，stderr 中带有错误信息。
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + cmd[1:]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # stderr 单独读取，防止管道写满后 ffmpeg 阻塞
+    stderr_lines = []
+    drain = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+    drain.start()
+
+    block = {}
+    for line in proc.stdout:
+        key, _, value = line.strip().partition('=')
+        block[key] = value
+        if key != 'progress':
+            continue
+        if on_progress:
+            try:
+                out_time = int(block.get('out_time_us', '')) / 1000000
+            except ValueError:
+                out_time = None
+            if out_time is not None:
+                on_progress(out_time, parse_speed(block.get('speed')))
+        block = {}
+
+    proc.wait()
+    drain.join()
+    stderr = ''.join(stderr_lines)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output='', stderr=stderr)
+    return stderr
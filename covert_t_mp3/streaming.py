@@ -0,0 +1,84 @@
+import subprocess
+import threading
+from collections import deque
+
+
+# 管道读写的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class PipeConversion:
+    """不落盘的转换：请求体直接写入 ffmpeg stdin，stdout 边编码边返回给客户端。
+
+    只适用于能从管道解复用的格式（mkv/webm/ts/flv/mp3/wav 等，
+    以及 moov 在文件头的 mp4）；moov 在文件尾的 mp4 需要走普通的 /convert。
+    """
+
+    def __init__(self, stream, output_args):
+        self._stream = stream
+        self._stderr_tail = deque(maxlen=20)
+        # bufsize=0：stdout 为无缓冲管道，read() 有多少返回多少，首字节延迟最低
+        self.proc = subprocess.Popen(
+            ['ffmpeg', '-hide_banner', '-i', 'pipe:0'] + output_args + ['pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            bufsize=0)
+        threading.Thread(target=self._feed, daemon=True).start()
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    @property
+    def error(self):
+        return ''.join(self._stderr_tail)
+
+    def read_first_chunk(self):
+        """阻塞到 ffmpeg 产出第一块数据；返回空字节串表示转换失败。"""
+        chunk = self.proc.stdout.read(CHUNK_SIZE)
+        if not chunk:
+            self.close()
+        return chunk
+
+    def iter_chunks(self, first_chunk):
+        """响应体生成器：客户端断开时由 finally 负责结束 ffmpeg 进程。"""
+        try:
+            yield first_chunk
+            while True:
+                chunk = self.proc.stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+            if self.proc.returncode:
+                # 响应头已发出，无法再改状态码，只能记录日志
+                print(f"!!! FFmpeg stream failed ({self.proc.returncode}) !!!")
+                print(f"STDERR: {self.error}")
+
+    def close(self):
+        if self.proc.poll() is None:
+            # 还有输出未读完说明客户端提前断开
+            self.proc.stdout.close()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+    def _feed(self):
+        try:
+            while True:
+                chunk = self._stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.proc.stdin.write(chunk)
+        except (BrokenPipeError, OSError, ValueError):
+            # ffmpeg 已退出（输入无法解析或客户端断开），停止写入即可
+            pass
+        finally:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def _drain_stderr(self):
+        # 持续读取 stderr，防止管道写满后 ffmpeg 阻塞
+        for line in iter(self.proc.stderr.readline, b''):
+            self._stderr_tail.append(line.decode('utf-8', 'replace'))
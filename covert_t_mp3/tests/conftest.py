@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 与 app.py 相同：模块直接按文件名导入
+HERE = os.path.dirname(os.path.abspath(__file__))
+for path in (os.path.dirname(HERE), os.path.join(os.path.dirname(HERE), '..', 'common')):
+    path = os.path.abspath(path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,61 @@
+import shutil
+import subprocess
+
+import pytest
+
+from presets import PRESETS
+from segmented import encode_segmented, iter_frames, DURATION_TOLERANCE, FRAME_SAMPLES
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg not installed")
+
+SAMPLE_RATE = 44100
+DURATION = 30
+SEGMENTS = 3
+
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', *args], check=True, capture_output=True)
+
+
+def decode(path):
+    """完整解码为单声道 PCM，返回 (采样数, ffmpeg 输出的错误信息)。"""
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-'],
+                            capture_output=True)
+    assert result.returncode == 0, result.stderr
+    return len(result.stdout) // 2, result.stderr.decode().strip()
+
+
+@pytest.fixture
+def tone(tmp_path):
+    path = str(tmp_path / 'tone.wav')
+    ffmpeg('-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate={SAMPLE_RATE}:duration={DURATION}',
+           '-c:a', 'pcm_s16le', path)
+    return path
+
+
+@pytest.mark.parametrize('preset', ['mp3', 'mp3-128k'])
+def test_segmented_matches_single_pass(tmp_path, tone, preset):
+    args = PRESETS[preset]['args']
+    total_samples = SAMPLE_RATE * DURATION
+
+    segmented = str(tmp_path / 'segmented.mp3')
+    frames = encode_segmented(tone, segmented, SAMPLE_RATE, total_samples, SEGMENTS, args)
+
+    # 单进程编码，参数与分段编码相同（关闭 bit reservoir、不写头），帧数应完全一致
+    raw = str(tmp_path / 'single-raw.mp3')
+    ffmpeg('-i', tone, *args, '-ar', str(SAMPLE_RATE), '-reservoir', '0', '-map_metadata', '-1',
+           '-id3v2_version', '0', '-write_xing', '0', '-f', 'mp3', raw)
+    with open(raw, 'rb') as f:
+        assert frames == sum(1 for _ in iter_frames(f))
+
+    # 普通的单进程编码（应用回退时的做法）
+    single = str(tmp_path / 'single.mp3')
+    ffmpeg('-i', tone, *args, '-f', 'mp3', single)
+
+    segmented_samples, errors = decode(segmented)
+    assert errors == ''
+    single_samples, _ = decode(single)
+    # 与 verify_joined 的容差相同：拼接结果没有 LAME 头中的编码延迟信息，解码后首尾多出不到一帧的静音
+    tolerance = DURATION_TOLERANCE * SAMPLE_RATE + FRAME_SAMPLES
+    assert abs(segmented_samples - total_samples) <= tolerance
+    assert abs(segmented_samples - single_samples) <= tolerance
@@ -1,7 +1,17 @@
-from flask import Flask, request, send_from_directory, render_template_string, redirect, url_for, make_response
+from flask import Flask, request, send_from_directory, render_template_string, redirect, url_for, jsonify, Response
 import os
-import urllib.parse
+import sys
+import time
+# 共享模块位于仓库根目录的 common/ 下；Docker 镜像中会直接复制到应用目录
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
 from werkzeug.utils import secure_filename
+from storage_manager import ExpiringStorage, is_managed
+from streaming_upload import receive_multipart, UploadError
+from chunked_upload import ChunkedUploads, UploadSessionNotFound, IncompleteUploadError
+from download import send_download
+from file_index import FileIndex, SORT_FIELDS
+from blob_store import BlobStore
+from zipstream import stream_zip
 
 
 app = Flask(__name__)
@@ -11,6 +21,42 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # 设置最大上传限制 2GB
 app.config['MAX_CONTENT_LENGTH'] = 2000 * 1024 * 1024 
+# 文件保留时间（秒），默认 7 天，到期后自动删除
+FILE_RETENTION = int(os.environ.get('FILE_RETENTION', 7 * 24 * 3600))
+# 上传目录容量上限，超出后按 STORAGE_POLICY 删除旧文件：oldest = 最早上传的，lru = 最久未下载的
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 20 * 1024 * 1024 * 1024))  # 20GB 默认值
+STORAGE_POLICY = os.environ.get('STORAGE_POLICY', 'oldest')
+# 下载发送方式：留空由 Python 发送；x-accel 交给 nginx（X-Accel-Redirect），x-sendfile 交给 Apache/lighttpd
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '')
+# x-accel 模式下 nginx 中对应上传目录的 internal location
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/protected-uploads')
+
+# 按内容寻址的去重存储：上传目录中的文件名都是指向 .blobs/ 中内容的硬链接
+blobs = BlobStore(UPLOAD_FOLDER)
+# 文件元数据索引（名称、大小、修改时间、SHA-256），供 /api/files 分页查询；
+# 文件名被删除（手动删除、过期、外部删除）后，没有其他文件名引用的内容随之删除
+files_index = FileIndex(UPLOAD_FOLDER, os.path.join(UPLOAD_FOLDER, '.checksums.json'),
+                        on_checksum=blobs.adopt, on_discard=lambda name, sha256: blobs.release(sha256))
+
+# 过期与容量管理：后台线程随应用启动，与启动方式（python app.py / gunicorn）无关
+storage = ExpiringStorage(UPLOAD_FOLDER, ttl=FILE_RETENTION, quota_bytes=STORAGE_QUOTA_BYTES, policy=STORAGE_POLICY,
+                          on_evict=lambda name, reason: files_index.discard(name))
+# 文件列表每页条数上限
+MAX_PAGE_SIZE = 200
+# 打包下载时不再压缩的扩展名（本身已经压缩的媒体、安装包、压缩包），其余文件使用 DEFLATE
+STORED_EXTENSIONS = {
+    'zip', 'rar', '7z', 'gz', 'tgz', 'bz2', 'xz', 'zst', 'jar', 'apk', 'ipa', 'dmg', 'deb', 'rpm',
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif',
+    'mp3', 'm4a', 'aac', 'ogg', 'opus', 'flac', 'mp4', 'm4v', 'mov', 'mkv', 'avi', 'webm',
+    'docx', 'xlsx', 'pptx', 'pdf',
+}
+# 打包下载的文件名
+ZIP_NAME_FORMAT = 'files-%Y%m%d-%H%M%S.zip'
+# 上传中的半成品放在上传目录下（同一文件系统，完成后可直接硬链接/重命名），中断遗留的 1 天后删除
+INCOMING_FOLDER = os.path.join(UPLOAD_FOLDER, '.incoming')
+incoming = ExpiringStorage(INCOMING_FOLDER, ttl=24 * 3600)
+# 分块上传会话（断点续传），单个文件大小上限与普通上传一致
+sessions = ChunkedUploads(incoming, blobs, app.config['MAX_CONTENT_LENGTH'])
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -31,6 +77,12 @@ HTML_TEMPLATE = '''
         .btn-download { background: #007bff; color: white; }
         .btn-delete { background: #dc3545; color: white; margin-left: 5px; }
         .btn-upload { background: #333; color: white; width: 100%; margin-top: 10px; padding: 12px; font-size: 16px; }
+        .btn-more { background: #eee; color: #333; width: 100%; margin-top: 10px; }
+        .toolbar { display: flex; gap: 5px; margin: 10px 0; }
+        .toolbar input { flex: 1; padding: 6px; }
+        .file-meta { display: block; font-size: 12px; color: #888; }
+        .file-check { margin-right: 8px; }
+        .btn-zip { background: #6c757d; color: white; }
         span { word-break: break-all; padding-right: 10px; }
     </style>
 </head>
@@ -46,41 +98,328 @@ HTML_TEMPLATE = '''
             </div>
         </div>
         <h3>文件列表</h3>
-        <div id="fileList">
-            {% for file in files %}
-            <div class="file-item">
-    <span>{{ file }}</span>
-    <div style="display: flex;">
-        <a href="/download/{{ file }}" class="btn btn-download">下载/保存</a>
-        <a href="/delete/{{ file }}" class="btn btn-delete" onclick="return confirm('确定要删除吗？')">删除</a>
-    </div>
-</div>
-            {% endfor %}
+        <div style="font-size: 12px; color: #888;">文件保留 {{ retention_days }} 天，空间不足时自动删除较早的文件</div>
+        <div class="toolbar">
+            <input type="search" id="searchInput" placeholder="按文件名筛选">
+            <select id="sortSelect">
+                <option value="mtime:desc">最新上传</option>
+                <option value="mtime:asc">最早上传</option>
+                <option value="name:asc">名称</option>
+                <option value="size:desc">大小</option>
+            </select>
+        </div>
+        <div class="toolbar">
+            <button class="btn btn-zip" onclick="downloadZip(false)">打包下载选中</button>
+            <button class="btn btn-zip" onclick="downloadZip(true)">打包下载全部</button>
         </div>
+        <div id="fileList"></div>
+        <button class="btn btn-more" id="moreButton" style="display: none;" onclick="loadFiles(false)">加载更多</button>
     </div>
 
     <script>
-    function uploadFile() {
+    // 分块上传：并行上传多个分块，中断后重新选择同一文件即可从断点继续
+    var PARALLEL = 4;       // 同时上传的分块数
+    var MAX_RETRIES = 5;    // 单个分块失败后的重试次数（间隔 1、2、4、8、16 秒）
+
+    var CRC_TABLE = (function() {
+        var table = new Uint32Array(256);
+        for (var n = 0; n < 256; n++) {
+            var c = n;
+            for (var k = 0; k < 8; k++) c = (c & 1) ? (0xEDB88320 ^ (c >>> 1)) : (c >>> 1);
+            table[n] = c;
+        }
+        return table;
+    })();
+
+    // 分块校验用 CRC32：页面多通过 http://局域网地址 访问，crypto.subtle 在非 HTTPS 下不可用
+    function crc32(bytes) {
+        var crc = 0xFFFFFFFF;
+        for (var i = 0; i < bytes.length; i++) crc = CRC_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+        return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, '0');
+    }
+
+    // 增量 SHA-256：上传前先把哈希发给服务端，已有相同内容时无需上传（秒传）
+    // crypto.subtle 只能一次性计算整个文件，且在 http 页面中不可用，因此自行实现
+    var SHA256_K = new Uint32Array([
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+        0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+        0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+        0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+        0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+        0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+        0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+    ]);
+
+    function Sha256() {
+        this.h = new Uint32Array([0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+                                  0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]);
+        this.w = new Uint32Array(64);
+        this.buffer = new Uint8Array(64);
+        this.bufferLength = 0;
+        this.length = 0;
+    }
+
+    Sha256.prototype.block = function(data, offset) {
+        var w = this.w, h = this.h, i;
+        for (i = 0; i < 16; i++) {
+            var j = offset + i * 4;
+            w[i] = (data[j] << 24) | (data[j + 1] << 16) | (data[j + 2] << 8) | data[j + 3];
+        }
+        for (i = 16; i < 64; i++) {
+            var x = w[i - 15], y = w[i - 2];
+            var s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+            var s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+            w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+        }
+        var a = h[0], b = h[1], c = h[2], d = h[3], e = h[4], f = h[5], g = h[6], k = h[7];
+        for (i = 0; i < 64; i++) {
+            var S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+            var t1 = (k + S1 + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+            var S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+            var t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            k = g; g = f; f = e; e = (d + t1) | 0; d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        h[0] += a; h[1] += b; h[2] += c; h[3] += d; h[4] += e; h[5] += f; h[6] += g; h[7] += k;
+    };
+
+    Sha256.prototype.update = function(data) {
+        var i = 0;
+        this.length += data.length;
+        if (this.bufferLength) {
+            while (this.bufferLength < 64 && i < data.length) this.buffer[this.bufferLength++] = data[i++];
+            if (this.bufferLength < 64) return;
+            this.block(this.buffer, 0);
+            this.bufferLength = 0;
+        }
+        for (; i + 64 <= data.length; i += 64) this.block(data, i);
+        while (i < data.length) this.buffer[this.bufferLength++] = data[i++];
+    };
+
+    Sha256.prototype.hex = function() {
+        var bits = this.length * 8;
+        var pad = new Uint8Array((this.bufferLength < 56 ? 56 : 120) - this.bufferLength + 8);
+        pad[0] = 0x80;
+        var high = Math.floor(bits / 0x100000000), low = bits >>> 0;
+        for (var i = 0; i < 4; i++) {
+            pad[pad.length - 8 + i] = (high >>> (24 - i * 8)) & 0xff;
+            pad[pad.length - 4 + i] = (low >>> (24 - i * 8)) & 0xff;
+        }
+        this.update(pad);
+        return Array.from(this.h).map(function(v) { return v.toString(16).padStart(8, '0'); }).join('');
+    };
+
+    var HASH_FIRST_LIMIT = 256 * 1024 * 1024;
+
+    async function hashFile(file) {
+        var hash = new Sha256();
+        var step = 4 * 1024 * 1024;
+        for (var offset = 0; offset < file.size; offset += step) {
+            hash.update(new Uint8Array(await file.slice(offset, offset + step).arrayBuffer()));
+            showProgress(offset, file.size, "正在计算校验和 " + Math.round(offset / file.size * 100) + "%");
+        }
+        return hash.hex();
+    }
+
+    function sleep(ms) { return new Promise(function(resolve) { setTimeout(resolve, ms); }); }
+
+    function showProgress(done, total, text) {
+        var percent = total ? (done / total) * 100 : 100;
+        document.getElementById('progressFill').style.width = percent + '%';
+        document.getElementById('status').innerHTML = text || ("已上传 " + Math.round(percent) + "%");
+    }
+
+    async function openSession(file) {
+        // 以 文件名+大小+修改时间 记住会话 ID，刷新页面或断网后可继续
+        var key = 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+        var uploadId = localStorage.getItem(key);
+        if (uploadId) {
+            var r = await fetch('/upload/sessions/' + uploadId);
+            if (r.ok) return [key, await r.json()];
+        }
+        // 大文件在浏览器里计算哈希较慢，直接上传，服务端完成时同样会去重
+        var sha256 = file.size <= HASH_FIRST_LIMIT ? await hashFile(file) : null;
+        var r = await fetch('/upload/sessions', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size, sha256: sha256})
+        });
+        if (!r.ok) throw new Error(await r.text());
+        var session = await r.json();
+        // 服务端已有相同内容：文件名已建立，无需上传
+        if (session.deduplicated) return [key, session];
+        localStorage.setItem(key, session.upload_id);
+        return [key, session];
+    }
+
+    function isReceived(ranges, start, end) {
+        return ranges.some(function(range) { return range[0] <= start && end <= range[1]; });
+    }
+
+    async function putChunk(session, file, offset) {
+        var blob = file.slice(offset, Math.min(offset + session.chunk_size, file.size));
+        var bytes = new Uint8Array(await blob.arrayBuffer());
+        for (var attempt = 0; ; attempt++) {
+            var r = null;
+            try {
+                r = await fetch('/upload/sessions/' + session.upload_id + '?offset=' + offset, {
+                    method: 'PUT',
+                    headers: {'X-Chunk-CRC32': crc32(bytes)},
+                    body: blob
+                });
+            } catch (e) {
+                // 网络中断：等待后重试
+            }
+            if (r && r.ok) return bytes.length;
+            // 4xx（除 408/429）说明请求本身有问题，重试无意义
+            if (r && r.status < 500 && r.status != 408 && r.status != 429) throw new Error(await r.text());
+            if (attempt >= MAX_RETRIES) throw new Error("分块 " + offset + " 多次重试仍失败");
+            await sleep(1000 * Math.pow(2, attempt));
+        }
+    }
+
+    // 文件列表：从 /api/files 分页加载，滚动到底部自动加载下一页
+    var PAGE_SIZE = 50;
+    var nextPage = 1, loading = false;
+
+    function formatSize(size) {
+        var units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        var i = 0;
+        while (size >= 1024 && i < units.length - 1) { size /= 1024; i++; }
+        return (i ? size.toFixed(1) : size) + ' ' + units[i];
+    }
+
+    function renderFile(file) {
+        var item = document.createElement('div');
+        item.className = 'file-item';
+        var check = document.createElement('input');
+        check.type = 'checkbox';
+        check.className = 'file-check';
+        check.value = file.name;
+        var name = document.createElement('span');
+        name.textContent = file.name;
+        var meta = document.createElement('small');
+        meta.className = 'file-meta';
+        meta.textContent = formatSize(file.size) + ' · ' + new Date(file.mtime * 1000).toLocaleString();
+        name.appendChild(meta);
+        var actions = document.createElement('div');
+        actions.style.display = 'flex';
+        var download = document.createElement('a');
+        download.className = 'btn btn-download';
+        download.textContent = '下载/保存';
+        download.href = '/download/' + encodeURIComponent(file.name);
+        var remove = document.createElement('a');
+        remove.className = 'btn btn-delete';
+        remove.textContent = '删除';
+        remove.href = '/delete/' + encodeURIComponent(file.name);
+        remove.onclick = function() { return confirm('确定要删除吗？'); };
+        actions.appendChild(download);
+        actions.appendChild(remove);
+        item.appendChild(check);
+        item.appendChild(name);
+        item.style.justifyContent = 'flex-start';
+        actions.style.marginLeft = 'auto';
+        item.appendChild(actions);
+        return item;
+    }
+
+    // 打包下载：以表单提交，由浏览器直接接收流式生成的 ZIP；“全部”按当前筛选条件
+    function downloadZip(all) {
+        var form = document.createElement('form');
+        form.method = 'POST';
+        form.action = '/download-zip';
+        function field(name, value) {
+            var input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = name;
+            input.value = value;
+            form.appendChild(input);
+        }
+        if (all) {
+            field('all', '1');
+            field('q', document.getElementById('searchInput').value);
+        } else {
+            var checked = document.querySelectorAll('.file-check:checked');
+            if (!checked.length) { alert("请先勾选文件！"); return; }
+            checked.forEach(function(check) { field('files', check.value); });
+        }
+        document.body.appendChild(form);
+        form.submit();
+        form.remove();
+    }
+
+    async function loadFiles(reset) {
+        if (loading) return;
+        loading = true;
+        if (reset) { nextPage = 1; document.getElementById('fileList').innerHTML = ''; }
+        var sort = document.getElementById('sortSelect').value.split(':');
+        var params = new URLSearchParams({
+            q: document.getElementById('searchInput').value,
+            sort: sort[0], order: sort[1], page: nextPage, per_page: PAGE_SIZE
+        });
+        try {
+            var r = await fetch('/api/files?' + params);
+            var data = await r.json();
+            var list = document.getElementById('fileList');
+            data.items.forEach(function(file) { list.appendChild(renderFile(file)); });
+            nextPage = data.page + 1;
+            document.getElementById('moreButton').style.display = data.page * data.per_page < data.total ? 'block' : 'none';
+        } finally {
+            loading = false;
+        }
+    }
+
+    var searchTimer = null;
+    document.getElementById('searchInput').addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(function() { loadFiles(true); }, 300);
+    });
+    document.getElementById('sortSelect').addEventListener('change', function() { loadFiles(true); });
+    new IntersectionObserver(function(entries) {
+        if (entries[0].isIntersecting) loadFiles(false);
+    }).observe(document.getElementById('moreButton'));
+    loadFiles(true);
+
+    async function uploadFile() {
         var fileInput = document.getElementById('fileInput');
         if (fileInput.files.length === 0) { alert("请先选择文件！"); return; }
         var file = fileInput.files[0];
-        var formData = new FormData();
-        formData.append("file", file);
-        var xhr = new XMLHttpRequest();
         document.getElementById('progressWrapper').style.display = 'block';
-        xhr.upload.onprogress = function(e) {
-            if (e.lengthComputable) {
-                var percent = (e.loaded / e.total) * 100;
-                document.getElementById('progressFill').style.width = percent + '%';
-                document.getElementById('status').innerHTML = "已上传 " + Math.round(percent) + "%";
+        try {
+            var opened = await openSession(file);
+            var key = opened[0], session = opened[1];
+            if (session.deduplicated) {
+                showProgress(file.size, file.size, "服务器已有相同文件，无需上传");
+                location.reload();
+                return;
             }
-        };
-        xhr.onload = function() {
-            if (xhr.status == 200) { location.reload(); }
-            else { alert("上传失败"); }
-        };
-        xhr.open("POST", "/upload", true);
-        xhr.send(formData);
+            var pending = [];
+            var done = 0;
+            for (var offset = 0; offset < file.size; offset += session.chunk_size) {
+                var end = Math.min(offset + session.chunk_size, file.size);
+                if (isReceived(session.received, offset, end)) done += end - offset;
+                else pending.push(offset);
+            }
+            showProgress(done, file.size, done ? "从断点继续，已上传 " + Math.round(done / file.size * 100) + "%" : null);
+
+            async function worker() {
+                while (pending.length) {
+                    done += await putChunk(session, file, pending.shift());
+                    showProgress(done, file.size);
+                }
+            }
+            var workers = [];
+            for (var i = 0; i < PARALLEL; i++) workers.push(worker());
+            await Promise.all(workers);
+
+            showProgress(file.size, file.size, "正在校验...");
+            var r = await fetch('/upload/sessions/' + session.upload_id + '/complete', {method: 'POST'});
+            if (!r.ok) throw new Error(await r.text());
+            localStorage.removeItem(key);
+            location.reload();
+        } catch (e) {
+            document.getElementById('status').innerHTML = "上传中断：" + e.message + "（重新选择同一文件并点击上传即可继续）";
+        }
     }
     </script>
 </body>
@@ -89,42 +428,185 @@ HTML_TEMPLATE = '''
 
 @app.route('/')
 def index():
-    files = os.listdir(UPLOAD_FOLDER)
-    return render_template_string(HTML_TEMPLATE, files=files)
+    # 文件列表由页面脚本从 /api/files 分页加载
+    return render_template_string(HTML_TEMPLATE, retention_days='%g' % (FILE_RETENTION / 86400))
+
+@app.route('/api/files')
+def list_files():
+    """文件列表：?q=关键字&sort=name|size|mtime&order=asc|desc&page=1&per_page=50"""
+    sort = request.args.get('sort', 'mtime')
+    order = request.args.get('order', 'desc')
+    if sort not in SORT_FIELDS or order not in ('asc', 'desc'):
+        return "Invalid sort", 400
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(MAX_PAGE_SIZE, max(1, request.args.get('per_page', 50, type=int)))
+    total, items = files_index.query(request.args.get('q', ''), sort, order, (page - 1) * per_page, per_page)
+    return jsonify({'total': total, 'page': page, 'per_page': per_page, 'items': items})
+
+def register_upload(item):
+    """新文件名已建立：纳入过期/容量管理与元数据索引。"""
+    storage.add(item['filename'])
+    files_index.add(item['filename'], item['sha256'])
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files: return "No file", 400
-    file = request.files['file']
-    if file.filename != '':
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(UPLOAD_FOLDER, filename))
-    return "OK", 200
+    # 直接解析请求体并写入目标文件，不访问 request.files（否则 werkzeug 会先整体落到临时文件再复制一遍）
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary: return "No file", 400
+    # 每个文件存入后立即登记：后面的部分出错时，前面已经存入的文件照常可用，并在错误响应中列出
+    saved = []
+    def on_saved(item):
+        register_upload(item)
+        saved.append(item)
+    try:
+        receive_multipart(request.stream, boundary.encode('latin-1'), incoming, blobs, on_saved)
+    except UploadError as e:
+        return jsonify({'error': str(e), 'files': saved}), 400
+    return jsonify({'files': saved}), 200
+
+# --- 分块上传（断点续传） ---
+# 1. POST /upload/sessions {"filename", "size", "chunk_size"?, "sha256"?} 创建会话；
+#    服务端已有相同 sha256 + size 的内容时直接建立文件名并返回 200（"deduplicated": true），无需上传
+# 2. PUT  /upload/sessions/<id>?offset=N 上传一个分块，可并行；X-Chunk-CRC32 / X-Chunk-SHA256 头用于校验
+# 3. GET  /upload/sessions/<id> 查询已收到的区间，用于中断后续传
+# 4. POST /upload/sessions/<id>/complete 全部到齐后合并为正式文件
+def read_body(limit):
+    """读取请求体，最多 limit 字节（多读 1 字节用于判断是否超长）。"""
+    chunks = []
+    remaining = limit + 1
+    while remaining > 0:
+        data = request.stream.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+    return b''.join(chunks)
+
+@app.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    params = request.get_json(silent=True) or {}
+    sha256, size = (params.get('sha256') or '').lower(), params.get('size')
+    filename = secure_filename(params.get('filename') or '')
+    if filename and blobs.has(sha256, size):
+        filename = blobs.link(sha256, filename)
+        if filename:
+            saved = {'filename': filename, 'size': size, 'sha256': sha256, 'deduplicated': True}
+            register_upload(saved)
+            return jsonify(saved), 200
+    try:
+        session = sessions.create(params.get('filename'), params.get('size'),
+                                  params.get('chunk_size'), params.get('sha256'))
+    except UploadError as e:
+        return str(e), 400
+    return jsonify(session), 201
+
+@app.route('/upload/sessions/<upload_id>', methods=['GET'])
+def upload_session_status(upload_id):
+    try:
+        return jsonify(sessions.status(upload_id))
+    except UploadSessionNotFound:
+        return "上传会话不存在或已过期", 404
+
+@app.route('/upload/sessions/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    if offset is None: return "Missing offset", 400
+    try:
+        chunk_size = sessions.info(upload_id)['chunk_size']
+        sessions.write_chunk(upload_id, offset, read_body(chunk_size),
+                             crc32=request.headers.get('X-Chunk-CRC32'),
+                             sha256=request.headers.get('X-Chunk-SHA256'))
+    except UploadSessionNotFound:
+        return "上传会话不存在或已过期", 404
+    except UploadError as e:
+        return str(e), 400
+    return "", 204
+
+@app.route('/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    try:
+        saved = sessions.finalize(upload_id)
+    except UploadSessionNotFound:
+        return "上传会话不存在或已过期", 404
+    except IncompleteUploadError as e:
+        return str(e), 409
+    except UploadError as e:
+        return str(e), 400
+    register_upload(saved)
+    return jsonify(saved), 200
+
+@app.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+def abort_upload_session(upload_id):
+    try:
+        sessions.abort(upload_id)
+    except UploadSessionNotFound:
+        return "上传会话不存在或已过期", 404
+    return "", 204
+
+def download_validators(filename):
+    """下载响应的缓存验证依据：(文件状态, 内容 SHA-256)，在刷新访问顺序之前取得。
+
+    索引中的校验和只在大小与修改时间都与当前文件一致时使用；文件不存在时返回 (None, None)。
+    """
+    if not is_managed(filename):
+        return None, None
+    try:
+        stat = os.stat(storage.path_for(filename))
+    except OSError:
+        return None, None
+    entry = files_index.get(filename)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return stat, entry['sha256']
+    return stat, None
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(file_path):
+    stat, sha256 = download_validators(filename)
+    # 同时刷新 LRU 顺序（STORAGE_POLICY=lru 时最近下载的文件最后被淘汰）；
+    # 其他 worker 进程上传、或手动拷入的文件不在本进程的索引中，按磁盘上的实际情况登记
+    file_path = storage.touch(filename, discover=True)
+    if not file_path or stat is None:
         return "文件不存在", 404
 
-    encoded_filename = urllib.parse.quote(filename)
-    
-    from flask import send_file
-    response = make_response(send_file(file_path))
+    # 支持 Range（多线程下载、断点续传）与 ETag 缓存验证，可选交给前端代理发送
+    return send_download(request, file_path, filename, offload=DOWNLOAD_OFFLOAD or None,
+                         accel_prefix=X_ACCEL_PREFIX, stat=stat, sha256=sha256)
+
+def select_zip_entries(values):
+    """按 files=a&files=b，或 all=1（可配合 q= 只打包匹配的文件）选出要打包的 [(文件名, 路径)]。"""
+    if values.get('all'):
+        names = [item['name'] for item in files_index.query(values.get('q', ''), 'name', 'asc', limit=None)[1]]
+    else:
+        names = values.getlist('files')
+    # 只接受上传目录中实际存在的文件，防止 ../ 之类的路径
+    paths = [(name, storage.touch(name, discover=True)) for name in dict.fromkeys(names) if name and '/' not in name]
+    return [(name, path) for name, path in paths if path]
+
+def zip_compress(arcname):
+    return arcname.rsplit('.', 1)[-1].lower() not in STORED_EXTENSIONS
 
-    content_disposition = f"attachment; filename=\"{encoded_filename}\"; filename*=UTF-8''{encoded_filename}"
-    
-    response.headers["Content-Disposition"] = content_disposition
-    response.headers["Content-Type"] = "application/octet-stream"
-    response.headers["Cache-Control"] = "no-cache"
+@app.route('/download-zip', methods=['GET', 'POST'])
+def download_zip():
+    """多个文件打包下载（参数见 select_zip_entries）。
 
+    ZIP 边生成边发送，不落临时文件；已压缩的格式直接存储，不再重复压缩。
+    """
+    entries = select_zip_entries(request.values)
+    if not entries:
+        return "文件不存在", 404
+
+    response = Response(stream_zip(entries, zip_compress), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{time.strftime(ZIP_NAME_FORMAT)}"'
     return response
 
 @app.route('/delete/<filename>')
 def delete_file(filename):
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # 只能删除上传的文件：校验和缓存、.blobs、.incoming 等内部文件与目录一律 404
+    if not is_managed(filename) or not os.path.isfile(storage.path_for(filename)):
+        return "文件不存在", 404
+    # 先删除目录项，再移出文件索引：索引通知内容存储释放对应的 blob（没有其他硬链接时删除）
+    storage.remove(filename)
+    files_index.discard(filename)
     return redirect(url_for('index'))
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+# 异步（ASGI）生产入口：python asgi.py（或 uvicorn asgi:app --host 0.0.0.0 --port 5000 --timeout-keep-alive 75）
+#
+# 上传、分块上传、下载、打包下载这些耗时长的传输在事件循环中处理：慢速客户端只占一个协程，
+# 磁盘读写以短任务的形式交给线程池，不会在整个传输期间占用线程，数百个并发的长传输也只需很少的内存。
+# 其余页面与接口（首页、文件列表、会话管理、删除）仍由 Flask 应用处理，URL 与页面行为与 python app.py 完全一致。
+import os
+import time
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_options_header
+
+import app as site
+from chunked_upload import UploadSessionNotFound
+from download import prepare_download, iter_ranges
+from streaming_upload import MultipartReceiver, UploadError
+from zipstream import stream_zip
+
+
+# --- 配置 ---
+# 请求体攒够这么多再交给线程池写入磁盘，兼顾系统调用次数与每个连接的内存占用
+FEED_SIZE = 256 * 1024
+# 下载时每次从文件读取的块大小：慢速客户端的连接上最多积压一两块，块越小并发连接的内存占用越低
+SEND_BLOCK_SIZE = 128 * 1024
+# 打包下载 POST 表单（文件名列表）的大小上限
+MAX_FORM_SIZE = 1024 * 1024
+# 交给 Flask 处理的请求使用的线程数
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 10))
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+# --- 内部实现 ---
+async def read_batches(request, limit=None):
+    """按 FEED_SIZE 聚合请求体；总长度超过 limit 时抛出 RequestTooLarge。"""
+    declared = request.headers.get('content-length')
+    if limit is not None and declared and declared.isdigit() and int(declared) > limit:
+        raise RequestTooLarge()
+    buffer = bytearray()
+    total = 0
+    async for data in request.stream():
+        total += len(data)
+        if limit is not None and total > limit:
+            raise RequestTooLarge()
+        buffer += data
+        if len(buffer) >= FEED_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+# --- 对外接口（与 app.py 中的同名路由行为一致） ---
+async def upload_file(request):
+    content_type, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get('boundary')
+    if content_type != 'multipart/form-data' or not boundary:
+        return PlainTextResponse("No file", 400)
+    # 每次写入的数据已经攒到 FEED_SIZE，不再需要大的写缓冲
+    # 每个文件存入后立即登记（在线程池中调用），后面的部分出错时错误响应中列出已经存入的文件
+    receiver = MultipartReceiver(boundary.encode('latin-1'), site.incoming, site.blobs, write_buffer=FEED_SIZE,
+                                 on_saved=site.register_upload)
+    try:
+        async for chunk in read_batches(request, site.app.config['MAX_CONTENT_LENGTH']):
+            await run_in_threadpool(receiver.feed, chunk)
+            if receiver.done:
+                break
+        if not receiver.done:
+            await run_in_threadpool(receiver.feed, b'')
+    except UploadError as e:
+        return JSONResponse({'error': str(e), 'files': receiver.saved}, 400)
+    except RequestTooLarge:
+        return JSONResponse({'error': "Request Entity Too Large", 'files': receiver.saved}, 413)
+    except ClientDisconnect:
+        return Response(status_code=400)
+    finally:
+        await run_in_threadpool(receiver.close)
+    return JSONResponse({'files': receiver.saved})
+
+
+async def upload_chunk(request):
+    upload_id = request.path_params['upload_id']
+    offset = request.query_params.get('offset', '')
+    if not offset.lstrip('-').isdigit():
+        return PlainTextResponse("Missing offset", 400)
+    try:
+        writer = await run_in_threadpool(site.sessions.open_chunk, upload_id, int(offset),
+                                         request.headers.get('X-Chunk-CRC32'), request.headers.get('X-Chunk-SHA256'))
+    except UploadSessionNotFound:
+        return PlainTextResponse("上传会话不存在或已过期", 404)
+    except UploadError as e:
+        return PlainTextResponse(str(e), 400)
+    # 分块边收边写，不在内存中攒整个分块
+    try:
+        async for data in read_batches(request):
+            await run_in_threadpool(writer.write, data)
+        await run_in_threadpool(writer.finish)
+    except UploadError as e:
+        return PlainTextResponse(str(e), 400)
+    except ClientDisconnect:
+        return Response(status_code=400)
+    finally:
+        await run_in_threadpool(writer.close)
+    return Response(status_code=204)
+
+
+async def download_file(request):
+    filename = request.path_params['filename']
+    stat, sha256 = await run_in_threadpool(site.download_validators, filename)
+    file_path = await run_in_threadpool(site.storage.touch, filename, True)
+    if not file_path or stat is None:
+        return PlainTextResponse("文件不存在", 404)
+    status, headers, ranges, parts = await run_in_threadpool(
+        prepare_download, request.headers, file_path, filename, site.DOWNLOAD_OFFLOAD or None, site.X_ACCEL_PREFIX,
+        stat, sha256)
+    if ranges is None or request.method == 'HEAD':
+        return Response(status_code=status, headers=headers)
+    # 同步生成器由 StreamingResponse 逐块放到线程池中读取
+    return StreamingResponse(iter_ranges(file_path, ranges, parts, SEND_BLOCK_SIZE), status_code=status, headers=headers)
+
+
+async def download_zip(request):
+    pairs = parse_qsl(request.url.query)
+    if request.method == 'POST':
+        body = b''
+        try:
+            async for data in read_batches(request, MAX_FORM_SIZE):
+                body += data
+        except RequestTooLarge:
+            return PlainTextResponse("Request Entity Too Large", 413)
+        pairs += parse_qsl(body.decode('latin-1'))
+    entries = await run_in_threadpool(site.select_zip_entries, MultiDict(pairs))
+    if not entries:
+        return PlainTextResponse("文件不存在", 404)
+    headers = {'Content-Disposition': f'attachment; filename="{time.strftime(site.ZIP_NAME_FORMAT)}"'}
+    return StreamingResponse(stream_zip(entries, site.zip_compress), media_type='application/zip', headers=headers)
+
+
+app = Starlette(routes=[
+    Route('/upload', upload_file, methods=['POST']),
+    Route('/upload/sessions/{upload_id}', upload_chunk, methods=['PUT']),
+    Route('/download/{filename}', download_file, methods=['GET']),
+    Route('/download-zip', download_zip, methods=['GET', 'POST']),
+    # 其余请求（包括上面路径的其他方法）交给 Flask
+    Mount('/', app=WSGIMiddleware(site.app, workers=WSGI_THREADS)),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+    # 空闲连接保持 75 秒（与 nginx 默认一致）：页面在两次请求之间可能要花几秒计算校验和，
+    # 默认的 5 秒容易让浏览器复用一个刚被服务端关闭的连接
+    uvicorn.run(app, host='0.0.0.0', port=5000, timeout_keep_alive=75)
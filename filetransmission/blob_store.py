@@ -0,0 +1,145 @@
+import errno
+import os
+import re
+
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobStore:
+    """按内容寻址的去重存储。
+
+    文件内容以 SHA-256 为键保存在 <folder>/.blobs/<前两位>/<哈希> 中，
+    上传目录里用户看到的文件名只是指向这些内容的硬链接：
+    * 相同内容重复上传不再占用额外空间，只多一个目录项
+    * 引用计数由文件系统维护（st_nlink），最后一个文件名删除后 release() 删除内容
+    * 文件名冲突时自动改名（name_1.ext、name_2.ext ...），不再覆盖别人的文件
+    * 下载、列表、打包、过期清理仍按普通文件处理，无需感知存储方式
+
+    文件系统不支持硬链接时（部分网络盘、FAT 格式的外置硬盘），退回为普通文件，不做去重。
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.blob_folder = os.path.join(folder, '.blobs')
+        os.makedirs(self.blob_folder, exist_ok=True)
+        self.links_supported = True
+        self.collect_garbage()
+
+    # --- 对外接口 ---
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_folder, sha256[:2], sha256)
+
+    def has(self, sha256, size=None):
+        """是否已有该内容；提供 size 时同时核对大小。"""
+        if not SHA256_RE.match(sha256 or ''):
+            return False
+        try:
+            stat = os.stat(self.blob_path(sha256))
+        except FileNotFoundError:
+            return False
+        return size is None or stat.st_size == size
+
+    def store(self, src_path, sha256, filename):
+        """把已算好哈希的文件放入存储并以 filename 引用，返回实际使用的文件名（冲突时会改名）。
+
+        已有相同内容时直接丢弃 src_path，只新增一个引用。
+        """
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # 已有的内容可能恰好被其他 worker 启动时的垃圾回收删除，此时用 src_path 重新放入一次
+        for _ in range(2):
+            if not self.links_supported:
+                return self._place(src_path, filename)
+            try:
+                os.link(src_path, blob)
+            except FileExistsError:
+                pass  # 相同内容已存在
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.EXDEV, errno.ENOTSUP, errno.EMLINK):
+                    raise
+                print(f"Hard links are not supported in {self.folder} ({e}), storing files without deduplication")
+                self.links_supported = False
+                continue
+            name = self.link(sha256, filename)
+            if name:
+                # 文件名建立后再删除上传的副本，内容在整个过程中始终至少有一个引用
+                os.remove(src_path)
+                return name
+        raise OSError(f"Could not store blob {sha256}")
+
+    def link(self, sha256, filename):
+        """为已有内容新增一个文件名引用，返回实际使用的文件名。
+
+        同名文件已指向相同内容时直接复用（重复上传同一个文件不会产生 name_1）；内容不存在时返回 None。
+        """
+        blob = self.blob_path(sha256)
+        for name in self._candidates(filename):
+            dest = os.path.join(self.folder, name)
+            try:
+                os.link(blob, dest)
+                return name
+            except FileExistsError:
+                try:
+                    if os.path.samefile(dest, blob):
+                        return name
+                except FileNotFoundError:
+                    return None
+            except FileNotFoundError:
+                return None
+
+    def adopt(self, name, sha256):
+        """把不是经由 store() 进入上传目录的文件（手动拷入、启用去重前的旧文件）登记为该内容的存储，
+        之后相同内容的上传即可去重。"""
+        if not self.links_supported:
+            return
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(os.path.join(self.folder, name), blob)
+        except (FileExistsError, FileNotFoundError):
+            pass
+        except OSError as e:
+            print(f"Could not add {name} to the blob store: {e}")
+
+    def release(self, sha256):
+        """某个文件名被删除后调用：没有文件名再引用该内容时删除内容本身。"""
+        if not SHA256_RE.match(sha256 or ''):
+            return
+        blob = self.blob_path(sha256)
+        try:
+            if os.stat(blob).st_nlink == 1:
+                os.remove(blob)
+        except FileNotFoundError:
+            pass
+
+    def collect_garbage(self):
+        """启动时清理没有任何文件名引用的内容（进程中途退出、其他 worker 删除等情况遗留）。"""
+        for prefix in os.scandir(self.blob_folder):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.stat().st_nlink == 1:
+                    os.remove(entry.path)
+                    print(f"Removed unreferenced blob: {entry.name}")
+
+    # --- 内部实现 ---
+    def _candidates(self, filename):
+        yield filename
+        stem, ext = os.path.splitext(filename)
+        n = 1
+        while True:
+            yield f"{stem}_{n}{ext}"
+            n += 1
+
+    def _place(self, src_path, filename):
+        """不支持硬链接时：按文件名放置普通文件，同样在冲突时改名。"""
+        for name in self._candidates(filename):
+            dest = os.path.join(self.folder, name)
+            try:
+                # 先独占创建占位文件，确保并发上传同名文件时不会互相覆盖
+                os.close(os.open(dest, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                continue
+            os.replace(src_path, dest)
+            return name
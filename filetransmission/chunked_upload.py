@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import re
+import uuid
+import zlib
+
+from werkzeug.utils import secure_filename
+
+from streaming_upload import UploadError, PARTIAL_SUFFIX
+
+
+# 分块大小：默认 8MB，客户端可在 [MIN_CHUNK_SIZE, MAX_CHUNK_SIZE] 范围内自行指定
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# 完成时计算整文件 SHA-256 的读取块大小
+HASH_READ_SIZE = 4 * 1024 * 1024
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadSessionNotFound(Exception):
+    """上传会话不存在（ID 错误、已完成或已过期被清理）。"""
+
+
+class IncompleteUploadError(UploadError):
+    """还有分块没有收到，不能完成上传。"""
+
+
+def merge_ranges(ranges):
+    """合并 [start, end) 区间列表。"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class ChunkWriter:
+    """按偏移 pwrite 写入一个分块，边写边计算校验值；finish() 校验通过后才记入 .chunks。
+
+    校验失败或中途断开时已写入的数据不会被记录，客户端重传该分块即可覆盖。
+    part_path 为 None 表示该分块已经收到过：照常校验但不再写入，避免出错的重传破坏已确认的数据。
+    on_finish() 在分块通过校验后调用。
+    """
+
+    def __init__(self, part_path, log_path, offset, length, crc32=None, sha256=None, on_finish=None):
+        self.log_path = log_path
+        self.on_finish = on_finish
+        self.offset = offset
+        self.length = length
+        self.written = 0
+        self._crc32 = crc32
+        self._sha256 = sha256
+        self._crc = 0
+        self._digest = hashlib.sha256() if sha256 is not None else None
+        self._received = part_path is None
+        self._fd = None if self._received else os.open(part_path, os.O_WRONLY)
+
+    def write(self, data):
+        if self.written + len(data) > self.length:
+            raise UploadError(f"Chunk at {self.offset} must be {self.length} bytes, got more")
+        view = memoryview(data)
+        while view and not self._received:
+            n = os.pwrite(self._fd, view, self.offset + self.written)
+            self.written += n
+            view = view[n:]
+        self.written += len(view)
+        if self._crc32 is not None:
+            self._crc = zlib.crc32(data, self._crc)
+        if self._digest:
+            self._digest.update(data)
+
+    def finish(self):
+        if self.written != self.length:
+            raise UploadError(f"Chunk at {self.offset} must be {self.length} bytes, got {self.written}")
+        if self._crc32 is not None and '%08x' % self._crc != self._crc32.lower():
+            raise UploadError(f"CRC32 mismatch for chunk at {self.offset}")
+        if self._digest and self._digest.hexdigest() != self._sha256.lower():
+            raise UploadError(f"SHA-256 mismatch for chunk at {self.offset}")
+        if not self._received:
+            # 写完数据再记录，记录中出现的分块一定已完整落盘（对当前进程可见）
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, f"{self.offset} {self.offset + self.length}\n".encode())
+            finally:
+                os.close(fd)
+        if self.on_finish:
+            self.on_finish()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ChunkedUploads:
+    """可断点续传、可并行的分块上传。
+
+    每个会话在 incoming 目录下对应三个文件：
+    * <id>.json   会话信息（文件名、总大小、分块大小），创建时一次写入
+    * <id>.part   预分配为总大小的目标文件，各分块按偏移 pwrite 写入，互不影响
+    * <id>.chunks 已收到的分块记录，每行 "起始 结束"，以 O_APPEND 追加
+
+    状态全部在磁盘上，因此多个 gunicorn worker 之间、进程重启后都能继续同一个会话；
+    三个文件都登记在 incoming（ExpiringStorage）中，每收到一个分块都重新计算到期时间，
+    因此到期按最后一次活动计算：长时间上传的大文件不会中途过期，放弃的会话闲置 ttl 秒后自动删除。
+    """
+
+    def __init__(self, incoming, blobs, max_size):
+        self.incoming = incoming
+        self.blobs = blobs
+        self.max_size = max_size
+
+    # --- 对外接口 ---
+    def create(self, filename, size, chunk_size=None, sha256=None):
+        """创建会话，返回会话状态（同 status）。"""
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError("Invalid filename")
+        if not isinstance(size, int) or size < 0:
+            raise UploadError("Invalid size")
+        if size > self.max_size:
+            raise UploadError(f"File too large (limit {self.max_size} bytes)")
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if not isinstance(chunk_size, int) or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}")
+
+        upload_id = uuid.uuid4().hex
+        info = {'upload_id': upload_id, 'filename': filename, 'size': size,
+                'chunk_size': chunk_size, 'sha256': sha256}
+
+        # 预分配目标文件（稀疏文件，不实际占用空间）
+        with open(self._path(upload_id, PARTIAL_SUFFIX), 'wb') as f:
+            f.truncate(size)
+        open(self._path(upload_id, '.chunks'), 'wb').close()
+        # 会话信息最后写入并原子重命名：.json 存在即表示会话完整可用
+        tmp_path = self._path(upload_id, '.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_path, self._path(upload_id, '.json'))
+        for suffix in (PARTIAL_SUFFIX, '.chunks', '.json'):
+            self.incoming.add(upload_id + suffix)
+        return self.status(upload_id)
+
+    def info(self, upload_id):
+        """会话信息（不含已收到的区间）。"""
+        self._check_id(upload_id)
+        try:
+            with open(self._path(upload_id, '.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionNotFound(upload_id)
+
+    def status(self, upload_id):
+        """会话状态，received 为已收到的 [起始, 结束) 区间列表。"""
+        info = self.info(upload_id)
+        received = merge_ranges(self._received(upload_id))
+        info.pop('sha256', None)
+        info['received'] = received
+        info['received_bytes'] = sum(end - start for start, end in received)
+        return info
+
+    def write_chunk(self, upload_id, offset, data, crc32=None, sha256=None):
+        """写入一个完整的分块（见 open_chunk）。"""
+        writer = self.open_chunk(upload_id, offset, crc32, sha256)
+        try:
+            writer.write(data)
+            writer.finish()
+        finally:
+            writer.close()
+
+    def open_chunk(self, upload_id, offset, crc32=None, sha256=None):
+        """开始写入一个分块，返回 ChunkWriter，请求体可以边收边写，不必整块读入内存。
+
+        offset 必须是分块大小的整数倍，写入的长度必须等于该分块的应有长度；
+        提供 crc32（8 位十六进制）或 sha256 时校验内容。
+        """
+        info = self.info(upload_id)
+        size, chunk_size = info['size'], info['chunk_size']
+        if offset < 0 or offset >= size or offset % chunk_size:
+            raise UploadError(f"Invalid offset {offset}")
+        end = min(offset + chunk_size, size)
+        received = any(start <= offset and end <= stop for start, stop in merge_ranges(self._received(upload_id)))
+        return ChunkWriter(None if received else self._path(upload_id, PARTIAL_SUFFIX), self._path(upload_id, '.chunks'),
+                           offset, end - offset, crc32, sha256, on_finish=lambda: self._renew(upload_id))
+
+    def finalize(self, upload_id):
+        """所有分块到齐后计算整文件 SHA-256 并存入内容存储，返回 {'filename', 'size', 'sha256'}（filename 为实际使用的文件名）。"""
+        info = self.info(upload_id)
+        received = merge_ranges(self._received(upload_id))
+        if info['size'] and received != [[0, info['size']]]:
+            raise IncompleteUploadError("Upload is missing chunks")
+
+        part_path = self._path(upload_id, PARTIAL_SUFFIX)
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            while True:
+                block = f.read(HASH_READ_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+        if info['sha256'] and digest.hexdigest() != info['sha256'].lower():
+            self.abort(upload_id)
+            raise UploadError("SHA-256 of the assembled file does not match")
+
+        try:
+            filename = self.blobs.store(part_path, digest.hexdigest(), info['filename'])
+        except FileNotFoundError:
+            # 另一个请求已经完成了同一个会话
+            raise UploadSessionNotFound(upload_id)
+        self.abort(upload_id)
+        return {'filename': filename, 'size': info['size'], 'sha256': digest.hexdigest()}
+
+    def abort(self, upload_id):
+        """删除会话的全部文件。"""
+        self._check_id(upload_id)
+        for suffix in ('.json', PARTIAL_SUFFIX, '.chunks'):
+            self.incoming.remove(upload_id + suffix)
+
+    # --- 内部实现 ---
+    def _check_id(self, upload_id):
+        if not UPLOAD_ID_RE.match(upload_id):
+            raise UploadSessionNotFound(upload_id)
+
+    def _renew(self, upload_id):
+        for suffix in (PARTIAL_SUFFIX, '.chunks', '.json'):
+            self.incoming.renew(upload_id + suffix)
+
+    def _path(self, upload_id, suffix):
+        return self.incoming.path_for(upload_id + suffix)
+
+    def _received(self, upload_id):
+        try:
+            with open(self._path(upload_id, '.chunks')) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            raise UploadSessionNotFound(upload_id)
+        ranges = []
+        for line in lines:
+            start, _, end = line.partition(' ')
+            # 忽略进程中途退出时可能写了一半的最后一行
+            if start.isdigit() and end.isdigit():
+                ranges.append((int(start), int(end)))
+        return ranges
@@ -0,0 +1,192 @@
+import mimetypes
+import os
+import urllib.parse
+import uuid
+
+from flask import Response
+from werkzeug.http import http_date, parse_date, parse_etags
+from werkzeug.utils import get_content_type
+from werkzeug.wsgi import wrap_file
+
+
+# 每次从文件读取的块大小（Python 自行发送时）
+READ_SIZE = 1024 * 1024
+# 单个请求最多接受的区间数，超过则忽略 Range 返回完整文件，防止大量小区间拖慢服务
+MAX_RANGES = 32
+
+
+def file_etag(stat, sha256=None):
+    """强 ETag：已知内容的 SHA-256 时直接使用，否则由文件大小与 inode 组成。
+
+    不包含修改时间：mtime 可能在内容不变时被改写（touch、复制时保留属性等），
+    上传目录中的文件内容不会原地修改（内容存储以硬链接提供，替换时换成新的 inode）。
+    """
+    if sha256:
+        return '"%s"' % sha256
+    return '"%x-%x"' % (stat.st_size, stat.st_ino)
+
+
+def parse_ranges(header, size):
+    """解析 Range 头，返回合并后的 [(起始, 结束)] 列表（结束不含）。
+
+    语法无效或区间过多时返回 None（按规范忽略 Range，返回完整文件）；
+    所有区间都超出文件长度时返回空列表（416）。
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    parts = [part.strip() for part in spec.split(',') if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, dash, last = part.partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last) + 1, size) if last else size
+        else:
+            # 后缀区间：最后 N 个字节
+            start, end = max(0, size - int(last)), size
+        if start < end:
+            ranges.append((start, end))
+
+    # 合并重叠或相邻的区间
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def not_modified(headers, etag, mtime):
+    """If-None-Match（弱比较）优先，其次 If-Modified-Since。"""
+    if headers.get('If-None-Match'):
+        return parse_etags(headers['If-None-Match']).contains_weak(etag.strip('"'))
+    since = parse_date(headers.get('If-Modified-Since'))
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def if_range_matches(headers, etag, mtime):
+    """If-Range 只接受强 ETag 完全相同，或与 Last-Modified 完全相同的日期。"""
+    value = headers.get('If-Range')
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    date = parse_date(value)
+    return date is not None and int(mtime) == date.timestamp()
+
+
+def iter_range(f, start, end, block_size=READ_SIZE):
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = f.read(min(block_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def iter_ranges(path, ranges, parts=None, block_size=READ_SIZE):
+    """依次输出各区间的内容；parts 为多区间时每段前的分隔头（最后一项为结束分隔符）。
+
+    文件在生成器内打开，客户端断开时服务器关闭生成器，文件随之关闭。
+    """
+    with open(path, 'rb') as f:
+        for i, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[i]
+            yield from iter_range(f, start, end, block_size)
+        if parts:
+            yield parts[-1]
+
+
+def prepare_download(request_headers, path, download_name, offload=None, accel_prefix=None, stat=None, sha256=None):
+    """根据请求头决定如何发送文件，与 Web 框架无关（Flask 与 ASGI 入口共用）。
+
+    返回 (状态码, 响应头, ranges, parts)：ranges 为 None 时没有响应体，
+    否则依次发送各区间，parts 为多区间时每段前的分隔头（见 iter_ranges）。
+
+    支持 Range（含多区间）、强 ETag、If-None-Match / If-Modified-Since / If-Range。
+    offload：
+    * None        由应用发送
+    * 'x-accel'   返回 X-Accel-Redirect: <accel_prefix>/<文件名>，由 nginx 发送文件并自行处理 Range/缓存验证
+    * 'x-sendfile' 返回 X-Sendfile: <绝对路径>，由 Apache（mod_xsendfile）/ lighttpd 发送
+    stat 为调用方事先取得的文件状态（不传时在这里 stat），sha256 为已知的内容校验和（用作 ETag）。
+    """
+    if stat is None:
+        stat = os.stat(path)
+    size = stat.st_size
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    encoded_filename = urllib.parse.quote(download_name)
+    headers = {
+        'Content-Type': get_content_type(mimetype, 'utf-8'),
+        'Content-Disposition': f"attachment; filename=\"{encoded_filename}\"; filename*=UTF-8''{encoded_filename}",
+        # 允许缓存，但每次使用前都要用 ETag 验证
+        'Cache-Control': 'no-cache',
+    }
+
+    if offload == 'x-accel':
+        headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{urllib.parse.quote(os.path.basename(path))}"
+        return 200, headers, None, None
+    if offload == 'x-sendfile':
+        headers['X-Sendfile'] = os.path.abspath(path)
+        return 200, headers, None, None
+
+    etag = file_etag(stat, sha256)
+    headers.update({'ETag': etag, 'Last-Modified': http_date(stat.st_mtime), 'Accept-Ranges': 'bytes'})
+    if not_modified(request_headers, etag, stat.st_mtime):
+        return 304, headers, None, None
+
+    ranges = None
+    if request_headers.get('Range') and if_range_matches(request_headers, etag, stat.st_mtime):
+        ranges = parse_ranges(request_headers['Range'], size)
+
+    if ranges is None:
+        headers['Content-Length'] = str(size)
+        return 200, headers, [(0, size)], None
+
+    if not ranges:
+        headers['Content-Range'] = f'bytes */{size}'
+        return 416, headers, None, None
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+        headers['Content-Length'] = str(end - start)
+        return 206, headers, ranges, None
+
+    # 多区间：multipart/byteranges，长度可以预先算出
+    boundary = uuid.uuid4().hex
+    parts = [(b'\r\n' if i else b'') +
+             f'--{boundary}\r\nContent-Type: {mimetype}\r\nContent-Range: bytes {start}-{end - 1}/{size}\r\n\r\n'.encode()
+             for i, (start, end) in enumerate(ranges)]
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+    headers['Content-Length'] = str(sum(len(p) for p in parts) + sum(end - start for start, end in ranges))
+    return 206, headers, ranges, parts
+
+
+def send_download(request, path, download_name, offload=None, accel_prefix=None, stat=None, sha256=None):
+    """Flask 下载响应（见 prepare_download）。
+
+    完整文件使用 wsgi.file_wrapper，gunicorn 等服务器会用 sendfile 交给内核。
+    """
+    status, headers, ranges, parts = prepare_download(request.headers, path, download_name, offload, accel_prefix,
+                                                     stat, sha256)
+    if ranges is None:
+        return Response(status=status, headers=headers)
+    if status == 200:
+        return Response(wrap_file(request.environ, open(path, 'rb'), READ_SIZE),
+                        headers=headers, direct_passthrough=True)
+    return Response(iter_ranges(path, ranges, parts), status=status, headers=headers, direct_passthrough=True)
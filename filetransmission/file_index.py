@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 未安装 watchdog 时退回定期对账
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# 计算校验和的读取块大小
+HASH_READ_SIZE = 4 * 1024 * 1024
+# 文件变化后等待多久再计算校验和：外部程序可能还在写入，上传流程也会在这段时间内直接登记校验和
+HASH_DELAY = 2
+# 校验和缓存最多延迟多久写入（秒）：期间的多次变化合并为一次写入，进程退出时最多丢失这段时间内的结果（重启后重算）
+CHECKSUM_SAVE_DELAY = 5
+# 未安装 watchdog 时重新扫描目录的间隔（秒）
+RESCAN_INTERVAL = 60
+# 列表接口可用的排序字段
+SORT_FIELDS = ('name', 'size', 'mtime')
+
+
+def is_visible(name):
+    """以 . 开头的是内部文件/目录（.incoming、校验和缓存等）。"""
+    return not name.startswith('.')
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, index):
+        self.index = index
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (getattr(event, 'src_path', None), getattr(event, 'dest_path', None)):
+            if path and os.path.dirname(path) == self.index.folder:
+                self.index.refresh(os.path.basename(path))
+
+
+class FileIndex:
+    """上传目录的文件元数据索引：文件名、大小、修改时间、SHA-256。
+
+    * 启动时扫描一次目录，之后由上传/删除流程直接通知（add/discard），
+      其它途径的变化（手动拷入、外部删除、其他 worker 进程的上传）由 watchdog 的文件系统通知更新
+    * 校验和在后台线程计算，结果合并后每 CHECKSUM_SAVE_DELAY 秒最多写入一次 checksum_path
+      （按 大小 + mtime 判断是否有效），重启后无需重算
+    * on_checksum(文件名, sha256)：不是经由上传流程进入目录的文件得到校验和后调用（用于登记到内容存储）
+    * on_discard(文件名, sha256)：文件被移出索引后，以最近一次已知的校验和调用（即使文件变化后还没有重新计算），
+      无论删除来自本进程还是外部；文件内容变化、重新计算出不同的校验和时，也对旧的校验和调用一次
+    """
+
+    def __init__(self, folder, checksum_path, on_checksum=None, on_discard=None):
+        self.folder = os.path.abspath(folder)
+        self.checksum_path = checksum_path
+        self.on_checksum = on_checksum
+        self.on_discard = on_discard
+        self._files = {}  # name -> {'name', 'size', 'mtime', 'sha256'}
+        self._stamps = {}  # name -> (size, mtime_ns)，用于判断校验和是否仍然有效
+        self._shas = {}  # name -> 最近一次已知的 sha256，文件变化后重新计算完成前仍然保留，删除时用于释放内容
+        self._lock = threading.Lock()
+        # 串行化校验和文件的写入，后取得快照的一次总是最后写入
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Event()  # 校验和有变化，等待写入
+        self._pending = queue.Queue()  # (到期时间, 文件名)，等待计算校验和
+        self._threads_pid = None
+
+        checksums = self._load_checksums()
+        for entry in os.scandir(self.folder):
+            if is_visible(entry.name) and entry.is_file():
+                stat = entry.stat()
+                cached = checksums.get(entry.name)
+                sha256 = cached[2] if cached and tuple(cached[:2]) == (stat.st_size, stat.st_mtime_ns) else None
+                self._set(entry.name, stat, sha256)
+                if not sha256:
+                    self._pending.put((0, entry.name))
+                elif on_checksum and stat.st_nlink == 1:
+                    # 只有这一个目录项，说明还没有登记到内容存储
+                    on_checksum(entry.name, sha256)
+        self._ensure_threads()
+
+    # --- 对外接口 ---
+    def add(self, name, sha256=None):
+        """上传完成：登记文件，上传流程已算出的校验和直接使用。"""
+        self._ensure_threads()
+        try:
+            stat = os.stat(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._set(name, stat, sha256)
+        if sha256:
+            self._dirty.set()
+        else:
+            self._pending.put((time.time() + HASH_DELAY, name))
+
+    def discard(self, name):
+        with self._lock:
+            entry = self._files.pop(name, None)
+            self._stamps.pop(name, None)
+            sha256 = self._shas.pop(name, None)
+        if entry and entry['sha256']:
+            self._dirty.set()
+        if sha256 and self.on_discard:
+            self.on_discard(name, sha256)
+
+    def flush(self):
+        """立即写入校验和缓存（不等 CHECKSUM_SAVE_DELAY）。"""
+        self._dirty.clear()
+        self._save_checksums()
+
+    def refresh(self, name):
+        """按磁盘上的当前状态更新一个文件（文件系统通知、定期对账时调用）。"""
+        if not is_visible(name):
+            return
+        try:
+            stat = os.stat(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            self.discard(name)
+            return
+        with self._lock:
+            if self._stamps.get(name) == (stat.st_size, stat.st_mtime_ns):
+                return
+            self._set(name, stat, None)
+        self._pending.put((time.time() + HASH_DELAY, name))
+
+    def get(self, name):
+        with self._lock:
+            entry = self._files.get(name)
+            return dict(entry) if entry else None
+
+    def query(self, q='', sort='mtime', order='desc', offset=0, limit=50):
+        """按文件名关键字（不区分大小写）过滤、排序、分页，返回 (总数, 当前页条目)；limit=None 返回全部。"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        q = q.lower()
+        with self._lock:
+            items = [dict(entry) for entry in self._files.values() if q in entry['name'].lower()]
+        key = (lambda entry: entry['name'].lower()) if sort == 'name' else (lambda entry: entry[sort])
+        items.sort(key=key, reverse=(order == 'desc'))
+        end = None if limit is None else offset + limit
+        return len(items), items[offset:end]
+
+    # --- 内部实现 ---
+    def _set(self, name, stat, sha256):
+        """调用方持有锁（初始化时除外）。"""
+        self._files[name] = {'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256}
+        self._stamps[name] = (stat.st_size, stat.st_mtime_ns)
+        if sha256:
+            self._shas[name] = sha256
+
+    def _ensure_threads(self):
+        # 与 ExpiringStorage 相同：首次使用时启动，fork 出的子进程中重新启动
+        with self._lock:
+            if self._threads_pid == os.getpid():
+                return
+            self._threads_pid = os.getpid()
+        threading.Thread(target=self._hash_worker, name='file-index-hash', daemon=True).start()
+        threading.Thread(target=self._save_loop, name='file-index-save', daemon=True).start()
+        if Observer:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), self.folder, recursive=False)
+            observer.daemon = True
+            observer.start()
+        else:
+            print("watchdog not installed, falling back to periodic rescans of the upload folder")
+            threading.Thread(target=self._rescan_loop, name='file-index-rescan', daemon=True).start()
+
+    def _hash_worker(self):
+        while True:
+            due, name = self._pending.get()
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                stamp = self._stamps.get(name)
+                entry = self._files.get(name)
+                if not entry or entry['sha256']:
+                    continue
+            digest = hashlib.sha256()
+            try:
+                with open(os.path.join(self.folder, name), 'rb') as f:
+                    while True:
+                        block = f.read(HASH_READ_SIZE)
+                        if not block:
+                            break
+                        digest.update(block)
+            except FileNotFoundError:
+                self.discard(name)
+                continue
+            sha256 = digest.hexdigest()
+            with self._lock:
+                # 计算期间文件又被修改的，等下一次通知重新计算
+                if self._stamps.get(name) != stamp:
+                    continue
+                self._files[name]['sha256'] = sha256
+                previous, self._shas[name] = self._shas.get(name), sha256
+            if self.on_checksum:
+                self.on_checksum(name, sha256)
+            if previous and previous != sha256 and self.on_discard:
+                # 该文件名不再引用旧的内容
+                self.on_discard(name, previous)
+            self._dirty.set()
+
+    def _save_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(CHECKSUM_SAVE_DELAY)
+            # 先清除标记再取快照：写入期间的新变化会触发下一次写入
+            self._dirty.clear()
+            self._save_checksums()
+
+    def _rescan_loop(self):
+        while True:
+            time.sleep(RESCAN_INTERVAL)
+            names = {entry.name for entry in os.scandir(self.folder) if entry.is_file()}
+            with self._lock:
+                known = set(self._files)
+            for name in names | known:
+                self.refresh(name)
+
+    def _load_checksums(self):
+        try:
+            with open(self.checksum_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_checksums(self):
+        """保存校验和缓存；失败只打印日志（缓存丢失只会导致重启后重算，不能让已完成的上传失败）。"""
+        with self._write_lock:
+            with self._lock:
+                data = {name: [*self._stamps[name], entry['sha256']]
+                        for name, entry in self._files.items() if entry['sha256']}
+            # 多个 worker 进程（以及进程内的多个线程）可能同时写入，每次使用独立的临时文件后原子替换
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix='.checksums.', suffix='.tmp',
+                                                dir=os.path.dirname(os.path.abspath(self.checksum_path)))
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.checksum_path)
+            except OSError as e:
+                print(f"Could not save checksums to {self.checksum_path}: {e}")
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
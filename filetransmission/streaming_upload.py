@@ -0,0 +1,123 @@
+import hashlib
+import uuid
+
+from werkzeug.sansio.multipart import MultipartDecoder, File, Field, Data, Epilogue, NeedData
+from werkzeug.utils import secure_filename
+
+
+# 每次从请求体读取的块大小
+READ_SIZE = 1024 * 1024
+# 目标文件的写缓冲区大小，减少小块写入的系统调用次数
+WRITE_BUFFER = 4 * 1024 * 1024
+# 半成品文件名后缀（位于上传目录下的 .incoming/ 中，完成后移入内容存储）
+PARTIAL_SUFFIX = '.part'
+
+
+class UploadError(Exception):
+    """请求体不是完整、合法的 multipart/form-data。"""
+
+
+class PartialFile:
+    """边写边计算 SHA-256 的半成品文件，完成后按哈希移入内容存储（BlobStore）。
+
+    incoming 为管理半成品目录的 ExpiringStorage：创建时登记，
+    进程中途退出遗留的半成品到期后由其后台线程删除。
+    """
+
+    def __init__(self, incoming, write_buffer=WRITE_BUFFER):
+        self.incoming = incoming
+        self.name = uuid.uuid4().hex + PARTIAL_SUFFIX
+        self.path = incoming.path_for(self.name)
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'wb', buffering=write_buffer)
+        incoming.add(self.name)
+
+    def write(self, data):
+        self._digest.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def commit(self, blobs, filename):
+        """关闭文件并存入 blobs，以 filename 引用，返回实际使用的文件名。"""
+        self._file.close()
+        name = blobs.store(self.path, self.hexdigest(), filename)
+        # 文件已移走，这里只是移出索引
+        self.incoming.remove(self.name)
+        return name
+
+    def abort(self):
+        self._file.close()
+        self.incoming.remove(self.name)
+
+
+class MultipartReceiver:
+    """增量解析 multipart 请求体：调用方每读到一段数据就 feed() 一次，文件内容直接写入磁盘。
+
+    每个文件部分先写入 incoming 目录下的半成品，读完后存入 blobs 并以安全文件名引用
+    （同名文件已存在且内容不同时自动改名）；普通表单字段被忽略。
+    读到结束分隔符后 done 为 True，saved 为 [{'filename', 'size', 'sha256'}, ...]，filename 为实际使用的文件名。
+    on_saved(item) 在每个文件存入后立即调用：后面的部分出错时，前面已经存入的文件不会被遗漏。
+    不依赖读取方式，同步（WSGI）与异步（ASGI）入口共用；用完必须调用 close()。
+    """
+
+    def __init__(self, boundary, incoming, blobs, write_buffer=WRITE_BUFFER, on_saved=None):
+        self.incoming = incoming
+        self.blobs = blobs
+        self.write_buffer = write_buffer
+        self.on_saved = on_saved
+        self.saved = []
+        self.done = False
+        self._decoder = MultipartDecoder(boundary)
+        self._current = None
+        self._filename = None
+
+    def feed(self, chunk):
+        """处理一段请求体，chunk 为空表示请求体已结束。"""
+        # 传入 None 表示请求体已结束
+        self._decoder.receive_data(chunk or None)
+        try:
+            event = self._decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File):
+                    self._filename = secure_filename(event.filename)
+                    self._current = PartialFile(self.incoming, self.write_buffer) if self._filename else None
+                elif isinstance(event, Field):
+                    self._current = None
+                elif isinstance(event, Data) and self._current:
+                    self._current.write(event.data)
+                    if not event.more_data:
+                        filename = self._current.commit(self.blobs, self._filename)
+                        item = {'filename': filename, 'size': self._current.size, 'sha256': self._current.hexdigest()}
+                        self._current = None
+                        self.saved.append(item)
+                        if self.on_saved:
+                            self.on_saved(item)
+                elif isinstance(event, Epilogue):
+                    self.done = True
+                    return
+                event = self._decoder.next_event()
+        except ValueError as e:
+            raise UploadError(f"Malformed multipart body: {e}")
+        if not chunk:
+            raise UploadError("Request body ended before the closing boundary")
+
+    def close(self):
+        # 客户端中途断开、超出大小限制等情况：删除未写完的半成品
+        if self._current:
+            self._current.abort()
+            self._current = None
+
+
+def receive_multipart(stream, boundary, incoming, blobs, on_saved=None):
+    """从同步流（WSGI 的 request.stream）读取并解析 multipart 请求体，返回 MultipartReceiver.saved。"""
+    receiver = MultipartReceiver(boundary, incoming, blobs, on_saved=on_saved)
+    try:
+        while not receiver.done:
+            receiver.feed(stream.read(READ_SIZE))
+        return receiver.saved
+    finally:
+        receiver.close()
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from blob_store import BlobStore
+from chunked_upload import ChunkedUploads, UploadSessionNotFound, MIN_CHUNK_SIZE
+from storage_manager import ExpiringStorage
+
+
+TTL = 1.5
+CHUNKS = 4
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    incoming = ExpiringStorage(str(tmp_path / 'uploads' / '.incoming'), ttl=TTL)
+    return ChunkedUploads(incoming, BlobStore(str(tmp_path / 'uploads')), CHUNKS * MIN_CHUNK_SIZE)
+
+
+def chunk(i):
+    return bytes([i]) * MIN_CHUNK_SIZE
+
+
+def create(sessions):
+    return sessions.create('data.bin', CHUNKS * MIN_CHUNK_SIZE, MIN_CHUNK_SIZE)['upload_id']
+
+
+def test_activity_keeps_session_alive_past_ttl(sessions):
+    upload_id = create(sessions)
+    # 持续上传的总时长超过 ttl：每个分块都重新计算到期时间
+    for i in range(CHUNKS):
+        time.sleep(TTL * 0.6)
+        sessions.write_chunk(upload_id, i * MIN_CHUNK_SIZE, chunk(i))
+    assert sessions.status(upload_id)['received_bytes'] == CHUNKS * MIN_CHUNK_SIZE
+    assert sessions.finalize(upload_id)['size'] == CHUNKS * MIN_CHUNK_SIZE
+
+
+def test_resume_after_idle_counts_from_last_chunk(sessions):
+    upload_id = create(sessions)
+    time.sleep(TTL * 0.6)
+    sessions.write_chunk(upload_id, 0, chunk(0))
+    # 距创建已超过 ttl，但距最后一个分块还没有
+    time.sleep(TTL * 0.6)
+    assert sessions.status(upload_id)['received'] == [[0, MIN_CHUNK_SIZE]]
+    sessions.write_chunk(upload_id, MIN_CHUNK_SIZE, chunk(1))
+
+
+def test_idle_session_expires(sessions):
+    upload_id = create(sessions)
+    sessions.write_chunk(upload_id, 0, chunk(0))
+    time.sleep(TTL + 1)
+    with pytest.raises(UploadSessionNotFound):
+        sessions.status(upload_id)
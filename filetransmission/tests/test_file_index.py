@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import time
+
+import file_index
+from file_index import FileIndex
+
+
+def write(folder, name, data):
+    with open(os.path.join(folder, name), 'wb') as f:
+        f.write(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_index(tmp_path, discarded=None):
+    folder = str(tmp_path / 'uploads')
+    os.makedirs(folder, exist_ok=True)
+    on_discard = (lambda name, sha256: discarded.append((name, sha256))) if discarded is not None else None
+    return folder, FileIndex(folder, os.path.join(folder, '.checksums.json'), on_discard=on_discard)
+
+
+def test_checksum_writes_are_batched(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_index, 'CHECKSUM_SAVE_DELAY', 0.3)
+    folder, index = make_index(tmp_path)
+    writes = []
+    save = index._save_checksums
+    monkeypatch.setattr(index, '_save_checksums', lambda: (writes.append(1), save()))
+    for i in range(50):
+        name = f'{i}.bin'
+        index.add(name, write(folder, name, str(i).encode()))
+    assert not writes
+    time.sleep(1)
+    assert len(writes) == 1
+    with open(index.checksum_path) as f:
+        assert len(json.load(f)) == 50
+
+
+def test_flush_writes_immediately(tmp_path):
+    folder, index = make_index(tmp_path)
+    sha256 = write(folder, 'a.bin', b'a')
+    index.add('a.bin', sha256)
+    index.flush()
+    with open(index.checksum_path) as f:
+        assert json.load(f)['a.bin'][2] == sha256
+
+
+def test_discard_before_rehash_releases_last_checksum(tmp_path):
+    discarded = []
+    folder, index = make_index(tmp_path, discarded)
+    sha256 = write(folder, 'a.bin', b'original')
+    index.add('a.bin', sha256)
+    # 文件被外部修改：校验和清空等待重新计算，删除发生在重新计算之前
+    write(folder, 'a.bin', b'modified content')
+    index.refresh('a.bin')
+    assert index.get('a.bin')['sha256'] is None
+    os.remove(os.path.join(folder, 'a.bin'))
+    index.refresh('a.bin')
+    assert discarded == [('a.bin', sha256)]
+    assert index.get('a.bin') is None
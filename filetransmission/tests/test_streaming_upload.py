@@ -0,0 +1,45 @@
+import hashlib
+import io
+
+import pytest
+
+from blob_store import BlobStore
+from storage_manager import ExpiringStorage
+from streaming_upload import receive_multipart, UploadError
+
+BOUNDARY = b'----test-boundary'
+
+
+def part(name, data):
+    return (b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="file"; filename="' + name.encode() +
+            b'"\r\nContent-Type: application/octet-stream\r\n\r\n' + data + b'\r\n')
+
+
+@pytest.fixture
+def stores(tmp_path):
+    folder = str(tmp_path / 'uploads')
+    return ExpiringStorage(str(tmp_path / 'uploads' / '.incoming'), ttl=3600), BlobStore(folder), folder
+
+
+def test_each_file_reported_when_saved(stores):
+    incoming, blobs, _ = stores
+    body = part('a.txt', b'first') + part('b.txt', b'second') + b'--' + BOUNDARY + b'--\r\n'
+    reported = []
+    saved = receive_multipart(io.BytesIO(body), BOUNDARY, incoming, blobs, reported.append)
+    assert [item['filename'] for item in saved] == ['a.txt', 'b.txt']
+    assert reported == saved
+    assert saved[1]['sha256'] == hashlib.sha256(b'second').hexdigest()
+
+
+def test_earlier_files_reported_when_later_part_fails(stores):
+    incoming, blobs, folder = stores
+    # 第二个文件没有结束分隔符：请求体中途结束
+    body = part('a.txt', b'first') + part('b.txt', b'second')[:-10]
+    reported = []
+    with pytest.raises(UploadError):
+        receive_multipart(io.BytesIO(body), BOUNDARY, incoming, blobs, reported.append)
+    assert [item['filename'] for item in reported] == ['a.txt']
+    with open(f'{folder}/a.txt', 'rb') as f:
+        assert f.read() == b'first'
+    # 未写完的第二个文件不留下半成品
+    assert incoming.usage()['entries'] == 0
@@ -1,15 +1,18 @@
-import requests
+import os
 import config_env
 import time
+from urllib.parse import urlsplit
+import common_path  # noqa: F401
+from http_client import client
 
-def add_and_run_task(share_url, title, save_path):
-    """
-    接收 Streamlit 传来的参数并执行 API 调用
-    """
-    task_name = f"Auto_{title}_{int(time.time())}" # 增加时间戳防止任务名冲突
-    
-    # 构造完整数据
-    task_item = {
+# 转存队列每次 run_task 请求最多包含的任务数
+RUN_TASK_BATCH_SIZE = int(os.environ.get('RUN_TASK_BATCH_SIZE', 20))
+RUN_TASK_TIMEOUT = 10
+
+def build_task(share_url, title, save_path, task_name=None):
+    """构造 quark_auto_save 的任务条目"""
+    task_name = task_name or f"Auto_{title}_{int(time.time())}" # 增加时间戳防止任务名冲突
+    return {
         "taskname": task_name,
         "shareurl": share_url,
         "savepath": save_path,
@@ -24,6 +27,22 @@ def add_and_run_task(share_url, title, save_path):
         }
     }
 
+def share_key(share_url):
+    """分享链接的去重键：忽略提取码等查询参数、末尾斜杠与域名大小写"""
+    parts = urlsplit(share_url.strip())
+    return parts.netloc.lower() + parts.path.rstrip("/")
+
+def add_and_run_task(share_url, title, save_path):
+    """
+    接收 Streamlit 传来的参数并执行 API 调用
+    """
+    ok, _ = run_tasks([build_task(share_url, title, save_path)])
+    return ok
+
+def run_tasks(tasks):
+    """
+    一次 run_task 请求提交 tasks，返回 (是否成功, 失败原因)
+    """
     params = {"token": config_env.token}
     headers = {"Content-Type": "application/json"}
 
@@ -35,15 +54,16 @@ def add_and_run_task(share_url, title, save_path):
         #    return False
 
         # 2. 触发执行 (必须带全量字段以防后端 KeyError)
-        run_payload = {"tasklist": [task_item]}
+        run_payload = {"tasklist": tasks}
         print(f"🚀 触发 Run Task")
-        run_res = requests.post(config_env.run_task_url, params=params, json=run_payload, headers=headers, timeout=10)
+        # 非幂等请求：只在后端明确拒绝（429/503）或连接超时时重试，其余失败交给转存队列退避重试
+        run_res = client.post(config_env.run_task_url, params=params, json=run_payload, headers=headers, timeout=RUN_TASK_TIMEOUT)
 
         # 3. 结果判断（关键：防止空响应报错）
         if run_res.status_code == 200:
-            return True
-        return False
+            return True, ""
+        return False, f"HTTP {run_res.status_code}"
 
     except Exception as e:
         print(f"💥 后端抛出异常: {e}")
-        return False
\ No newline at end of file
+        return False, str(e)
\ No newline at end of file
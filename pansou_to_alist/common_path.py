@@ -0,0 +1,8 @@
+# 共享模块（http_client 等）位于仓库根目录的 common/ 下；Docker 镜像中会直接复制到应用目录。
+# 用到共享模块的模块都先 import 本模块，不依赖 web_app.py 是否已经设置好 sys.path
+import os
+import sys
+
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common')
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
@@ -1,4 +1,8 @@
 search_api = ""
+# 可选：同时查询多个搜索接口（镜像），每项为 URL 或 {"url": ..., "name": ..., "timeout": 秒}，设置后代替 search_api
+# search_apis = ["http://mirror-a:8888/api/search", {"url": "http://mirror-b:8888/api/search", "timeout": 5}]
+# 可选：要搜索的网盘类型，只有夸克的结果可以自动转存，其他网盘只显示链接
+# cloud_types = ["quark"]
 base_url = ""
 run_task_url = ""
 token = ""
@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+from auto_quark import share_key
+import common_path  # noqa: F401
+from http_client import client
+from search import SearchCache
+
+# --- 配置 ---
+# 夸克分享页的取 token 接口：能取到 token 说明分享仍有效（quark_auto_save 转存前也是先调用它）；设为空关闭检测
+SHARE_CHECK_URL = os.environ.get('SHARE_CHECK_URL', 'https://drive-pc.quark.cn/1/clouddrive/share/sharepage/token')
+# 同时检测的链接数
+LINK_CHECK_WORKERS = int(os.environ.get('LINK_CHECK_WORKERS', 8))
+# 单个链接的请求超时（秒）
+LINK_CHECK_TIMEOUT = float(os.environ.get('LINK_CHECK_TIMEOUT', 5))
+# 一次检测整批结果最多等待的时间（秒），超过后未出结果的链接记为未知
+LINK_CHECK_DEADLINE = float(os.environ.get('LINK_CHECK_DEADLINE', 10))
+# 检测结果的缓存时间（秒）
+LINK_CHECK_TTL = int(os.environ.get('LINK_CHECK_TTL', 3600))
+LINK_CHECK_CACHE_SIZE = int(os.environ.get('LINK_CHECK_CACHE_SIZE', 5000))
+
+ALIVE, DEAD, UNKNOWN = 'alive', 'dead', 'unknown'
+# 分享页接口说明分享已经不可用时的提示（分享不存在、已失效/过期、被取消或删除、违规封禁、提取码错误）；
+# 其余无法识别的响应都记为未知，不缓存，以免把暂时的异常当成失效隐藏掉有效的结果
+DEAD_MESSAGES = ('不存在', '失效', '过期', '取消', '删除', '违规', '封禁', '提取码')
+VERDICT_LABELS = {ALIVE: '有效', DEAD: '已失效', UNKNOWN: '未知'}
+
+
+class CheckFailed(Exception):
+    """接口暂时无法给出结论（网络错误、限流、服务端错误），结果不缓存。"""
+
+
+# --- 对外接口 ---
+def parse_share(url, password=''):
+    """夸克分享链接 -> (pwd_id, 提取码)；不是夸克分享链接时 pwd_id 为空。"""
+    parts = urlsplit((url or '').strip())
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if 'quark' not in parts.netloc.lower() or len(segments) < 2 or segments[0] != 's':
+        return '', ''
+    passcode = parse_qs(parts.query).get('pwd', [''])[0] or password or ''
+    return segments[1], passcode
+
+
+def check_link(url, password=''):
+    """检测一个链接，返回 (ALIVE / DEAD / UNKNOWN, 说明)；结论按链接缓存 LINK_CHECK_TTL 秒，相同链接的并发检测只请求一次。"""
+    pwd_id, passcode = parse_share(url, password)
+    if not pwd_id:
+        return UNKNOWN, '不是夸克分享链接，未检测'
+    try:
+        return cache.get(share_key(url), lambda: fetch_verdict(pwd_id, passcode))
+    except CheckFailed as e:
+        return UNKNOWN, str(e)
+
+
+def check_results(items, deadline=LINK_CHECK_DEADLINE):
+    """并发检测搜索结果 [{'url', 'password', ...}, ...] 中的链接，返回 {share_key: (结论, 说明)}。
+
+    最多同时检测 LINK_CHECK_WORKERS 个，超过 deadline 秒仍未完成的链接记为 UNKNOWN（检测仍在后台完成并写入缓存）。
+    """
+    if not SHARE_CHECK_URL:
+        return {}
+    futures, seen = {}, set()
+    for item in items:
+        key = share_key(item.get('url') or '')
+        if key and key not in seen:
+            seen.add(key)
+            futures[executor.submit(check_link, item.get('url'), item.get('password'))] = key
+    done, _ = wait(futures, timeout=deadline)
+    verdicts = {key: (UNKNOWN, '检测超时') for key in futures.values()}
+    for future in done:
+        verdicts[futures[future]] = future.result()
+    return verdicts
+
+
+def fetch_verdict(pwd_id, passcode=''):
+    """请求分享页接口（不经过缓存）；只有接口明确说明分享已不可用时才返回 DEAD，无法判断时抛出 CheckFailed。"""
+    try:
+        response = client.post(SHARE_CHECK_URL, params={'pr': 'ucpro', 'fr': 'pc'},
+                               json={'pwd_id': pwd_id, 'passcode': passcode}, timeout=LINK_CHECK_TIMEOUT,
+                               idempotent=True)
+    except requests.RequestException as e:
+        raise CheckFailed(f'检测失败: {e}')
+    if response.status_code in (401, 403, 429) or response.status_code >= 500:
+        raise CheckFailed(f'检测接口暂时不可用: HTTP {response.status_code}')
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        # 验证码页、HTML 错误页等
+        raise CheckFailed(f'检测接口返回了无法识别的内容: HTTP {response.status_code}')
+    if response.status_code == 200 and data.get('status') == 200 and not data.get('code'):
+        return ALIVE, ''
+    message = str(data.get('message') or '')
+    if data.get('code') and any(keyword in message for keyword in DEAD_MESSAGES):
+        return DEAD, message
+    raise CheckFailed(f'无法判断分享状态: HTTP {response.status_code} {data.get("code")} {message}'.rstrip())
+
+
+# 进程内共享
+cache = SearchCache(ttl=LINK_CHECK_TTL, stale=0, max_entries=LINK_CHECK_CACHE_SIZE)
+executor = ThreadPoolExecutor(max_workers=LINK_CHECK_WORKERS, thread_name_prefix='link-check')
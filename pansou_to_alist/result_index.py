@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+from functools import lru_cache
+
+from auto_quark import share_key
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时不支持拼音搜索
+    lazy_pinyin = None
+
+# --- 配置 ---
+# 搜索结果索引数据库（需要 SQLite 3.34+ 的 FTS5 trigram 分词器）
+RESULT_INDEX_DB = os.environ.get('RESULT_INDEX_DB',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.db'))
+# 超过该天数没有再出现在搜索结果中的记录会被清理（已转存的记录一直保留）
+RESULT_INDEX_DAYS = float(os.environ.get('RESULT_INDEX_DAYS', 30))
+# 一次本地查询最多返回的结果数
+RESULT_INDEX_LIMIT = int(os.environ.get('RESULT_INDEX_LIMIT', 200))
+# 两次清理之间的最短间隔（秒）
+PRUNE_INTERVAL = 3600
+# 本地结果的 source 字段
+INDEX_SOURCE = '本地索引'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    share_key TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    note TEXT NOT NULL,
+    datetime TEXT NOT NULL DEFAULT '',
+    cloud_type TEXT NOT NULL,
+    title TEXT NOT NULL,               -- 规范化后的标题
+    pinyin TEXT NOT NULL,              -- 标题的全拼（去掉空白）
+    initials TEXT NOT NULL,            -- 标题的拼音首字母
+    seen_at REAL NOT NULL,             -- 最近一次出现在上游搜索结果中的时间
+    transferred_at REAL                -- 转存完成的时间，NULL 表示未转存
+);
+CREATE INDEX IF NOT EXISTS results_seen ON results (seen_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    title, pinyin, initials, content='results', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts (rowid, title, pinyin, initials) VALUES (new.id, new.title, new.pinyin, new.initials);
+END;
+CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title, pinyin, initials)
+    VALUES ('delete', old.id, old.title, old.pinyin, old.initials);
+END;
+CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE OF title, pinyin, initials ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, title, pinyin, initials)
+    VALUES ('delete', old.id, old.title, old.pinyin, old.initials);
+    INSERT INTO results_fts (rowid, title, pinyin, initials) VALUES (new.id, new.title, new.pinyin, new.initials);
+END;
+'''
+
+
+# --- 对外接口 ---
+def normalize_text(text):
+    """全角转半角、忽略大小写、合并多余空白：'  巨洪 ' 与 '巨洪'、'ABC' 与 'ａｂｃ' 视为相同。"""
+    return ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+
+@lru_cache(maxsize=4096)
+def pinyin_forms(title):
+    """规范化标题 -> (全拼, 首字母)，均去掉空白：'巨洪 第1集' -> ('juhongdi1ji', 'jhd1j')。"""
+    if lazy_pinyin is None:
+        return '', ''
+    # 只转换一次：非汉字部分加上 \0 前缀原样返回，首字母只取汉字拼音的第一个字母
+    parts = lazy_pinyin(title, errors=lambda chars: '\0' + chars)
+    full = ''.join(part.lstrip('\0') for part in parts).replace(' ', '')
+    initials = ''.join(part[1:] if part.startswith('\0') else part[:1] for part in parts).replace(' ', '')
+    return full, initials
+
+
+class ResultIndex:
+    """见过的搜索结果（标题、链接、时间）的本地全文索引，以及已转存链接的记录。
+
+    查询按空白分词，每个词都要出现在标题或全拼中（子串匹配），或是拼音首字母的开头。
+    3 个字符及以上的词走 trigram 索引；只有更短的词（如两个字的片名）时逐行匹配，索引在几万条以内都很快。
+    """
+
+    def __init__(self, path=RESULT_INDEX_DB, days=RESULT_INDEX_DAYS):
+        self.path = path
+        self.max_age = days * 86400
+        self._last_prune = 0
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db, db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def lookup(self, keyword, cloud_types, limit=RESULT_INDEX_LIMIT):
+        """返回与 keyword 匹配、未过期的结果，新的在前：[{'note', 'url', 'datetime', 'cloud_type', 'source'}, ...]。"""
+        terms = [term.replace('%', '').replace('_', '') for term in normalize_text(keyword).split()]
+        terms = [term for term in terms if term]
+        if not terms or not cloud_types:
+            return []
+        conditions, params = [], []
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms:
+            conditions.append('results_fts MATCH ?')
+            params.append(' AND '.join('"' + term.replace('"', '""') + '"' for term in long_terms))
+        for term in terms:
+            if len(term) < 3:
+                conditions.append('(f.title LIKE ? OR f.pinyin LIKE ? OR f.initials LIKE ?)')
+                params += [f'%{term}%', f'%{term}%', f'{term}%']
+        query = (f'SELECT r.note, r.url, r.datetime, r.cloud_type FROM results_fts f JOIN results r ON r.id = f.rowid '
+                 f'WHERE {" AND ".join(conditions)} AND r.cloud_type IN ({",".join("?" * len(cloud_types))}) '
+                 f'AND (r.seen_at >= ? OR r.transferred_at IS NOT NULL) ORDER BY r.datetime DESC LIMIT ?')
+        params += list(cloud_types) + [time.time() - self.max_age, limit]
+        with closing(self._connect()) as db:
+            rows = db.execute(query, params).fetchall()
+        return [dict(row, source=INDEX_SOURCE) for row in rows]
+
+    def record(self, merged):
+        """写入一次上游搜索的结果 {网盘类型: [结果, ...]}，已有的链接更新标题与最近出现时间。"""
+        now = time.time()
+        rows = []
+        for cloud_type, items in merged.items():
+            for item in items:
+                url = item.get('url') or ''
+                key = share_key(url)
+                if not key:
+                    continue
+                note = item.get('note') or ''
+                title = normalize_text(note)
+                rows.append((key, url, note, item.get('datetime') or '', cloud_type, title, *pinyin_forms(title), now))
+        if rows:
+            with closing(self._connect()) as db, db:
+                db.executemany(
+                    'INSERT INTO results (share_key, url, note, datetime, cloud_type, title, pinyin, initials, seen_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (share_key) DO UPDATE SET url = excluded.url, '
+                    'note = excluded.note, datetime = excluded.datetime, title = excluded.title, '
+                    'pinyin = excluded.pinyin, initials = excluded.initials, seen_at = excluded.seen_at', rows)
+        self._maybe_prune()
+
+    def mark_transferred(self, shares, cloud_type='quark'):
+        """记录已转存的分享 [(share_url, title), ...]；不在索引中的链接一并写入。"""
+        now = time.time()
+        rows = []
+        for url, title in shares:
+            normalized = normalize_text(title)
+            rows.append((share_key(url), url, title, cloud_type, normalized, *pinyin_forms(normalized), now, now))
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                'INSERT INTO results (share_key, url, note, cloud_type, title, pinyin, initials, seen_at, transferred_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (share_key) DO UPDATE SET '
+                'transferred_at = excluded.transferred_at', rows)
+
+    def transferred(self, urls):
+        """urls 中已转存过的链接的 share_key 集合。"""
+        keys = list({share_key(url) for url in urls if url})
+        found = set()
+        with closing(self._connect()) as db:
+            # 分批查询，避免超过 SQLite 的参数个数上限
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = db.execute(f'SELECT share_key FROM results WHERE transferred_at IS NOT NULL '
+                                  f'AND share_key IN ({",".join("?" * len(batch))})', batch).fetchall()
+                found.update(row['share_key'] for row in rows)
+        return found
+
+    def prune(self):
+        """删除超过保留期且未转存的记录，返回删除的条数。"""
+        with closing(self._connect()) as db, db:
+            return db.execute('DELETE FROM results WHERE seen_at < ? AND transferred_at IS NULL',
+                              (time.time() - self.max_age,)).rowcount
+
+    # --- 内部实现 ---
+    def _connect(self):
+        # 每次操作使用独立连接：Streamlit 的脚本线程与搜索线程不共享连接
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _maybe_prune(self):
+        with self._lock:
+            if time.time() - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = time.time()
+        removed = self.prune()
+        if removed:
+            print(f"🧹 搜索索引：清理 {removed} 条过期记录")
+
+
+# 进程内共享：Streamlit 每次交互都会重新执行 web_app.py，但导入的模块只加载一次
+index = ResultIndex()
@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from urllib.parse import urlsplit
+
+import config_env
+from auto_quark import share_key
+from result_index import index, normalize_text, INDEX_SOURCE
+import common_path  # noqa: F401
+from http_client import client
+
+# --- 配置 ---
+# 每个搜索接口的默认截止时间（秒），同时也是请求超时，超过后不再等待该接口
+SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', 10))
+# 搜索结果的新鲜期（秒），期内相同的搜索直接返回缓存；0 表示不缓存
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 600))
+# 过期后仍可先返回旧结果、同时在后台刷新的时长（秒）；0 表示过期后必须等待新结果
+SEARCH_CACHE_STALE = int(os.environ.get('SEARCH_CACHE_STALE', 3600))
+# 最多缓存的不同搜索数，超出后淘汰最久未使用的
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 256))
+# 同时进行的接口请求数上限（所有用户共享）
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 16))
+DEFAULT_CLOUD_TYPES = ('quark',)
+
+Backend = namedtuple('Backend', 'name url timeout')
+
+
+# --- 对外接口 ---
+def configured_backends():
+    """搜索接口列表：config_env.search_apis（可选，多个镜像）或 config_env.search_api。
+
+    每一项可以是 URL，或 {"url": ..., "name": ..., "timeout": 秒}。
+    """
+    backends = []
+    for entry in getattr(config_env, 'search_apis', None) or [config_env.search_api]:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        url = entry["url"]
+        backends.append(Backend(entry.get("name") or urlsplit(url).netloc or url, url,
+                                float(entry.get("timeout") or SEARCH_TIMEOUT)))
+    return backends
+
+
+def configured_cloud_types():
+    """要搜索的网盘类型：config_env.cloud_types（可选），默认只搜夸克。"""
+    return tuple(getattr(config_env, 'cloud_types', None) or DEFAULT_CLOUD_TYPES)
+
+
+def search_stream(keyword, cloud_types=None, backends=None, use_index=True):
+    """先从本地索引、再并发查询所有搜索接口，每个来源返回、出错或超过截止时间时产出一次 (来源名, 新结果, 错误)。
+
+    新结果是尚未出现过的分享链接（按 auto_quark.share_key 去重）的副本，附带 cloud_type 与 source 字段；
+    出错或超时时新结果为空列表，错误为对应的异常。每个接口的结果按（规范化关键字, 网盘类型, 接口）分别缓存，
+    并在后台写入本地索引。
+    """
+    # 结果按配置的网盘类型顺序排列，缓存键与顺序无关
+    cloud_types = tuple(dict.fromkeys(cloud_types or configured_cloud_types()))
+    key = (normalize_text(keyword), tuple(sorted(cloud_types)))
+    started = time.monotonic()
+    pending = {}
+    for backend in backends or configured_backends():
+        loader = partial(_fetch_and_record, keyword.strip(), key[1], backend.url, backend.timeout)
+        pending[executor.submit(cache.get, key + (backend.url,), loader)] = backend
+    seen = set()
+    # 网络请求已经发出，同时从本地索引返回以前见过的结果
+    if use_index:
+        try:
+            local = index.lookup(keyword, cloud_types)
+        except Exception as e:
+            yield INDEX_SOURCE, [], e
+        else:
+            seen.update(share_key(item['url']) for item in local)
+            yield INDEX_SOURCE, local, None
+    while pending:
+        deadline = min(started + backend.timeout for backend in pending.values())
+        done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            backend = pending.pop(future)
+            try:
+                merged = future.result()
+            except Exception as e:
+                yield backend.name, [], e
+                continue
+            yield backend.name, _new_items(merged, cloud_types, backend, seen), None
+        now = time.monotonic()
+        for future, backend in list(pending.items()):
+            if now >= started + backend.timeout:
+                del pending[future]
+                yield backend.name, [], TimeoutError(f"超过 {backend.timeout:g} 秒未返回")
+
+
+def search(keyword, cloud_types=None, backends=None, use_index=True):
+    """等待所有搜索接口（或它们的截止时间），返回合并去重后的 {网盘类型: [{'note', 'url', 'datetime', ...}, ...]}。
+
+    所有搜索接口都失败且本地索引没有结果时抛出第一个错误（requests.RequestException / ValueError / TimeoutError）。
+    """
+    cloud_types = tuple(dict.fromkeys(cloud_types or configured_cloud_types()))
+    merged = {cloud_type: [] for cloud_type in cloud_types}
+    errors, answered = [], False
+    for name, items, error in search_stream(keyword, cloud_types, backends, use_index):
+        if error:
+            errors.append(error)
+        elif name != INDEX_SOURCE:
+            answered = True
+        for item in items:
+            merged[item['cloud_type']].append(item)
+    # 所有搜索接口都失败、本地索引也没有结果时才报错
+    if errors and not answered and not any(merged.values()):
+        raise errors[0]
+    return merged
+
+
+def fetch(keyword, cloud_types, url=None, timeout=SEARCH_TIMEOUT):
+    """直接请求一个搜索接口（不经过缓存），返回 {网盘类型: [结果, ...]}。"""
+    payload = {"kw": keyword, "cloud_types": list(cloud_types)}
+    # 搜索是只读的，超时与服务端错误也可以重试（超过该接口的截止时间后 search_stream 不再等待）
+    response = client.post(url or config_env.search_api, json=payload, timeout=timeout, idempotent=True)
+    response.raise_for_status()
+    merged = (response.json().get("data") or {}).get("merged_by_type") or {}
+    return {cloud_type: merged.get(cloud_type) or [] for cloud_type in cloud_types}
+
+
+class SearchCache:
+    """带 TTL 与容量上限（LRU）的结果缓存。
+
+    - 同一个 key 同时只有一个上游请求，其余调用等待并共享它的结果（或异常）；
+    - 过期但仍在 stale 期内的结果立即返回，并在后台线程刷新，刷新失败时继续使用旧结果。
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, stale=SEARCH_CACHE_STALE, max_entries=SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}            # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'fetches': 0, 'errors': 0}
+
+    def get(self, key, loader):
+        leader = False
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[1] if entry else None
+            if entry and age < self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            if entry and age < self.ttl + self.stale:
+                self._entries.move_to_end(key)
+                self._stats['stale_hits'] += 1
+                if key not in self._inflight:
+                    flight = self._inflight[key] = _Flight()
+                    threading.Thread(target=self._load, args=(key, loader, flight, entry[0]), daemon=True).start()
+                return entry[0]
+            flight = self._inflight.get(key)
+            if flight:
+                self._stats['coalesced'] += 1
+            else:
+                self._stats['misses'] += 1
+                flight = self._inflight[key] = _Flight()
+                leader = True
+        if leader:
+            self._load(key, loader, flight)
+        return flight.wait()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, key, loader, flight, fallback=None):
+        """请求上游并写入缓存；fallback 为后台刷新时的旧结果，刷新失败时交给等待者。"""
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+                del self._inflight[key]
+            if fallback is not None:
+                print(f"刷新搜索缓存失败，继续使用旧结果: {e}")
+                flight.finish(fallback, None)
+            else:
+                flight.finish(None, e)
+            return
+        with self._lock:
+            self._stats['fetches'] += 1
+            del self._inflight[key]
+            if self.ttl > 0:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        flight.finish(value, None)
+
+
+# --- 内部实现 ---
+def _fetch_and_record(keyword, cloud_types, url, timeout):
+    merged = fetch(keyword, cloud_types, url, timeout)
+    # 写索引（含拼音转换）不占用本次搜索的时间
+    recorder.submit(_record, merged)
+    return merged
+
+
+def _record(merged):
+    try:
+        index.record(merged)
+    except Exception as e:
+        print(f"写入搜索索引失败: {e}")
+
+
+def _new_items(merged, cloud_types, backend, seen):
+    items = []
+    for cloud_type in cloud_types:
+        for item in merged.get(cloud_type) or []:
+            key = share_key(item.get('url') or '')
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            # 缓存中的结果被多个搜索共用，附加字段时复制一份
+            items.append(dict(item, cloud_type=cloud_type, source=backend.name))
+    return items
+
+
+class _Flight:
+    """一个进行中的上游请求，供相同 key 的并发调用等待。"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def finish(self, value, error):
+        self._value, self._error = value, error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+# 进程内共享：Streamlit 每次交互都会重新执行 web_app.py，但导入的模块只加载一次
+cache = SearchCache()
+executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='search')
+# 写索引只用一个线程：拼音转换是纯 Python 计算，多个线程同时转换会抢占 GIL、拖慢进行中的搜索
+recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
@@ -0,0 +1,251 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from auto_quark import build_task, share_key, run_tasks, RUN_TASK_BATCH_SIZE
+from result_index import index
+
+# --- 配置 ---
+# 任务队列数据库，页面刷新、进程重启后未完成的任务会继续执行
+TASK_DB = os.environ.get('TASK_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasks.db'))
+# 单个任务的最多尝试次数，超过后标记为失败，可在页面上手动重试
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 5))
+# 失败后的重试间隔：TASK_RETRY_BASE * 2^(n-1) 秒（带随机抖动），最长 TASK_RETRY_MAX 秒
+TASK_RETRY_BASE = float(os.environ.get('TASK_RETRY_BASE', 10))
+TASK_RETRY_MAX = float(os.environ.get('TASK_RETRY_MAX', 600))
+# 没有新任务时工作线程检查到期重试的最长间隔（秒）
+POLL_INTERVAL = 5
+
+STATUS_LABELS = {'queued': '排队中', 'running': '提交中', 'done': '已转存', 'failed': '失败'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    share_key TEXT NOT NULL UNIQUE,
+    share_url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    save_path TEXT NOT NULL,
+    status TEXT NOT NULL,              -- queued -> running -> done / failed（重试时回到 queued）
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, next_attempt_at);
+'''
+
+
+class TaskQueue:
+    """持久化在 SQLite 中的转存任务队列 + 后台工作线程。
+
+    同一个分享链接只保留一条任务：排队中/已转存的链接再次提交会被跳过，失败的会重新排队。
+    工作线程每次取出最多 batch_size 个到期任务，合并成一次 run_task 请求提交，失败后按指数退避重试。
+    线程在第一次提交任务时才启动；启动时把上次进程退出时仍在提交中的任务放回队列。
+    一批任务提交成功后在工作线程中调用 on_done(tasks)。
+    """
+
+    def __init__(self, path=TASK_DB, batch_size=RUN_TASK_BATCH_SIZE, max_attempts=TASK_MAX_ATTEMPTS, on_done=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.on_done = on_done
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        with self._connect() as db:
+            # WAL：工作线程写入时页面仍可读取任务状态（该设置保存在数据库文件中）
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    # --- 对外接口 ---
+    def enqueue(self, items):
+        """items 为 [(share_url, title, save_path), ...]。
+
+        返回与 items 一一对应的 [{"url", "title", "save_path", "task_id", "status", "added"}, ...]，
+        added=False 表示该链接已在队列中或已转存过（status 为已有任务的状态）。
+        """
+        results = []
+        now = time.time()
+        with self._connect() as db:
+            # 先取得写锁再查重：否则两个会话同时提交同一链接时都查不到，后插入的一方违反 UNIQUE 约束
+            db.execute('BEGIN IMMEDIATE')
+            for share_url, title, save_path in items:
+                key = share_key(share_url)
+                row = db.execute('SELECT id, status FROM tasks WHERE share_key = ?', (key,)).fetchone()
+                if row is None:
+                    task_id = db.execute(
+                        'INSERT INTO tasks (share_key, share_url, title, save_path, status, next_attempt_at, '
+                        'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (key, share_url, title, save_path, 'queued', now, now, now)).lastrowid
+                    added, status = True, 'queued'
+                elif row['status'] == 'failed':
+                    # 之前放弃的链接重新提交：按新的标题与路径从头开始
+                    db.execute('UPDATE tasks SET share_url = ?, title = ?, save_path = ?, status = ?, attempts = 0, '
+                               'next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?',
+                               (share_url, title, save_path, 'queued', now, '', now, row['id']))
+                    task_id, added, status = row['id'], True, 'queued'
+                else:
+                    task_id, added, status = row['id'], False, row['status']
+                results.append({"url": share_url, "title": title, "save_path": save_path,
+                                "task_id": task_id, "status": status, "added": added})
+        if any(result["added"] for result in results):
+            self._ensure_started()
+            self._wakeup.set()
+        return results
+
+    def retry(self, task_id=None):
+        """把失败的任务（不指定 task_id 时为全部失败任务）重新排队，返回重新排队的数量。"""
+        now = time.time()
+        query = 'UPDATE tasks SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?'
+        params = ['queued', now, now, 'failed']
+        if task_id is not None:
+            query += ' AND id = ?'
+            params.append(task_id)
+        with self._connect() as db:
+            count = db.execute(query, params).rowcount
+        if count:
+            self._ensure_started()
+            self._wakeup.set()
+        return count
+
+    def remove(self, task_id):
+        """删除一条未在提交中的任务记录（删除已转存的记录后，该链接可以再次转存）。"""
+        with self._connect() as db:
+            return db.execute('DELETE FROM tasks WHERE id = ? AND status != ?', (task_id, 'running')).rowcount
+
+    def tasks(self, limit=100):
+        """最近的任务，新的在前。"""
+        with self._connect() as db:
+            rows = db.execute('SELECT * FROM tasks ORDER BY updated_at DESC, id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        with self._connect() as db:
+            rows = db.execute('SELECT status, COUNT(*) AS n FROM tasks GROUP BY status').fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def get(self, task_id):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def start(self):
+        """启动工作线程（有未完成任务时，页面打开即继续执行，不必等到下一次提交）。"""
+        self._ensure_started()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """停止工作线程（正在提交的一批会先完成），未完成的任务留在队列中，下次启动后继续。"""
+        with self._lock:
+            thread, self._stopping = self._thread, True
+        self._wakeup.set()
+        if thread:
+            thread.join(timeout)
+
+    def process_ready(self):
+        """提交一批到期的任务，返回本次处理的任务数（工作线程循环调用，也可直接调用）。"""
+        batch = self._claim()
+        if not batch:
+            return 0
+        tasks = [build_task(task['share_url'], task['title'], task['save_path'],
+                            f"Auto_{task['title']}_{int(time.time())}_{task['id']}") for task in batch]
+        print(f"📦 转存队列：提交 {len(tasks)} 个任务")
+        ok, reason = run_tasks(tasks)
+        now = time.time()
+        with self._connect() as db:
+            for task in batch:
+                if ok:
+                    db.execute('UPDATE tasks SET status = ?, last_error = ?, updated_at = ? WHERE id = ?',
+                               ('done', '', now, task['id']))
+                elif task['attempts'] >= self.max_attempts:
+                    print(f"❌ 放弃任务 {task['title']}：已尝试 {task['attempts']} 次，{reason}")
+                    db.execute('UPDATE tasks SET status = ?, last_error = ?, updated_at = ? WHERE id = ?',
+                               ('failed', reason, now, task['id']))
+                else:
+                    db.execute('UPDATE tasks SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ? '
+                               'WHERE id = ?', ('queued', reason, now + retry_delay(task['attempts']), now, task['id']))
+        if ok and self.on_done:
+            self.on_done(batch)
+        return len(batch)
+
+    # --- 内部实现 ---
+    def _connect(self):
+        # 每次操作使用独立连接：Streamlit 的脚本线程与工作线程不共享连接
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return _Closing(db)
+
+    def _claim(self):
+        """取出最多 batch_size 个到期任务并标记为提交中（尝试次数 +1）。"""
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            rows = db.execute('SELECT * FROM tasks WHERE status = ? AND next_attempt_at <= ? '
+                              'ORDER BY next_attempt_at, id LIMIT ?', ('queued', now, self.batch_size)).fetchall()
+            for row in rows:
+                db.execute('UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                           ('running', now, row['id']))
+        return [dict(row, attempts=row['attempts'] + 1) for row in rows]
+
+    def _next_due(self):
+        with self._connect() as db:
+            row = db.execute('SELECT MIN(next_attempt_at) AS due FROM tasks WHERE status = ?', ('queued',)).fetchone()
+        return row['due']
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread:
+                return
+            with self._connect() as db:
+                recovered = db.execute('UPDATE tasks SET status = ? WHERE status = ?', ('queued', 'running')).rowcount
+            if recovered:
+                print(f"♻️ 转存队列：{recovered} 个未完成的任务重新排队")
+            self._thread = threading.Thread(target=self._worker, name='quark-transfer-worker', daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.process_ready():
+                    continue
+                due = self._next_due()
+            except Exception as e:
+                print(f"💥 转存队列异常: {e}")
+                due = None
+            wait = POLL_INTERVAL if due is None else min(POLL_INTERVAL, max(0, due - time.time()))
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+
+def retry_delay(attempts):
+    """第 attempts 次失败后的等待时间（秒）：指数增长，带 50%~100% 的随机抖动避免同时重试。"""
+    delay = min(TASK_RETRY_MAX, TASK_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+class _Closing:
+    """with 结束时提交（异常时回滚）并关闭连接；sqlite3.Connection 自身的 with 不会关闭连接。"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.db.close()
+
+
+# 进程内共享：Streamlit 每次交互都会重新执行 web_app.py，但导入的模块只加载一次
+# 转存成功的链接记入搜索索引，搜索结果中会标记为已转存
+transfers = TaskQueue(on_done=lambda tasks: index.mark_transferred([(t['share_url'], t['title']) for t in tasks]))
@@ -0,0 +1,18 @@
+import importlib.util
+import os
+import sys
+import tempfile
+
+# 与 web_app.py 相同：模块直接按文件名导入（common/ 的路径由 common_path 设置）
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# 结果索引写到临时目录，不碰工作目录中的 results.db
+os.environ.setdefault('RESULT_INDEX_DB', os.path.join(tempfile.mkdtemp(prefix='pansou-tests-'), 'results.db'))
+
+# 没有本地的 config_env.py 时使用仓库中的示例配置
+if importlib.util.find_spec('config_env') is None:
+    spec = importlib.util.spec_from_file_location('config_env', os.path.join(APP_DIR, 'config_env_examply.py'))
+    sys.modules['config_env'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['config_env'])
@@ -0,0 +1,118 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import link_checker as lc
+
+SHARE_URL = 'https://pan.quark.cn/s/abc123'
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """按顺序返回预设响应的分享页接口，最后一个响应重复使用。"""
+
+    def __init__(self, responses):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.responses = list(responses)
+        self.requests = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/share/sharepage/token'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        server.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        status, body, headers = server.responses.pop(0) if len(server.responses) > 1 else server.responses[0]
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    servers = []
+
+    def start(*responses):
+        server = StubUpstream(responses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(lc, 'SHARE_CHECK_URL', server.url)
+        return server
+
+    lc.cache.clear()
+    yield start
+    lc.cache.clear()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def reply(status=200, code=0, message='ok', headers=None):
+    return status, {'status': status, 'code': code, 'message': message, 'data': {}}, headers or {}
+
+
+def test_alive(upstream):
+    server = upstream(reply())
+    assert lc.check_link(SHARE_URL + '?pwd=x1y2') == (lc.ALIVE, '')
+    assert server.requests == [{'pwd_id': 'abc123', 'passcode': 'x1y2'}]
+    # 结论被缓存，不再请求
+    assert lc.check_link(SHARE_URL)[0] == lc.ALIVE
+    assert len(server.requests) == 1
+
+
+def test_dead(upstream):
+    upstream(reply(404, 41006, '分享不存在'))
+    assert lc.check_link(SHARE_URL) == (lc.DEAD, '分享不存在')
+
+
+def test_unrecognized_error_is_unknown(upstream):
+    server = upstream(reply(400, 41012, 'bad request'))
+    assert lc.check_link(SHARE_URL)[0] == lc.UNKNOWN
+    assert lc.check_link(SHARE_URL)[0] == lc.UNKNOWN
+    # 未知不缓存
+    assert len(server.requests) == 2
+
+
+def test_throttled_then_alive(upstream):
+    # 429 + Retry-After 由共享客户端按要求等待后重试
+    server = upstream(reply(429, 0, 'too many requests', {'Retry-After': '0'}), reply())
+    assert lc.check_link(SHARE_URL) == (lc.ALIVE, '')
+    assert len(server.requests) == 2
+
+
+def test_throttled_with_long_retry_after_is_unknown(upstream):
+    # 服务端要求等待太久时不等待，结果记为未知且不缓存
+    server = upstream(reply(429, 0, 'too many requests', {'Retry-After': '3600'}))
+    verdict, reason = lc.check_link(SHARE_URL)
+    assert verdict == lc.UNKNOWN
+    assert '429' in reason
+    assert len(server.requests) == 1
+    lc.check_link(SHARE_URL)
+    assert len(server.requests) == 2
+
+
+def test_network_error_is_unknown(monkeypatch):
+    lc.cache.clear()
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # 端口已关闭：连接被拒绝
+    monkeypatch.setattr(lc, 'SHARE_CHECK_URL', f'http://127.0.0.1:{port}/share/sharepage/token')
+    monkeypatch.setattr(lc.client, 'retries', 0)
+    verdict, reason = lc.check_link(SHARE_URL)
+    assert verdict == lc.UNKNOWN
+    assert reason.startswith('检测失败')
+    assert lc.cache.stats()['entries'] == 0
@@ -1,8 +1,18 @@
 import streamlit as st
-import requests
 import time
 import config_env
-from auto_quark import add_and_run_task
+import common_path  # noqa: F401
+from http_client import client
+from auto_quark import share_key
+from search import search_stream, configured_backends
+from result_index import index, normalize_text
+from link_checker import check_results, ALIVE, DEAD
+from task_queue import transfers, STATUS_LABELS
+
+# 任务面板的刷新间隔（秒）
+TASK_PANEL_REFRESH = 2
+# 可以提交给 quark_auto_save 转存的网盘类型，其他网盘的结果只提供链接
+TRANSFER_CLOUD_TYPE = "quark"
 
 # 页面基础配置
 st.set_page_config(page_title="Quark 转存助手", page_icon="🎬", layout="wide")
@@ -12,16 +22,78 @@ if 'results' not in st.session_state:
     st.session_state.results = []
 if 'last_search' not in st.session_state:
     st.session_state.last_search = ""
+if 'batch_report' not in st.session_state:
+    st.session_state.batch_report = []
+if 'link_status' not in st.session_state:
+    st.session_state.link_status = {}
+
+def clear_selection():
+    """清空结果勾选（复选框的状态按行号保存，换一批结果后需要重置）"""
+    for key in [key for key in st.session_state if key.startswith("sel_")]:
+        del st.session_state[key]
+
+def enqueue_report(results):
+    """转存队列的提交结果 -> 表格行"""
+    rows = []
+    for r in results:
+        if r["added"]:
+            state = "🕒 已加入队列"
+        elif r["status"] == "done":
+            state = "⏭️ 已转存过"
+        else:
+            state = "⏭️ 已在队列中"
+        rows.append({"状态": state, "资源": r["title"], "保存到": r["save_path"]})
+    return rows
+
+def result_title(item):
+    return item.get('note', '未知标题').replace("/", "_")
+
+def transferable(item):
+    return item.get("cloud_type", TRANSFER_CLOUD_TYPE) == TRANSFER_CLOUD_TYPE
+
+def search_api(keyword, on_progress=None):
+    """先查本地索引、再并发查询所有搜索接口，返回合并去重后的结果（各接口的结果在进程内缓存，见 search.py）。
+    每个来源返回（或超时）后调用 on_progress(当前结果, 已返回来源数, 来源总数)。
+    """
+    backends = configured_backends()
+    results, errors, answered = [], [], 0
+    for name, items, error in search_stream(keyword, backends=backends):
+        answered += 1
+        if error:
+            errors.append(f"{name}: {error}")
+        results.extend(items)
+        if on_progress:
+            on_progress(results, answered, len(backends) + 1)
+    if errors and not results:
+        st.error("搜索失败: " + "；".join(errors))
+    elif errors:
+        st.warning("部分搜索接口未返回: " + "；".join(errors))
+    return results
+
+def link_flags(results, link_status):
+    """每条结果的问题：'dead'（分享已失效）、'duplicate'（标题与前面一条未失效的结果相同）或 None"""
+    flags, titles = [], set()
+    for item in results:
+        verdict, _ = link_status.get(share_key(item.get('url') or ''), (None, ''))
+        if verdict == DEAD:
+            flags.append('dead')
+            continue
+        title = normalize_text(result_title(item))
+        flags.append('duplicate' if title in titles else None)
+        titles.add(title)
+    return flags
+
+def show_preview(placeholder, results, answered, total):
+    """搜索进行中：先把已返回的结果以表格显示出来，全部返回后再显示可操作的列表"""
+    with placeholder.container():
+        st.caption(f"⏳ 已返回 {answered}/{total} 个来源（本地索引 + 搜索接口），共 {len(results)} 条结果")
+        st.dataframe(
+            [{"资源名称": result_title(item), "网盘": item.get("cloud_type"), "来源": item.get("source"),
+              "存入时间": item.get("datetime") or item.get("pub_time") or ""} for item in results],
+            use_container_width=True, hide_index=True)
 
-def search_api(keyword):
-    """从接口获取资源"""
-    payload = {"kw": keyword, "cloud_types": ["quark"]}
-    try:
-        response = requests.post(config_env.search_api, json=payload, timeout=10)
-        return response.json().get("data", {}).get("merged_by_type", {}).get("quark", [])
-    except Exception as e:
-        st.error(f"搜索失败: {e}")
-        return []
+# 有未完成的任务时（例如进程重启后），打开页面即继续执行
+transfers.start()
 
 # --- 2. 顶部分类选择 (直接显示，不使用折叠菜单) ---
 st.title("🎬 私人影音转存助手")
@@ -49,18 +121,65 @@ col_input, col_btn = st.columns([4, 1])
 with col_input:
     kw = st.text_input("请输入资源名称", value=st.session_state.last_search, label_visibility="collapsed", placeholder="输入关键词，例如：巨洪")
 with col_btn:
-    if st.button("开始搜索", use_container_width=True, type="primary"):
-        if kw:
-            with st.spinner('正在搜寻资源...'):
-                st.session_state.results = search_api(kw)
-                st.session_state.last_search = kw
-        else:
-            st.warning("内容不能为空")
+    search_clicked = st.button("开始搜索", use_container_width=True, type="primary")
+if search_clicked:
+    if kw:
+        preview = st.empty()
+        with st.spinner('正在搜寻资源...'):
+            st.session_state.results = search_api(kw, lambda *args: show_preview(preview, *args))
+            st.session_state.last_search = kw
+            st.session_state.batch_report = []
+            clear_selection()
+        preview.empty()
+        # 转存前先检测夸克链接是否仍然有效（结论有缓存，重复搜索很快）
+        quark_results = [item for item in st.session_state.results if transferable(item)]
+        with st.spinner(f'正在检测 {len(quark_results)} 个链接是否有效...'):
+            st.session_state.link_status = check_results(quark_results)
+    else:
+        st.warning("内容不能为空")
 
 # --- 4. 结果展示 (包含时间显示) ---
 if st.session_state.results:
-    st.subheader(f"✅ 找到 {len(st.session_state.results)} 条结果")
-    
+    flags = link_flags(st.session_state.results, st.session_state.link_status)
+    col_title, col_hide = st.columns([3, 1])
+    with col_title:
+        st.subheader(f"✅ 找到 {len(st.session_state.results)} 条结果"
+                     f"（失效 {flags.count('dead')}，标题重复 {flags.count('duplicate')}）")
+    with col_hide:
+        hide_flagged = st.toggle("隐藏失效与重复的链接", value=True)
+    # 已转存过的链接（转存队列完成后记入本地索引）
+    done_keys = index.transferred([item.get('url') for item in st.session_state.results])
+
+    def already_transferred(item):
+        return share_key(item.get('url') or '') in done_keys
+
+    # 批量转存：勾选结果或按关键字匹配，加入转存队列后由后台合并成少量 run_task 请求提交
+    with st.container(border=True):
+        col_match, col_all, col_none = st.columns([4, 1, 1])
+        with col_match:
+            match = st.text_input("匹配", placeholder="只转存标题包含该关键字的结果，例如：4K", label_visibility="collapsed")
+        with col_all:
+            if st.button("全选匹配", use_container_width=True, help="跳过已转存过、已失效与标题重复的资源"):
+                for idx, item in enumerate(st.session_state.results):
+                    st.session_state[f"sel_{idx}"] = (transferable(item) and not already_transferred(item)
+                                                      and not flags[idx]
+                                                      and match.casefold() in result_title(item).casefold())
+        with col_none:
+            if st.button("清空勾选", use_container_width=True):
+                clear_selection()
+
+        selected = [item for idx, item in enumerate(st.session_state.results)
+                    if st.session_state.get(f"sel_{idx}") and transferable(item) and flags[idx] != 'dead']
+        if st.button(f"📦 批量转存已勾选（{len(selected)}）", type="primary", disabled=not selected):
+            items = [(item.get('url', ''), result_title(item), f"{save_root}/{result_title(item)}") for item in selected]
+            st.session_state.batch_report = transfers.enqueue(items)
+
+        report = st.session_state.batch_report
+        if report:
+            added = sum(1 for r in report if r["added"])
+            st.success(f"已加入转存队列 {added} 个，重复或已转存的链接跳过 {len(report) - added} 个，进度见左侧任务面板")
+            st.dataframe(enqueue_report(report), use_container_width=True, hide_index=True)
+
     # 标题行
     st.markdown("""
         <div style="display: flex; background-color: #f0f2f6; padding: 10px; border-radius: 5px; font-weight: bold;">
@@ -71,8 +190,11 @@ if st.session_state.results:
     """, unsafe_allow_html=True)
 
     for idx, item in enumerate(st.session_state.results):
-        title = item.get('note', '未知标题').replace("/", "_")
+        if hide_flagged and flags[idx]:
+            continue
+        title = result_title(item)
         url = item.get('url', '')
+        verdict, reason = st.session_state.link_status.get(share_key(url), (None, ''))
         # 提取时间字段
         pub_time = item.get('datetime') or item.get('pub_time') or "时间未知"
         
@@ -80,26 +202,72 @@ if st.session_state.results:
             c1, c2, c3 = st.columns([5, 3, 2])
             
             with c1:
-                st.write(f"**{title}**")
-                st.caption(f"📅 存入时间: {pub_time}")
+                st.checkbox(f"**{title}**", key=f"sel_{idx}", disabled=not transferable(item) or flags[idx] == 'dead')
+                source = f" · ☁️ {item['cloud_type']} · 来源 {item['source']}" if 'source' in item else ""
+                done = " · ✅ 已转存过" if already_transferred(item) else ""
+                if flags[idx] == 'dead':
+                    status = f" · ❌ 已失效（{reason}）"
+                elif flags[idx] == 'duplicate':
+                    status = " · ♻️ 标题重复"
+                elif verdict == ALIVE:
+                    status = " · 🟢 链接有效"
+                else:
+                    status = ""
+                st.caption(f"📅 存入时间: {pub_time}{source}{done}{status}")
             
             with c2:
                 st.text_input("url", value=url, key=f"url_{idx}", label_visibility="collapsed", disabled=True)
             
             with c3:
+                # 其他网盘无法自动转存，只提供链接
+                if not transferable(item):
+                    st.link_button("🔗 打开链接", url, use_container_width=True)
                 # 传入 category 动态生成 save_path
-                if st.button("📥 转存入库", key=f"btn_{idx}", use_container_width=True):
+                elif st.button("📥 转存入库", key=f"btn_{idx}", use_container_width=True, disabled=flags[idx] == 'dead'):
                     final_path = f"{save_root}/{title}"
-                    with st.spinner('提交中...'):
-                        success = add_and_run_task(url, title, final_path)
-                        if success:
-                            st.toast(f"✅ 已存入{category}：{title}")
-                            st.success(f"成功提交至 {final_path}")
-                        else:
-                            st.error("后端拒绝请求，请检查日志")
+                    result = transfers.enqueue([(url, title, final_path)])[0]
+                    if result["added"]:
+                        st.toast(f"🕒 已加入转存队列：{title}")
+                    elif result["status"] == "done":
+                        st.info("该链接已转存过")
+                    else:
+                        st.info("该链接已在转存队列中")
         st.divider()
 
-# --- 5. 底部快捷工具栏 ---
+# --- 5. 转存任务面板（侧边栏，定时刷新，不影响页面其他部分） ---
+@st.fragment(run_every=TASK_PANEL_REFRESH)
+def task_panel():
+    counts = transfers.counts()
+    st.subheader("📋 转存任务")
+    cols = st.columns(4)
+    for col, status in zip(cols, ["queued", "running", "done", "failed"]):
+        col.metric(STATUS_LABELS[status], counts.get(status, 0))
+    if counts.get("failed") and st.button("🔁 重试失败任务", use_container_width=True):
+        transfers.retry()
+    tasks = transfers.tasks(limit=50)
+    if tasks:
+        st.dataframe(
+            [{"状态": STATUS_LABELS.get(t["status"], t["status"]), "资源": t["title"], "尝试": t["attempts"],
+              "说明": t["last_error"], "更新": time.strftime("%m-%d %H:%M:%S", time.localtime(t["updated_at"]))}
+             for t in tasks],
+            use_container_width=True, hide_index=True)
+    else:
+        st.caption("暂无任务")
+
+with st.sidebar:
+    task_panel()
+    with st.expander("🌐 接口统计"):
+        http_stats = client.stats()
+        if http_stats:
+            st.dataframe(
+                [{"域名": host, "请求": s["requests"], "重试": s["retries"], "异常": s["errors"],
+                  "状态码": " ".join(f"{k}:{v}" for k, v in sorted(s["status"].items())),
+                  "p50 ms": s["p50_ms"], "p95 ms": s["p95_ms"]} for host, s in http_stats.items()],
+                use_container_width=True, hide_index=True)
+        else:
+            st.caption("暂无请求")
+
+# --- 6. 底部快捷工具栏 ---
 st.markdown(
     f"""
     <div style="text-align: center; padding: 20px; color: gray; font-size: 0.8rem;">
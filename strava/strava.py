@@ -1,10 +1,16 @@
+import os
+import sys
 import requests
 import datetime
 import json
 import time
+# 共享模块位于仓库根目录的 common/ 下
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from http_client import client
 # 假设 config_env.py 已经修复，可以成功导入以下变量
 from utils.config_env import client_id, client_secret, refresh_token
 from utils.pusher import WeChat
+from utils.activity_store import ActivityStore
 
 
 # --- 全局常量 ---
@@ -13,6 +19,12 @@ ACTIVITY_URL = "https://www.strava.com/api/v3/athlete/activities"
 ATHLETE_URL = "https://www.strava.com/api/v3/athlete/"
 GEAR_URL = "https://www.strava.com/api/v3/gear/"
 PER_PAGE_MAX = 200
+# 本地活动库（SQLite），首次运行回填全部历史，之后每次只下载新活动
+STRAVA_DB = os.environ.get('STRAVA_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'activities.db'))
+# 每次运行最多回填的历史页数（每页 PER_PAGE_MAX 条），避免一次用光 API 限额；没回填完的下次运行继续
+BACKFILL_PAGES = int(os.environ.get('STRAVA_BACKFILL_PAGES', 20))
+
+store = ActivityStore(STRAVA_DB)
 
 
 def refresh_access_token():
@@ -24,16 +36,68 @@ def refresh_access_token():
         "grant_type": "refresh_token"
     }
     try:
-        response = requests.post(TOKEN_REFRESH_URL, data=payload)
+        # 用同一个 refresh_token 重复刷新是安全的，超时与服务端错误也重试
+        response = client.post(TOKEN_REFRESH_URL, data=payload, idempotent=True)
         response.raise_for_status()
         return response.json()["access_token"]
     except requests.exceptions.RequestException as e:
         print(f"Token refresh failed. Error: {e}")
         return None
 
+def sync_activities(new_access_token):
+    """
+    把 Strava 上的活动同步到本地库，返回本次新增的活动数。
+    1) 增量：只请求比本地最新一条更晚（after）的活动；
+    2) 回填：从本地最早一条往前（before）逐页下载历史，每页写入后即生效，
+       中断或达到 BACKFILL_PAGES 后下次运行从断点继续，取到不满一页时回填完成。
+    网络出错时保留已同步的数据，下次运行再继续。
+    """
+    headers = {"Authorization": f"Bearer {new_access_token}"}
+    added = 0
+    newest = store.newest_start()
+    if newest is not None:
+        page = 1
+        try:
+            while True:
+                activities = fetch_activity_page(headers, {"after": int(newest), "page": page})
+                added += store.upsert(activities)
+                if len(activities) < PER_PAGE_MAX:
+                    break
+                page += 1
+        except requests.exceptions.RequestException as e:
+            print(f"增量同步活动失败，使用本地已有数据: {e}")
+
+    for _ in range(BACKFILL_PAGES):
+        if store.state("backfill_done") == "1":
+            break
+        oldest = store.oldest_start()
+        params = {} if oldest is None else {"before": int(oldest)}
+        try:
+            activities = fetch_activity_page(headers, params)
+        except requests.exceptions.RequestException as e:
+            print(f"回填历史活动失败，下次运行继续: {e}")
+            break
+        added += store.upsert(activities)
+        if len(activities) < PER_PAGE_MAX:
+            store.set_state("backfill_done", "1")
+            print("历史活动回填完成")
+    else:
+        if store.state("backfill_done") != "1":
+            print(f"本次已回填 {BACKFILL_PAGES} 页历史活动，剩余部分下次运行继续")
+
+    print(f"活动同步完成：新增 {added} 条，本地共 {store.totals()[0]} 条")
+    return added
+
+def fetch_activity_page(headers, params):
+    """请求一页活动列表（params 为 after/before/page），返回活动列表"""
+    response = client.get(ACTIVITY_URL, headers=headers, params=dict(params, per_page=PER_PAGE_MAX))
+    response.raise_for_status()
+    return response.json()
+
 def format_data_for_display(data):
     """
     将 JSON 数据结构转换为易于阅读的字符串格式，方便推送。
+    累计数据直接读取本地活动库。
     """
     output = ["--- Strava 运动数据报告 ---"]
     
@@ -59,6 +123,16 @@ def format_data_for_display(data):
             output.append(f"  > 平均心率: {int(heartrate)} bpm")
         output.append("")
 
+    # --- 累计跑步（本地活动库） ---
+    year_start = time.mktime(datetime.date(datetime.date.today().year, 1, 1).timetuple())
+    year_runs, year_m = store.totals("Run", after=year_start)
+    all_runs, all_m = store.totals("Run")
+    if all_runs:
+        output.append("📈 累计跑步：")
+        output.append(f"  > 今年: {year_runs} 次 / {year_m / 1000:.2f} km")
+        output.append(f"  > 全部: {all_runs} 次 / {all_m / 1000:.2f} km")
+        output.append("")
+
     # --- 3. 装备里程 ---
     gear_items = data.get("gear", [])
     if gear_items:
@@ -113,70 +187,46 @@ def get_strava_data(new_access_token):
     start_of_week_timestamp = int(time.mktime(start_of_week.timetuple()))
     end_of_week_timestamp = start_of_week_timestamp + 7 * 24 * 3600
 
-    # --- 2. 获取本周跑步总距离 ---
-    params_weekly = {
-        "after": start_of_week_timestamp,
-        "before": end_of_week_timestamp,
-        "per_page": PER_PAGE_MAX
-    }
-    try:
-        response_ac_weekly = requests.get(ACTIVITY_URL, headers=headers, params=params_weekly)
-        response_ac_weekly.raise_for_status()
-        activities_weekly = response_ac_weekly.json()
-        
-        # 计算本周总距离
-        total_distance_m = sum(activity["distance"] for activity in activities_weekly if activity["type"] == "Run")
-        total_distance_km = round(total_distance_m / 1000.0, 2)
-        print(f"本周跑步总距离为：{total_distance_km:.2f} 公里")
-
-    except requests.exceptions.RequestException as e:
-        print(f"获取本周活动数据失败: {e}")
-        total_distance_km = 0.0
+    # --- 2. 同步活动到本地库（首次运行回填历史，之后只下载新活动），再从本地库计算本周跑步总距离 ---
+    sync_activities(new_access_token)
+    _, total_distance_m = store.totals("Run", after=start_of_week_timestamp, before=end_of_week_timestamp)
+    total_distance_km = round(total_distance_m / 1000.0, 2)
+    print(f"本周跑步总距离为：{total_distance_km:.2f} 公里")
 
 
-    # --- 3. 获取最近的活动和装备信息 ---
-    # 这一步将获取所有的活动，用于找到最近的 Run 活动作为 'runs' 列表数据源
-    params_all = {"per_page": 30} # 只获取最近的30条活动，减少数据量
-    try:
-        response_ac_all = requests.get(ACTIVITY_URL, headers=headers, params=params_all)
-        response_ac_all.raise_for_status()
-        activities_all = response_ac_all.json()
-    except requests.exceptions.RequestException as e:
-        print(f"获取最近活动数据失败: {e}")
-        activities_all = []
+    # --- 3. 最近一次跑步活动（本地库，不再受限于最近 30 条） ---
+    run = store.latest("Run")
 
 
     # --- 4. 处理最近的跑步活动（仅取最近一次 Run 作为 data["runs"] 的数据源） ---
-    for run in activities_all:
-        if run['type'] == 'Run':
-            # 距离、时间、配速计算
-            runtime = round(run['moving_time'] / 60)
-            runkm = round(run['distance'] / 1000, 1)
-            
-            runsec = float(run['moving_time']) / float(runkm) if runkm > 0 else 0
-            m, s = divmod(runsec, 60)
-            runpace = "%01d%02d" % (m, s) # 保留你原有的 mmss 格式
-            
-            run_info = {
-                "本周跑步": total_distance_km,  # 使用步骤2计算出的本周总距离
-                "跑步时间": runtime,
-                "距离": runkm,
-                "配速": runpace,
-                "平均心率": run.get('average_heartrate', 'N/A')
-            } 
-            data["runs"].append(run_info)
-            break # 找到最近一次跑步活动后立即退出循环
+    if run:
+        # 距离、时间、配速计算
+        runtime = round(run['moving_time'] / 60)
+        runkm = round(run['distance'] / 1000, 1)
+        
+        runsec = float(run['moving_time']) / float(runkm) if runkm > 0 else 0
+        m, s = divmod(runsec, 60)
+        runpace = "%01d%02d" % (m, s) # 保留你原有的 mmss 格式
+        
+        run_info = {
+            "本周跑步": total_distance_km,  # 使用步骤2计算出的本周总距离
+            "跑步时间": runtime,
+            "距离": runkm,
+            "配速": runpace,
+            "平均心率": run.get('average_heartrate', 'N/A')
+        } 
+        data["runs"].append(run_info)
 
     # --- 5. 获取装备信息（保留原有的循环请求方式，但仅执行一次） ---
     try:
         # 1) 获取运动员信息（包含装备 ID）
-        response_ath = requests.get(ATHLETE_URL, headers=headers)
+        response_ath = client.get(ATHLETE_URL, headers=headers)
         response_ath.raise_for_status()
         geardata = response_ath.json()
         # 2) 循环获取自行车里程
         # 2) 循环获取自行车里程
         for bike in geardata.get('bikes', []):
-            response_gear = requests.request("GET", GEAR_URL + bike['id'], headers=headers)
+            response_gear = client.get(GEAR_URL + bike['id'], headers=headers)
             response_gear.raise_for_status()
             
             gear_detail = response_gear.json()
@@ -189,7 +239,7 @@ def get_strava_data(new_access_token):
 
         # 3) 循环获取跑鞋里程
         for shoe in geardata.get('shoes', []):
-            response_gear = requests.request("GET", GEAR_URL + shoe['id'], headers=headers)
+            response_gear = client.get(GEAR_URL + shoe['id'], headers=headers)
             response_gear.raise_for_status()
             
             gear_detail = response_gear.json()
@@ -254,6 +304,9 @@ def main():
     print(json_data)
     print("------------------------------------------\n")
 
+    # 6. 打印本次运行的接口请求统计（按域名：请求数、重试、异常、耗时）
+    print(f"🌐 HTTP 请求统计: {json.dumps(client.stats(), ensure_ascii=False)}")
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS activities (
+    id INTEGER PRIMARY KEY,            -- Strava 活动 ID
+    type TEXT NOT NULL,                -- Run / Ride / ...
+    start_ts REAL NOT NULL,            -- 开始时间（UTC 时间戳），与 API 的 after/before 参数一致
+    distance REAL NOT NULL,            -- 米
+    moving_time INTEGER NOT NULL,      -- 秒
+    data TEXT NOT NULL,                -- API 返回的完整 JSON
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activities_type_start ON activities (type, start_ts);
+CREATE INDEX IF NOT EXISTS activities_start ON activities (start_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+def start_timestamp(activity):
+    """活动的 start_date（如 "2018-02-16T14:52:54Z"）-> UTC 时间戳"""
+    start = datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ")
+    return start.replace(tzinfo=timezone.utc).timestamp()
+
+
+class ActivityStore:
+    """Strava 活动的本地 SQLite 副本。
+
+    同步逻辑（增量下载新活动、分页回填历史）在 strava.py 中，这里只负责读写；
+    回填进度记录在 sync_state 表中，程序中断后下次运行从最早一条已保存的活动继续往前翻页。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as db, db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    # --- 写入 ---
+    def upsert(self, activities):
+        """写入 API 返回的一页活动（已有的按 ID 覆盖），返回其中新增的数量"""
+        now = time.time()
+        rows = [(a["id"], a.get("type") or "", start_timestamp(a), float(a.get("distance") or 0),
+                 int(a.get("moving_time") or 0), json.dumps(a, ensure_ascii=False), now) for a in activities]
+        with closing(self._connect()) as db, db:
+            before = db.execute('SELECT COUNT(*) FROM activities').fetchone()[0]
+            db.executemany(
+                'INSERT INTO activities (id, type, start_ts, distance, moving_time, data, synced_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET type = excluded.type, '
+                'start_ts = excluded.start_ts, distance = excluded.distance, moving_time = excluded.moving_time, '
+                'data = excluded.data, synced_at = excluded.synced_at', rows)
+            return db.execute('SELECT COUNT(*) FROM activities').fetchone()[0] - before
+
+    def set_state(self, key, value):
+        with closing(self._connect()) as db, db:
+            db.execute('INSERT INTO sync_state (key, value) VALUES (?, ?) '
+                       'ON CONFLICT (key) DO UPDATE SET value = excluded.value', (key, str(value)))
+
+    # --- 读取 ---
+    def state(self, key, default=None):
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def newest_start(self):
+        """最新一条活动的开始时间戳，库为空时为 None"""
+        return self._scalar('SELECT MAX(start_ts) FROM activities')
+
+    def oldest_start(self):
+        """最早一条活动的开始时间戳，库为空时为 None"""
+        return self._scalar('SELECT MIN(start_ts) FROM activities')
+
+    def activities(self, activity_type=None, after=None, before=None, limit=None):
+        """按开始时间倒序返回活动（API 原始 JSON），可按类型与时间范围 [after, before) 过滤"""
+        query, params = self._filter('SELECT data FROM activities', activity_type, after, before)
+        query += ' ORDER BY start_ts DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with closing(self._connect()) as db:
+            return [json.loads(row[0]) for row in db.execute(query, params)]
+
+    def latest(self, activity_type=None):
+        """最近一条（指定类型的）活动，没有时为 None"""
+        found = self.activities(activity_type, limit=1)
+        return found[0] if found else None
+
+    def totals(self, activity_type=None, after=None, before=None):
+        """(活动次数, 总距离 米)"""
+        query, params = self._filter('SELECT COUNT(*), COALESCE(SUM(distance), 0) FROM activities',
+                                     activity_type, after, before)
+        with closing(self._connect()) as db:
+            count, distance = db.execute(query, params).fetchone()
+        return count, distance
+
+    # --- 内部实现 ---
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _scalar(self, query):
+        with closing(self._connect()) as db:
+            return db.execute(query).fetchone()[0]
+
+    @staticmethod
+    def _filter(query, activity_type, after, before):
+        conditions, params = [], []
+        if activity_type:
+            conditions.append('type = ?')
+            params.append(activity_type)
+        if after is not None:
+            conditions.append('start_ts >= ?')
+            params.append(after)
+        if before is not None:
+            conditions.append('start_ts < ?')
+            params.append(before)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return query, params
@@ -1,10 +1,16 @@
 import time
-import requests
 import json
 import os
+import sys
 from pathlib import Path
 from .config_env import CORPID, CORPSECRET, AGENTID, TOUSER, BASE_URL
 
+# 共享模块位于仓库根目录的 common/ 下（单独运行 python -m utils.pusher 时也能导入）
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common')
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+from http_client import client
+
 
 BASE_DIR = Path(__file__).resolve().parent
 TOKEN_FILE_PATH = BASE_DIR / 'access_token.conf'
@@ -33,7 +39,8 @@ class WeChat:
                   }
         
         # 使用 params 传递参数
-        req = requests.post(url, params=values)
+        # 获取 token 是只读操作，超时与服务端错误也重试
+        req = client.post(url, params=values, idempotent=True)
         print(req, '------------------------------------')
         
         try:
@@ -106,7 +113,8 @@ class WeChat:
         send_msges=(bytes(json.dumps(send_values), 'utf-8'))
         
         # 🚨 修复：确保请求以 json 形式发送 (requests.post(url, data) 是发送原始字节)
-        respone = requests.post(send_url, data=send_msges)
+        # 发送消息不是幂等的：只在服务端明确拒绝（429/503）或连接超时时重试，避免重复推送
+        respone = client.post(send_url, data=send_msges)
         
         try:
             respone_data = respone.json()